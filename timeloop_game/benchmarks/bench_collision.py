@@ -0,0 +1,62 @@
+"""Per-frame platform collision cost against a growing platform count.
+
+    python3 timeloop_game/benchmarks/bench_collision.py
+
+Compares Player.update against the SpatialGrid with the old linear scan
+over every platform. The grid column should stay flat.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from core.player import Player
+from core.level_loader import LevelLoader
+
+STEPS = 5000
+COUNTS = (10, 100, 1000, 5000, 20000)
+
+
+class LinearScan:
+    # What Player.update did before the grid: test every platform
+    def __init__(self, platforms):
+        self.platforms = platforms
+
+    def query(self, rect):
+        return self.platforms
+
+
+def make_platforms(count, seed=0):
+    rng = random.Random(seed)
+    platforms = [pygame.Rect(0, 560, 800, 40)]
+    width = max(800, count * 20)
+    for _ in range(count - 1):
+        platforms.append(pygame.Rect(rng.randrange(0, width), rng.randrange(0, 540), rng.choice((40, 80, 120)), 20))
+    return platforms
+
+
+def time_updates(index, steps=STEPS):
+    player = Player(100, 500)
+    start = time.perf_counter()
+    for i in range(steps):
+        player.apply_input(False, i % 120 < 60, i % 45 == 0)
+        player.update(index)
+        if player.rect.y > 600:
+            player.place(100, 500)
+    return (time.perf_counter() - start) / steps * 1e6
+
+
+def main():
+    print(f'{"platforms":>10} {"grid us/frame":>14} {"linear us/frame":>16}')
+    for count in COUNTS:
+        platforms = make_platforms(count)
+        grid_us = time_updates(LevelLoader.build_grid(platforms))
+        linear_us = time_updates(LinearScan(platforms))
+        print(f'{count:>10} {grid_us:>14.2f} {linear_us:>16.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Import-time budget for the game's entry point, for CI.
+
+Run from the repository root:
+
+    python3 timeloop_game/benchmarks/import_time.py
+    python3 timeloop_game/benchmarks/import_time.py --budget-ms 25 --json imports.json
+
+Imports main.py in a fresh interpreter under `python -X importtime` and
+reports the total, the part that is pygame's own import (out of our
+hands), what the game's modules add on top, and the slowest modules.
+Exits 1 when the game's share is over --budget-ms or a module from
+--forbid was imported, so a CI step can fail on a startup regression.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+GAME_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = 25.0
+# Heavy or tool-only modules that have no business in a cold start
+FORBIDDEN = ('cairosvg', 'lxml', 'cffi', 'core.solver', 'multiprocessing', 'csv')
+TOP = 10
+
+
+def import_times(module='main', runs=1):
+    """{module: (self_us, cumulative_us)} from -X importtime, for the run
+    with the fastest total."""
+    best = None
+    for _ in range(runs):
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                              cwd=GAME_DIR, capture_output=True, text=True, check=True,
+                              env=dict(os.environ, SDL_VIDEODRIVER='dummy', SDL_AUDIODRIVER='dummy'))
+        times = {}
+        for line in proc.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = (int(self_us), int(cumulative))
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    return best
+
+
+def summarize(times, module='main'):
+    total = times[module][1]
+    pygame_us = times.get('pygame', (0, 0))[1]
+    slowest = sorted(times.items(), key=lambda item: -item[1][0])[:TOP]
+    return {
+        'total_ms': total / 1000,
+        'pygame_ms': pygame_us / 1000,
+        'game_ms': (total - pygame_us) / 1000,
+        'modules': len(times),
+        'slowest': [{'module': name, 'self_ms': s / 1000, 'cumulative_ms': c / 1000}
+                    for name, (s, c) in slowest],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check the import time of the game entry point.')
+    parser.add_argument('--module', default='main', help='module to import (default: main)')
+    parser.add_argument('--runs', type=int, default=3, help='fresh interpreters; the fastest one is reported')
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS,
+                        help="allowed import time on top of pygame's own")
+    parser.add_argument('--forbid', nargs='*', default=FORBIDDEN, help='modules that must not be imported')
+    parser.add_argument('--json', help='write the summary here')
+    args = parser.parse_args(argv)
+
+    times = import_times(args.module, args.runs)
+    summary = summarize(times, args.module)
+    forbidden = sorted(name for name in times
+                       if any(name == f or name.startswith(f + '.') for f in args.forbid))
+    summary['forbidden'] = forbidden
+    print(f'import {args.module}: {summary["total_ms"]:.1f} ms total, pygame {summary["pygame_ms"]:.1f} ms, '
+          f'game {summary["game_ms"]:.1f} ms (budget {args.budget_ms:.1f}), {summary["modules"]} modules')
+    for entry in summary['slowest']:
+        print(f'  {entry["module"]:<44} {entry["self_ms"]:>7.2f} ms self {entry["cumulative_ms"]:>8.2f} ms cumulative')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=1)
+    failed = False
+    if forbidden:
+        print(f'forbidden modules imported: {", ".join(forbidden)}')
+        failed = True
+    if summary['game_ms'] > args.budget_ms:
+        print(f'game imports take {summary["game_ms"]:.1f} ms, over the {args.budget_ms:.1f} ms budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
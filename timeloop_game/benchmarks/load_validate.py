@@ -0,0 +1,212 @@
+"""Load-test the run validation service.
+
+    python3 timeloop_game/benchmarks/load_validate.py
+    python3 timeloop_game/benchmarks/load_validate.py --url http://127.0.0.1:8765 --runs 400 --concurrency 64
+
+Without --url a validate_server.py is started on a free port for the
+test. Three sets of runs are sent, each spread over every level:
+
+    short   seeded traces (as in timestep.py) of --seconds; these never
+            finish a loop, so they have no ghosts
+    full    seeded traces as long as the loop limit, so every loop after
+            the first replays ghosts and most end out of loops
+    solved  the solver's winning runs, and each again carrying on for
+            OVERRUN idle steps past its win
+
+Each run is submitted both as its input log and as its loops' replays.
+A set is sent once, so every request is simulated, then again, so every
+one is answered from the cache. Prints validations per second, p50/p99
+latency and the verdicts for each set and pass, and exits with status 1
+if any request failed or a run's two forms got different verdicts.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.level_pack import LevelPack
+from core.simulation import Simulation, FPS, LOOP_SECONDS, MAX_LOOPS
+from core.solver import BEAM_WIDTH, ACTION_REPEAT
+from solve_levels import solve_one
+from timestep import seeded
+from utils.recorder import InputLog, Replay
+
+RUNS = 200
+SECONDS = 4
+FULL_RUNS = 24
+# Idle steps a solved run is sent carrying on for past its win
+OVERRUN = 30
+CONCURRENCY = 32
+
+
+def recorded(level, inputs, overrun=0):
+    """(input log bytes, [replay bytes per loop]) for level played on inputs.
+
+    With overrun, both forms carry on that many idle steps past the end
+    of the level, as a client that kept recording would send them.
+    """
+    sim = Simulation(level)
+    sim.run(inputs)
+    log = InputLog(sim.input_log.inputs + bytes(overrun))
+    replays = list(sim.ghost_replays)
+    if len(sim.recorder.deltas) or not replays:
+        # A run that used every loop has nothing left in the recorder
+        replays.append(sim.recorder.get_moves())
+    if overrun:
+        replays[-1] = Replay(replays[-1].deltas + array('h', [0]) * (2 * overrun))
+    return log.to_bytes(), [replay.to_bytes() for replay in replays]
+
+
+def make_runs(pack, count, seconds=SECONDS):
+    """count (level, input log bytes, [replay bytes per loop]) runs, spread over every level."""
+    numbers = pack.numbers()
+    runs = []
+    for i in range(count):
+        number = numbers[i % len(numbers)]
+        runs.append((number, *recorded(pack.get(number), seeded(int(seconds * FPS), i))))
+    return runs
+
+
+def full_runs(pack, count):
+    # As long as every loop the level allows, so the later loops have ghosts
+    return make_runs(pack, count, LOOP_SECONDS * MAX_LOOPS)
+
+
+def solved_runs(pack, workers=None, overrun=OVERRUN):
+    """Every level's winning run from the solver, then each with `overrun` idle steps after the win."""
+    jobs = [(number, MAX_LOOPS, BEAM_WIDTH, ACTION_REPEAT) for number in pack.numbers()]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(solve_one, jobs))
+    runs = []
+    for extra in (0, overrun):
+        for result in results:
+            if result['solved']:
+                inputs = [value for loop in result['inputs'] for value in loop]
+                runs.append((result['level'], *recorded(pack.get(result['level']), inputs, extra)))
+    return runs
+
+
+def requests_for(runs):
+    bodies = []
+    for number, log, replays in runs:
+        bodies.append(json.dumps({'level': number, 'inputs': base64.b64encode(log).decode('ascii')}).encode())
+        bodies.append(json.dumps({'level': number, 'replays': [base64.b64encode(replay).decode('ascii')
+                                                               for replay in replays]}).encode())
+    return bodies
+
+
+async def post(reader, writer, host, body):
+    writer.write(f'POST /validate HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                 f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def send_all(host, port, bodies, concurrency):
+    """POST every body over `concurrency` kept-alive connections; returns ([(status, reply)], latencies, seconds)."""
+    replies = [None] * len(bodies)
+    latencies = []
+    queue = list(range(len(bodies)))
+    queue.reverse()
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while queue:
+                i = queue.pop()
+                sent = time.perf_counter()
+                replies[i] = await post(reader, writer, host, bodies[i])
+                latencies.append(time.perf_counter() - sent)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(min(concurrency, len(bodies)))))
+    return replies, latencies, time.perf_counter() - start
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def start_server(workers):
+    script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'validate_server.py')
+    command = [sys.executable, script, '--port', '0']
+    if workers:
+        command += ['--workers', str(workers)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    # The first line naming the address; pygame's banner may come before it
+    for line in server.stdout:
+        if line.startswith('validating runs at '):
+            return server, line.split()[3].rsplit('/', 1)[0]
+    raise RuntimeError('validate_server.py exited before serving')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test validate_server.py.')
+    parser.add_argument('--url', help='a running server (default: start one)')
+    parser.add_argument('--workers', type=int, default=None, help="the started server's pool size")
+    parser.add_argument('--runs', type=int, default=RUNS, help='distinct short runs, each sent in both forms')
+    parser.add_argument('--seconds', type=float, default=SECONDS, help='length of each short run')
+    parser.add_argument('--full-runs', type=int, default=FULL_RUNS, help='distinct runs as long as the loop limit')
+    parser.add_argument('--no-solve', action='store_true', help="skip the solver's winning runs")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='connections sending at once')
+    args = parser.parse_args(argv)
+
+    pack = LevelPack.load_default()
+    sets = [('short', make_runs(pack, args.runs, args.seconds)), ('full', full_runs(pack, args.full_runs))]
+    if not args.no_solve:
+        sets.append(('solved', solved_runs(pack, args.workers)))
+    server = None
+    url = args.url
+    if url is None:
+        server, url = start_server(args.workers)
+    host, port = url.split('://', 1)[-1].rstrip('/').rsplit(':', 1)
+    failed = 0
+    try:
+        for set_name, runs in sets:
+            bodies = requests_for(runs)
+            for name in ('simulated', 'cached'):
+                replies, latencies, seconds = asyncio.run(send_all(host, int(port), bodies, args.concurrency))
+                errors = sum(status != 200 for status, _ in replies)
+                # Both forms of a run must reach the same end
+                differ = sum(a[1].get(field) != b[1].get(field)
+                             for a, b in zip(replies[::2], replies[1::2])
+                             for field in ('status', 'loops', 'frames', 'reason')
+                             if a[0] == b[0] == 200)
+                failed += errors + differ
+                print(f'{set_name:<6} {name:<9} {len(bodies)} requests in {seconds:.2f}s: '
+                      f'{len(bodies) / seconds:.1f} validations/s, p50 {percentile(latencies, 0.5) * 1000:.1f} ms, '
+                      f'p99 {percentile(latencies, 0.99) * 1000:.1f} ms, {errors} error(s), {differ} disagreement(s)')
+            verdicts = Counter(reply.get('reason') or 'valid' for status, reply in replies if status == 200)
+            print(f'{set_name:<6} verdicts: ' + ', '.join(f'{count} {reason}' for reason, count in verdicts.most_common()))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
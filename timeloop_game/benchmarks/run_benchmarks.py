@@ -0,0 +1,501 @@
+"""Headless throughput benchmarks with baseline comparison.
+
+Run from the repository root:
+
+    python3 timeloop_game/benchmarks/run_benchmarks.py --out results.json
+    python3 timeloop_game/benchmarks/run_benchmarks.py --save-baseline baseline.json
+    python3 timeloop_game/benchmarks/run_benchmarks.py --baseline baseline.json
+
+Everything runs under SDL's dummy video driver on the scripted traces in
+traces.py, so two runs on one machine play identical games. Each timing
+is the best of --repeat runs. With --baseline, any metric that got worse
+by more than --tolerance is reported and the exit status is 1. Metrics
+in LIMITS have a fixed ceiling as well, checked on every run.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pygame
+import load_validate
+import timestep
+import traces
+from bench_collision import make_platforms
+from import_time import import_times, summarize
+from core.ghost import GhostSwarm
+from core.level_loader import LevelLoader
+from core.level_pack import LevelPack, compile_level, parse_level
+from core.player import Player
+from core.puzzle import PuzzleGraph, Button, Door, MovingPlatform
+from core.simulation import Simulation, FPS, INPUT_LEFT, INPUT_RIGHT, INPUT_JUMP, PLAYING
+from core.validation import validate_inputs, validate_replays
+from utils.recorder import InputLog, Recorder, Replay
+
+PLATFORM_COUNTS = (10, 100, 1000, 10000)
+GHOST_COUNTS = (1, 10, 50, 100)
+PLAYER_STEPS = 3000
+LOOP_FRAMES = 1200
+RENDER_WARMUP_LOOPS = 2
+RENDER_FRAMES = 120
+ALLOC_GHOSTS = 50
+ALLOC_FRAMES = 600
+TRIGGER_COUNTS = (1, 10, 100)
+ENTITY_COUNTS = (1, 10, 100)
+PUZZLE_FRAMES = 1200
+WORLD_SCREENS = (10, 100, 1000)
+WORLD_FRAMES = 1100  # inside one loop; about 7 screens of running right
+WORLD_SCRIPT = ((40, INPUT_RIGHT), (20, INPUT_RIGHT | INPUT_JUMP))
+VALIDATION_RUNS = 48
+VALIDATION_FULL_RUNS = 4
+TOLERANCE = 0.25
+# Ceilings that hold on any machine: a 50-ghost steady-state step leaves
+# about 4.4 KB transient (most of it the recorder growing), drawing its
+# frame about 94 KB (blit lists for 450 sprites), with about one gen-0
+# collection per 600 frames. Mismatches are 0 in any baseline, which a
+# relative tolerance can never flag
+LIMITS = {
+    'timestep/mismatches': 0,
+    'alloc/step_peak_transient_bytes': 8 * 1024,
+    'alloc/frame_peak_transient_bytes': 128 * 1024,
+    'alloc/retained_bytes_per_frame': 256,
+    'alloc/gc_gen0_per_1000_frames': 5,
+}
+
+HIGHER = 'higher'
+LOWER = 'lower'
+
+
+def best_of(repeat, fn):
+    return min(fn() for _ in range(repeat))
+
+
+def play(sim, trace):
+    for inputs in trace:
+        if sim.status != PLAYING:
+            break
+        sim.step(inputs)
+
+
+def bench_player(results, repeat):
+    trace = traces.scripted(PLAYER_STEPS)
+    for count in PLATFORM_COUNTS:
+        grid = LevelLoader.build_grid(make_platforms(count))
+
+        def run():
+            player = Player(100, 500)
+            start = time.perf_counter()
+            for inputs in trace:
+                player.apply_input(inputs & INPUT_LEFT, inputs & INPUT_RIGHT, inputs & INPUT_JUMP)
+                player.update(grid)
+                if player.rect.y > 600:
+                    player.place(100, 500)
+            return time.perf_counter() - start
+        results[f'player_update/{count}_platforms'] = (PLAYER_STEPS / best_of(repeat, run), 'steps/s', HIGHER)
+
+
+def recorded_replays(level, count):
+    replays = []
+    for seed in range(count):
+        sim = Simulation(level, loop_seconds=LOOP_FRAMES / FPS)
+        play(sim, traces.seeded(LOOP_FRAMES - 1, seed))
+        replays.append(sim.recorder.get_moves())
+    return replays
+
+
+def bench_ghosts(results, repeat, level):
+    # Ten distinct recordings, reused round-robin for the bigger swarms
+    pool = recorded_replays(level, 10)
+    for count in GHOST_COUNTS:
+        replays = [pool[i % len(pool)] for i in range(count)]
+
+        def run():
+            swarm = GhostSwarm(replays, level.player_start)
+            start = time.perf_counter()
+            for _ in range(LOOP_FRAMES):
+                swarm.step()
+                swarm.locate()
+            return time.perf_counter() - start
+        results[f'ghost_replay/{count}_ghosts'] = (LOOP_FRAMES / best_of(repeat, run), 'frames/s', HIGHER)
+
+
+def bench_recorder(results, level):
+    # One minute of play; positions come from a real run so the deltas vary
+    frames = 60 * FPS
+    sim = Simulation(level, loop_seconds=frames / FPS + 1)
+    positions = []
+    for inputs in traces.seeded(frames, 1):
+        sim.step(inputs)
+        positions.append(sim.player.rect.topleft)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    recorder = Recorder()
+    for pos in positions:
+        recorder.record(pos)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    results['recorder/bytes_per_minute'] = (allocated, 'bytes', LOWER)
+    results['recorder/replay_bytes_per_minute'] = (len(recorder.get_moves().to_bytes()), 'bytes', LOWER)
+
+
+def bench_level_load(results, repeat, numbers):
+    pack = LevelPack.load_default()
+    for number in numbers:
+        path = LevelLoader.level_path(number)
+
+        def load():
+            start = time.perf_counter()
+            LevelLoader.load_level(path)
+            return time.perf_counter() - start
+
+        def parse():
+            start = time.perf_counter()
+            parse_level(pack.buf, pack.index[number][0])
+            return time.perf_counter() - start
+        results[f'level_load/json/level_{number}'] = (best_of(repeat, load) * 1000, 'ms', LOWER)
+        results[f'level_load/pack/level_{number}'] = (best_of(repeat, parse) * 1000, 'ms', LOWER)
+
+
+def bench_render(results, repeat, numbers):
+    # Game draws the real frame; every level gets ghosts from earlier loops.
+    # Each level is drawn as shipped, then with dirty rects and still
+    # backgrounds the way a low-power setup runs it
+    from core.game import Game
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((800, 600))
+    modes = {'render': Game(screen, pygame.time.Clock()),
+             'render_dirty': Game(screen, pygame.time.Clock(), dirty_rects=True, parallax=False)}
+    for prefix, game in modes.items():
+        for number in numbers:
+            game.current_level = number
+            game.reset_game()
+            sim = game.sim
+            warmup = traces.seeded(LOOP_FRAMES * RENDER_WARMUP_LOOPS, number)
+            play(sim, warmup)
+            trace = traces.scripted(RENDER_FRAMES)
+
+            def run():
+                total = 0.0
+                for inputs in trace:
+                    if sim.status == PLAYING:
+                        sim.step(inputs)
+                    start = time.perf_counter()
+                    game.draw_frame()
+                    game.dirty.present()
+                    total += time.perf_counter() - start
+                return total / RENDER_FRAMES
+            results[f'{prefix}/level_{number}'] = (best_of(repeat, run) * 1000, 'ms/frame', LOWER)
+
+        def menu():
+            game.dirty.full()
+            start = time.perf_counter()
+            for phase in range(RENDER_FRAMES):
+                game.menu_frame(phase)
+            return (time.perf_counter() - start) / RENDER_FRAMES
+        results[f'{prefix}/menu'] = (best_of(repeat, menu) * 1000, 'ms/frame', LOWER)
+
+
+def bench_world(results, repeat):
+    # The same run through ever wider worlds, streamed from a compiled
+    # level: step and frame time, and what stays loaded, should not grow
+    from core.game import Game
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((800, 600))
+    game = Game(screen, pygame.time.Clock())
+    trace = traces.scripted(WORLD_FRAMES, WORLD_SCRIPT)
+    for screens in WORLD_SCREENS:
+        blob = compile_level(timestep.make_world(screens, np.random.default_rng(screens)))
+        name = f'world/{screens}_screens'
+
+        def parse():
+            start = time.perf_counter()
+            parse_level(blob, 0)
+            return time.perf_counter() - start
+        results[f'{name}/load'] = (best_of(repeat, parse) * 1000, 'ms', LOWER)
+        level = parse_level(blob, 0)
+
+        def steps():
+            sim = Simulation(level)
+            start = time.perf_counter()
+            play(sim, trace)
+            return (time.perf_counter() - start) / WORLD_FRAMES
+        results[f'{name}/step'] = (best_of(repeat, steps) * 1e6, 'us/frame', LOWER)
+
+        def frames():
+            game.reset_game(level)
+            sim = game.sim
+            start = time.perf_counter()
+            for inputs in trace:
+                sim.step(inputs)
+                game.draw_frame()
+            return (time.perf_counter() - start) / WORLD_FRAMES
+        results[f'{name}/frame'] = (best_of(repeat, frames) * 1000, 'ms/frame', LOWER)
+
+        # Memory in a separate pass, so tracing does not skew the timings
+        game.reset_game(level)
+        sim = game.sim
+        grid_peak = layer_peak = 0
+        gc.collect()
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        for inputs in trace:
+            sim.step(inputs)
+            game.draw_frame()
+            grid_peak = max(grid_peak, sim.grid.bytes)
+            layer_peak = max(layer_peak, game.chunk_layers.bytes)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f'{name}/python_peak_bytes'] = (peak - base, 'bytes', LOWER)
+        results[f'{name}/grid_peak_bytes'] = (grid_peak, 'bytes', LOWER)
+        results[f'{name}/layer_peak_bytes'] = (layer_peak, 'bytes', LOWER)
+
+
+def make_puzzle(triggers, rng):
+    # Buttons scattered over the screen, each wired to a door or platform
+    buttons = [Button((int(x), int(y), 40, 20)) for x, y in zip(rng.integers(0, 760, triggers),
+                                                                  rng.integers(0, 580, triggers))]
+    doors = [Door((0, 0, 40, 60), [b]) for b in buttons[::2]]
+    platforms = [MovingPlatform((0, 0, 80, 20), 0, 700, 2, [b]) for b in buttons[1::2]]
+    return PuzzleGraph(buttons, doors, platforms)
+
+
+def bench_puzzle(results, repeat):
+    # Entities drift across the screen, so buttons really press and release
+    rng = np.random.default_rng(0)
+    for triggers in TRIGGER_COUNTS:
+        for entities in ENTITY_COUNTS:
+            start_pos = rng.integers(0, 560, (2, entities)).astype(np.int32)
+            step = rng.integers(-3, 4, (2, entities)).astype(np.int32)
+
+            def run():
+                puzzle = make_puzzle(triggers, np.random.default_rng(triggers))
+                boxes = np.zeros((4, entities, 1), dtype=np.int32)
+                pos = start_pos.copy()
+                start = time.perf_counter()
+                for _ in range(PUZZLE_FRAMES):
+                    pos += step
+                    pos %= 560
+                    boxes[:2, :, 0] = pos
+                    boxes[2, :, 0] = pos[0] + 40
+                    boxes[3, :, 0] = pos[1] + 60
+                    puzzle.update(boxes)
+                return time.perf_counter() - start
+            name = f'puzzle_update/{triggers}_triggers_{entities}_entities'
+            results[name] = (best_of(repeat, run) / PUZZLE_FRAMES * 1e6, 'us/frame', LOWER)
+
+
+def bench_timestep(results, pack, numbers):
+    # Every level on the seeded traces at each rate: how much faster a
+    # coarse rate runs, and that it still plays out the same
+    levels = [(number, pack.get(number)) for number in numbers]
+    with open(os.devnull, 'w') as out:
+        mismatches, speed = timestep.check(levels, timestep.RATES, solve=False, out=out)
+    for rate in timestep.RATES:
+        results[f'timestep/{rate}hz_realtime'] = (speed[rate], 'x', HIGHER)
+    results['timestep/mismatches'] = (mismatches, 'runs', LOWER)
+
+
+def bench_validation(results, repeat, pack):
+    # One worker's share of the validation service: the load test's short
+    # runs and a few as long as the loop limit, with ghosts in every loop
+    # after the first, validated in process from their input logs and
+    # from their replays
+    sets = (('', load_validate.make_runs(pack, VALIDATION_RUNS)),
+            ('full_', load_validate.full_runs(pack, VALIDATION_FULL_RUNS)))
+    for prefix, made in sets:
+        runs = [(pack.get(number), InputLog.from_bytes(log), [Replay.from_bytes(replay) for replay in replays])
+                for number, log, replays in made]
+
+        def from_inputs():
+            start = time.perf_counter()
+            for level, log, _ in runs:
+                validate_inputs(level, log)
+            return time.perf_counter() - start
+
+        def from_replays():
+            start = time.perf_counter()
+            for level, _, replays in runs:
+                validate_replays(level, replays)
+            return time.perf_counter() - start
+
+        results[f'validation/{prefix}inputs'] = (len(runs) / best_of(repeat, from_inputs), 'runs/s', HIGHER)
+        results[f'validation/{prefix}replays'] = (len(runs) / best_of(repeat, from_replays), 'runs/s', HIGHER)
+
+
+def bench_allocations(results, level):
+    # Steady state with many ghosts on screen: simulate and draw a frame,
+    # tracking what each frame leaves behind and its transient peak
+    from core.game import Game
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((800, 600))
+    game = Game(screen, pygame.time.Clock())
+    game.reset_game()
+    sim = game.sim
+    # Long enough that no loop reset happens while measuring
+    sim.timer.total_frames = sim.timer.frames_left = ALLOC_FRAMES * 3
+    pool = recorded_replays(level, 10)
+    for i in range(ALLOC_GHOSTS):
+        sim.ghost_replays.append(pool[i % len(pool)])
+    sim.ghosts = GhostSwarm(sim.ghost_replays, sim.player_start)
+    sim.build_entity_boxes()
+    trace = traces.seeded(ALLOC_FRAMES * 2, 3)
+
+    def frame(inputs):
+        if sim.status == PLAYING:
+            sim.step(inputs)
+        game.draw_frame()
+
+    # Warm up, then measure the step apart from the frame it is drawn in
+    for inputs in trace[:ALLOC_FRAMES]:
+        frame(inputs)
+    gc.collect()
+    collections = gc.get_stats()[0]['collections']
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    step_peak = frame_peak = 0
+    for inputs in trace[ALLOC_FRAMES:]:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        if sim.status == PLAYING:
+            sim.step(inputs)
+        _, peak = tracemalloc.get_traced_memory()
+        step_peak = max(step_peak, peak - before)
+        game.draw_frame()
+        _, peak = tracemalloc.get_traced_memory()
+        frame_peak = max(frame_peak, peak - before)
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    collections = gc.get_stats()[0]['collections'] - collections
+    results['alloc/retained_bytes_per_frame'] = ((end - start) / ALLOC_FRAMES, 'bytes', LOWER)
+    results['alloc/step_peak_transient_bytes'] = (step_peak, 'bytes', LOWER)
+    results['alloc/frame_peak_transient_bytes'] = (frame_peak, 'bytes', LOWER)
+    results['alloc/gc_gen0_per_1000_frames'] = (collections * 1000 / ALLOC_FRAMES, 'collections', LOWER)
+
+
+def bench_startup(results, repeat):
+    # A fresh interpreter per run, so nothing is already imported or cached
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup.py')
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, script], check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+    results['startup/first_frame_ms'] = (min(run['first_frame_ms'] for run in runs), 'ms', LOWER)
+    results['startup/assets_ready_ms'] = (min(run['assets_ready_ms'] for run in runs), 'ms', LOWER)
+    results['startup/surfaces'] = (runs[0]['surfaces'], 'surfaces', LOWER)
+    imports = summarize(import_times('main', repeat))
+    results['startup/import_main_ms'] = (imports['total_ms'], 'ms', LOWER)
+    results['startup/import_game_ms'] = (imports['game_ms'], 'ms', LOWER)
+
+
+def run_all(repeat, only=None):
+    results = {}
+    pack = LevelPack.load_default()
+    numbers = pack.numbers()
+    level = pack.get(numbers[0])
+    groups = {
+        'player_update': lambda: bench_player(results, repeat),
+        'ghost_replay': lambda: bench_ghosts(results, repeat, level),
+        'recorder': lambda: bench_recorder(results, level),
+        'level_load': lambda: bench_level_load(results, repeat, numbers),
+        'puzzle': lambda: bench_puzzle(results, repeat),
+        'render': lambda: bench_render(results, repeat, numbers),
+        'world': lambda: bench_world(results, repeat),
+        'timestep': lambda: bench_timestep(results, pack, numbers),
+        'validation': lambda: bench_validation(results, repeat, pack),
+        'allocations': lambda: bench_allocations(results, level),
+        'startup': lambda: bench_startup(results, repeat),
+    }
+    for name, bench in groups.items():
+        if only and name not in only:
+            continue
+        start = time.perf_counter()
+        bench()
+        print(f'# {name} done in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+    return {name: {'value': float(f'{value:.5g}'), 'unit': unit, 'better': better}
+            for name, (value, unit, better) in results.items()}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Return the names of metrics that got worse than baseline by more than tolerance."""
+    regressions = []
+    print(f'{"metric":<36} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None or not base['value']:
+            print(f'{name:<36} {"-":>12} {current["value"]:>12.4g} {"new":>8}')
+            continue
+        change = current['value'] / base['value'] - 1
+        worse = -change if current['better'] == HIGHER else change
+        flag = ''
+        if worse > tolerance:
+            regressions.append(name)
+            flag = '  REGRESSED'
+        print(f'{name:<36} {base["value"]:>12.4g} {current["value"]:>12.4g} {change:>+8.1%}{flag}')
+    return regressions
+
+
+def over_limits(results, limits=LIMITS):
+    """Return the names of metrics above their ceiling in limits."""
+    over = []
+    for name, limit in limits.items():
+        if name in results and results[name]['value'] > limit:
+            print(f'{name:<36} {results[name]["value"]:>12.4g} over the limit of {limit:.4g}')
+            over.append(name)
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the headless benchmark suite.')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per timing, best one kept')
+    parser.add_argument('--only', nargs='*', help='benchmark groups to run (default: all)')
+    parser.add_argument('--out', help='write results JSON here')
+    parser.add_argument('--save-baseline', help='write results JSON here as the new baseline')
+    parser.add_argument('--baseline', help='compare against this results JSON')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='allowed relative slowdown before a metric counts as regressed')
+    args = parser.parse_args(argv)
+
+    results = run_all(args.repeat, args.only)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}: {", ".join(regressions)}')
+    else:
+        regressions = []
+        for name, result in results.items():
+            print(f'{name:<36} {result["value"]:>12.4g} {result["unit"]}')
+    return 1 if regressions or over_limits(results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Time from process start to the first menu frame, as main.py runs it.
+
+Run from the repository root; prints one JSON object:
+
+    python3 timeloop_game/benchmarks/startup.py
+
+first_frame_ms is measured from the first line of this script (the
+interpreter's own startup comes before it) to the first flip of the
+menu. assets_ready_ms is when every prefetched sprite has finished
+loading, which the game only waits for when a level starts. surfaces is
+how many Surfaces with pixels of their own (one per image file read) the
+sprites and backgrounds then take; atlas sprites are subsurfaces of a
+page and are not counted.
+"""
+import time
+STARTED = time.perf_counter()
+import json
+import os
+import sys
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+from core.game import Game
+from utils.assets import assets
+
+
+def main():
+    pygame.display.init()
+    screen = pygame.display.set_mode((800, 600))
+    game = Game(screen, pygame.time.Clock(), started=STARTED)
+    game.menu_frame(0)
+    assets.wait()
+    ready = (time.perf_counter() - STARTED) * 1000
+    surfaces = sum(1 for surface in assets.surfaces.values() if surface and surface.get_parent() is None)
+    print(json.dumps({'first_frame_ms': round(game.first_frame_ms, 3), 'assets_ready_ms': round(ready, 3),
+                      'surfaces': surfaces}))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+"""Check that a level plays out the same at any simulation rate.
+
+    python3 timeloop_game/benchmarks/timestep.py
+    python3 timeloop_game/benchmarks/timestep.py --rates 30 60 120 240 --no-solve
+
+Every level is played at each rate on the same inputs: the solver's
+winning run and a few seeded traces, all with inputs held for a whole
+number of every rate's steps. A rate passes when each run
+ends the same way as at 60 Hz, in the same loop; the worst gap between
+the player's positions at matching moments and the speed in simulated
+seconds per wall-clock second are printed alongside. Exits with status
+1 on any mismatch.
+
+Wide worlds are checked too: a few seeded ones, streamed in chunks at
+each of STREAM_RATES, must play step for step as they do loaded whole.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import traces
+from core.level_loader import LevelLoader
+from core.level_pack import LevelPack
+from core.simulation import Simulation, FPS, INPUT_JUMP, INPUT_RIGHT, LOOP_SECONDS, PLAYING, WON
+from core.solver import ACTION_REPEAT, solve_level
+
+RATES = (30, 60, 240)
+SEEDS = (0, 1, 2)
+# Inputs change every 8 60 Hz frames, a whole number of 30 Hz steps too
+HOLD_FRAMES = 8
+# Positions are compared this often, in 60 Hz frames
+SAMPLE_FRAMES = 6
+# Low enough that one step runs further than the chunk streaming margin
+STREAM_RATES = (60, 10, 4, 2)
+STREAM_SCREENS = (3, 10)
+
+
+def seeded(frames, seed):
+    rng = random.Random(seed)
+    trace = bytearray()
+    while len(trace) < frames:
+        trace.extend([rng.choice(traces.RANDOM_CHOICES)] * HOLD_FRAMES)
+    return bytes(trace[:frames])
+
+
+def resample(trace, rate):
+    # The input held at the start of each step at `rate`, from one per FPS frame
+    steps = -(-len(trace) * rate // FPS)
+    return bytes(trace[i * FPS // rate] for i in range(steps))
+
+
+def play(level, trace, rate):
+    """Play trace (per FPS frame) at `rate`; returns (outcome, samples, steps, seconds).
+
+    outcome is (status, loops played, loop time of the win in seconds or
+    None); samples the player's position every SAMPLE_FRAMES of the trace;
+    seconds is the wall-clock time the steps took.
+    """
+    sim = Simulation(level, fps=rate)
+    per_sample = SAMPLE_FRAMES * rate // FPS
+    samples = []
+    start = time.perf_counter()
+    for i, inputs in enumerate(resample(trace, rate)):
+        if sim.step(inputs) != PLAYING:
+            break
+        if per_sample and (i + 1) % per_sample == 0:
+            samples.append(sim.player.rect.topleft)
+    seconds = time.perf_counter() - start
+    won_at = None
+    if sim.status == WON:
+        won_at = round((sim.timer.total_frames - sim.timer.frames_left) / rate, 1)
+    return (sim.status, sim.loop_count, won_at), samples, sim.frame, seconds
+
+
+def level_traces(level, solve_rate=None):
+    frames = int(LOOP_SECONDS * FPS) * 3
+    runs = [(f'seed {seed}', seeded(frames, seed)) for seed in SEEDS]
+    if solve_rate:
+        # Actions as long in seconds as the solver's at FPS
+        repeat = max(1, ACTION_REPEAT * solve_rate // FPS)
+        result = solve_level(level, fps=solve_rate, repeat=repeat)
+        if result['solved']:
+            inputs = [i for loop in result['inputs'] for i in loop]
+            # Back to one input per FPS frame, holding the last a little longer
+            trace = [inputs[min(i * solve_rate // FPS, len(inputs) - 1)]
+                     for i in range(len(inputs) * FPS // solve_rate + HOLD_FRAMES)]
+            runs.insert(0, ('solution', bytes(trace)))
+    return runs
+
+
+def make_world(screens, rng):
+    # A floor per screen plus a few ledges, as a chunked level JSON
+    platforms = []
+    for screen in range(screens):
+        x = screen * 800
+        platforms.append([x, 560, 800, 40])
+        for _ in range(3):
+            platforms.append([x + int(rng.integers(0, 680)), int(rng.integers(300, 480)), 120, 20])
+    return {'world': [screens * 800, 600], 'platforms': platforms,
+            'player_start': [60, 500], 'exit': [screens * 800 - 60, 500, 40, 60]}
+
+
+def positions(level, trace, rate):
+    # Where the player is after every step, and how the run ended
+    sim = Simulation(level, fps=rate)
+    path = []
+    for inputs in resample(trace, rate):
+        status = sim.step(inputs)
+        path.append((sim.player.x, sim.player.y))
+        if status != PLAYING:
+            break
+    return sim.status, path
+
+
+def check_streaming(rates=STREAM_RATES, out=sys.stdout):
+    """Play seeded wide worlds streamed and whole; returns the mismatches.
+
+    The whole copy is the same level with one chunk as wide as the world,
+    so it keeps every platform in a flat grid.
+    """
+    mismatches = 0
+    frames = int(LOOP_SECONDS * FPS)
+    for screens in STREAM_SCREENS:
+        data = make_world(screens, np.random.default_rng(screens))
+        chunked = LevelLoader.from_dict(data)
+        whole = LevelLoader.from_dict(dict(data, chunk_width=data['world'][0]))
+        # Mostly running right, so the player crosses chunk edges
+        runs = [('right', traces.scripted(frames, ((40, INPUT_RIGHT), (20, INPUT_RIGHT | INPUT_JUMP))))]
+        runs += [(f'seed {seed}', seeded(frames, seed)) for seed in SEEDS]
+        for name, trace in runs:
+            for rate in rates:
+                same = positions(chunked, trace, rate) == positions(whole, trace, rate)
+                if not same:
+                    mismatches += 1
+                print(f'world {screens:>3} screens {name:<10} {rate:>4} Hz'
+                      f'  {"same as whole" if same else "MISMATCH"}', file=out)
+    return mismatches
+
+
+def check(levels, rates=RATES, solve=True, out=sys.stdout):
+    """Play every level at every rate; returns (mismatches, {rate: sim seconds per second}).
+
+    The winning runs are searched for at the lowest rate: the exit is only
+    tested once a step, and every moment a coarse step tests a finer one
+    tests too, so a win found there is a win at any rate it divides. One
+    found at 60 Hz can hinge on touching the exit between two 30 Hz steps.
+    """
+    solve_rate = min(rates) if solve else None
+    mismatches = 0
+    simulated = dict.fromkeys(rates, 0.0)
+    wall = dict.fromkeys(rates, 0.0)
+    for number, level in levels:
+        runs = level_traces(level, solve_rate)
+        if solve_rate and runs[0][0] != 'solution':
+            print(f'level {number:>3} no solution found at {solve_rate} Hz', file=out)
+        for name, trace in runs:
+            reference, ref_samples, _, _ = play(level, trace, FPS)
+            for rate in rates:
+                outcome, samples, steps, seconds = play(level, trace, rate)
+                simulated[rate] += steps / rate
+                wall[rate] += seconds
+                drift = max((abs(x - rx) + abs(y - ry) for (x, y), (rx, ry) in zip(samples, ref_samples)),
+                            default=0)
+                same = (outcome[:2] == reference[:2]
+                        and (outcome[2] is None) == (reference[2] is None))
+                if not same:
+                    mismatches += 1
+                print(f'level {number:>3} {name:<10} {rate:>4} Hz  {outcome[0]:<7} loops {outcome[1]}'
+                      f'  won at {outcome[2]}  drift {drift:>3} px{"" if same else "  MISMATCH"}', file=out)
+    speed = {rate: simulated[rate] / wall[rate] if wall[rate] else 0.0 for rate in rates}
+    return mismatches, speed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare level outcomes across simulation rates.')
+    parser.add_argument('--rates', type=int, nargs='*', default=list(RATES), help='simulation rates in Hz')
+    parser.add_argument('--no-solve', action='store_true', help="skip the solver's winning runs")
+    args = parser.parse_args(argv)
+    pack = LevelPack.load_default()
+    levels = [(number, pack.get(number)) for number in pack.numbers()]
+    mismatches, speed = check(levels, args.rates, not args.no_solve)
+    mismatches += check_streaming()
+    for rate in args.rates:
+        print(f'{rate:>4} Hz: {speed[rate]:.0f}x realtime')
+    print(f'{mismatches} mismatch(es)')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Deterministic input traces for the benchmarks.
+
+A trace is one input bitmask byte per frame (INPUT_LEFT/RIGHT/JUMP), so
+every run of a benchmark plays exactly the same game.
+"""
+import random
+
+from core.simulation import INPUT_LEFT, INPUT_RIGHT, INPUT_JUMP
+
+# Walk right, hop, keep running, jump back left, then stand (frames, inputs)
+SCRIPT = (
+    (60, INPUT_RIGHT),
+    (20, INPUT_RIGHT | INPUT_JUMP),
+    (40, INPUT_RIGHT),
+    (30, INPUT_LEFT | INPUT_JUMP),
+    (50, INPUT_LEFT),
+    (40, 0),
+)
+RANDOM_CHOICES = (0, INPUT_LEFT, INPUT_RIGHT, INPUT_RIGHT, INPUT_JUMP,
+                  INPUT_RIGHT | INPUT_JUMP, INPUT_RIGHT | INPUT_JUMP, INPUT_LEFT | INPUT_JUMP)
+HOLD_FRAMES = 7
+
+
+def scripted(frames, script=SCRIPT):
+    trace = bytearray()
+    while len(trace) < frames:
+        for count, inputs in script:
+            trace.extend([inputs] * count)
+    return bytes(trace[:frames])
+
+
+def seeded(frames, seed):
+    # Random, but each input is held for HOLD_FRAMES like a human would
+    rng = random.Random(seed)
+    trace = bytearray()
+    while len(trace) < frames:
+        trace.extend([rng.choice(RANDOM_CHOICES)] * HOLD_FRAMES)
+    return bytes(trace[:frames])
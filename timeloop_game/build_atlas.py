@@ -0,0 +1,37 @@
+"""Pack the sprites the game uses into the sprite atlas.
+
+Run from the repository root:
+
+    python3 timeloop_game/build_atlas.py
+
+prebake.py already does this after rasterizing; run this on its own when
+the rasters came from shipped PNGs or were baked elsewhere. Without an
+atlas the game loads every sprite from its own file.
+"""
+import argparse
+import sys
+import time
+
+from utils.assets import CACHE_DIR
+from utils.atlas import PAGE_SIZE, atlas_specs, build_atlas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pack the referenced sprites into atlas pages.')
+    parser.add_argument('--out', default=CACHE_DIR, help='directory for the pages and atlas.json')
+    parser.add_argument('--page-size', type=int, nargs=2, default=PAGE_SIZE, metavar=('W', 'H'),
+                        help='page size in pixels')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    try:
+        sprites, pages = build_atlas(cache_dir=args.out, page_size=tuple(args.page_size))
+    except ValueError as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 1
+    print(f'{sprites} of {len(atlas_specs())} sprites packed into {pages} page(s) '
+          f'in {time.perf_counter() - start:.3f}s -> {args.out}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,56 @@
+"""Compile levels/level_N.json into the binary level pack.
+
+Run from the repository root:
+
+    python3 timeloop_game/compile_levels.py
+    python3 timeloop_game/compile_levels.py --check
+
+The game reads levels/levels.pack when it exists and is newer than the
+JSON it was compiled from, and otherwise compiles the JSON in memory at
+startup. --check writes nothing and exits 1 unless the pack's checksum
+matches the JSON as it is now, for when mtimes cannot be trusted (a
+fresh checkout, a CI cache).
+"""
+import argparse
+import struct
+import sys
+import time
+
+from core.level_loader import LEVEL_DIR
+from core.level_pack import PACK_FILE, LevelPack, level_files, source_checksum, write_pack
+
+
+def check(path, level_dir):
+    try:
+        pack = LevelPack.open(path)
+    except (OSError, ValueError, struct.error) as exc:
+        print(f'{path}: unreadable ({exc})', file=sys.stderr)
+        return 1
+    if pack.checksum != source_checksum(level_files(level_dir)):
+        print(f'{path}: out of date with {level_dir}', file=sys.stderr)
+        return 1
+    print(f'{path}: up to date, {len(pack)} levels')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile level JSON files into a binary level pack.')
+    parser.add_argument('--levels', default=LEVEL_DIR, help='directory containing level_N.json')
+    parser.add_argument('--out', default=PACK_FILE, help='pack file to write')
+    parser.add_argument('--check', action='store_true', help='only check that the pack matches the JSON')
+    args = parser.parse_args(argv)
+    if args.check:
+        return check(args.out, args.levels)
+    start = time.perf_counter()
+    try:
+        data = write_pack(args.out, args.levels)
+    except ValueError as exc:
+        print(f'error: {exc}', file=sys.stderr)
+        return 1
+    pack = LevelPack(data)
+    print(f'{len(pack)} levels, {len(data)} bytes -> {args.out} in {time.perf_counter() - start:.3f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import pygame
+from core.world import ChunkTable
+from utils.profiler import profiler
+
+# The target can move this far (w, h) around the screen centre before the view scrolls
+CAMERA_DEADZONE = (160, 120)
+# Baked chunk surfaces kept for a chunked world, in bytes (about six
+# 800x600 columns)
+LAYER_BUDGET = 12 * 1024 * 1024
+
+
+class Camera:
+    """The screen's window onto the world, following a target Rect.
+
+    view is the part of the world on screen, in world coordinates; offset
+    is what to add to a world position to draw it. The view only scrolls
+    when the target leaves a deadzone around the screen centre, and never
+    past the world's edges. A world smaller than the screen is centred in
+    it, so a one-screen level on an 800x600 display keeps the view at
+    (0, 0) and draws exactly as it did before there was a camera.
+    """
+
+    def __init__(self, view_size, world, deadzone=CAMERA_DEADZONE):
+        self.view = pygame.Rect((0, 0), view_size)
+        self.world = pygame.Rect(world)
+        self.deadzone = deadzone
+        self.scrolls = self.world.w > self.view.w or self.world.h > self.view.h
+        self.clamp()
+
+    @property
+    def offset(self):
+        return (-self.view.x, -self.view.y)
+
+    @property
+    def identity(self):
+        # World and screen coordinates are the same; nothing needs moving
+        return not self.scrolls and self.view.topleft == (0, 0)
+
+    def clamp(self):
+        view, world = self.view, self.world
+        if world.w <= view.w:
+            view.x = world.x - (view.w - world.w) // 2
+        else:
+            view.x = min(max(view.x, world.left), world.right - view.w)
+        if world.h <= view.h:
+            view.y = world.y - (view.h - world.h) // 2
+        else:
+            view.y = min(max(view.y, world.top), world.bottom - view.h)
+
+    def snap(self, rect):
+        self.view.center = rect.center
+        self.clamp()
+
+    def follow(self, rect):
+        """Scroll just enough to keep rect's centre in the deadzone.
+
+        Returns True when the view moved, i.e. every pixel on screen did.
+        """
+        if not self.scrolls:
+            return False
+        before = self.view.topleft
+        half_w, half_h = self.deadzone[0] // 2, self.deadzone[1] // 2
+        cx, cy = self.view.center
+        tx, ty = rect.center
+        if tx > cx + half_w:
+            cx = tx - half_w
+        elif tx < cx - half_w:
+            cx = tx + half_w
+        if ty > cy + half_h:
+            cy = ty - half_h
+        elif ty < cy - half_h:
+            cy = ty + half_h
+        self.view.center = (cx, cy)
+        self.clamp()
+        return self.view.topleft != before
+
+    def visible(self, rect):
+        return self.view.colliderect(rect)
+
+
+class ChunkLayers:
+    """Baked static surfaces for the columns of a chunked world.
+
+    draw() blits the columns the view overlaps, baking any that are not
+    cached with bake(chunk), then drops the least recently drawn columns
+    while the cached surfaces add up to more than budget bytes. Columns
+    the view has just left stay while there is room, so turning back
+    costs nothing.
+    """
+
+    def __init__(self, table, bake, budget=LAYER_BUDGET):
+        self.table = table
+        self.bake = bake
+        self.budget = budget
+        self.layers = OrderedDict()  # column -> Surface, least recent first
+        self.bytes = 0
+
+    def draw(self, surface, view):
+        width = self.table.chunk_width
+        window = ChunkTable.columns(view.left, view.right, width, len(self.table))
+        layers = self.layers
+        for chunk in window:
+            layer = layers.get(chunk)
+            if layer is None:
+                layer = layers[chunk] = self.bake(chunk)
+                self.bytes += layer.get_width() * layer.get_height() * layer.get_bytesize()
+                profiler.count('chunk_bakes')
+            else:
+                layers.move_to_end(chunk)
+            surface.blit(layer, (chunk * width - view.x, -view.y))
+        profiler.count('blits', len(window))
+        for chunk in list(layers):
+            if self.bytes <= self.budget:
+                break
+            if chunk not in window:
+                layer = layers.pop(chunk)
+                self.bytes -= layer.get_width() * layer.get_height() * layer.get_bytesize()
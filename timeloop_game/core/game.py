@@ -1,104 +1,250 @@
-import os
 import pygame
 import math
-try:
-    import cairosvg
-except ImportError:
-    cairosvg = None
-from core.player import Player
-from core.ghost import Ghost
-from core.level_loader import LevelLoader
-from core.timer import Timer
-from utils.recorder import Recorder
-from core.puzzle import Button, Door, MovingPlatform
+import time
+from core.camera import Camera, ChunkLayers
+from core.level_pack import LevelPack
+from core.simulation import Simulation, inputs_from_keys, FPS, PLAYING
+from utils.assets import CHARACTER_SIZE, assets
+from utils.audio import audio
+from utils.dirty import DirtyRects
+from utils.profiler import profiler
+from utils.text import text_cache
+
+MAX_STEPS_PER_FRAME = 5
+BACKGROUNDS = ('Backgrounds/background_color_hills', 'Backgrounds/background_color_trees')
+# Where the loop and timer texts go, and how much of the top right corner
+# the level text takes; restored whole every frame
+HUD_RECT = (0, 0, 280, 100)
+HUD_LEVEL_SIZE = (210, 60)
+MENU_BG = (18, 22, 40)
+# How long a notice (a file written, say) stays at the bottom of the screen
+NOTICE_MS = 3000
+# With dirty rects on, the menu stops animating and sleeps after this
+MENU_IDLE_MS = 10000
+MENU_COLORS = ['green', 'beige', 'pink', 'purple', 'yellow']
+COLOR_NAMES = {
+    'green': 'Zeno',
+    'beige': 'Nova',
+    'pink': 'Luna',
+    'purple': 'Echo',
+    'yellow': 'Bolt'
+}
+COLOR_DESC = {
+    'green': 'The Time Explorer',
+    'beige': 'The Puzzle Genius',
+    'pink': 'The Agile Jumper',
+    'purple': 'The Ghost Whisperer',
+    'yellow': 'The Speed Runner'
+}
 
 class Game:
-    def __init__(self, screen, clock, player_choice=None):
+    def __init__(self, screen, clock, player_choice=None, started=None, dirty_rects=False, parallax=True,
+                 sim_rate=FPS):
         self.screen = screen
         self.clock = clock
+        # Simulation steps per second; drawing stays at up to 60 fps either way
+        self.sim_rate = sim_rate
+        self.step_ms = 1000.0 / sim_rate
         self.player_choice = player_choice or 'green'
-        self.level_count = 10
-        self.current_level = 1
-        pygame.mixer.init()
-        self.snd_win = pygame.mixer.Sound('timeloop_game/assets/sounds/win.wav')
-        self.snd_lose = pygame.mixer.Sound('timeloop_game/assets/sounds/lose.wav')
-        self.snd_button = pygame.mixer.Sound('timeloop_game/assets/sounds/button.wav')
-        # Parallax backgrounds
+        self.levels = LevelPack.load_default()
+        self.level_count = len(self.levels)
+        self.current_level = self.levels.numbers()[0]
+        # Sprites and sounds stream in on loader threads while the menu
+        # runs; reset_game() waits for whatever is still missing
+        assets.prefetch()
+        audio.start()
+        self.started = time.perf_counter() if started is None else started
+        self.first_frame_ms = None
+        self.selected_color = 0
+        # Parallax backgrounds; when they hold still, the backdrop (them
+        # plus the static layer) lets dirty-rect frames repaint only what moved
         self.bg_layers = []
         self.bg_offsets = [0, 0]
         self.bg_speeds = [0.2, 0.5]
-        bg_files = [
-            ('timeloop_game/assets/Backgrounds/background_color_hills.svg', 'timeloop_game/assets/Backgrounds/background_color_hills.png'),
-            ('timeloop_game/assets/Backgrounds/background_color_trees.svg', 'timeloop_game/assets/Backgrounds/background_color_trees.png')
-        ]
-        for i, (svg_path, png_path) in enumerate(bg_files):
-            if os.path.exists(png_path):
-                img = pygame.image.load(png_path).convert_alpha()
-                img = pygame.transform.scale(img, (800, 600))
-                self.bg_layers.append(img)
-            elif os.path.exists(svg_path) and cairosvg:
-                cairosvg.svg2png(url=svg_path, write_to=png_path, output_width=800, output_height=600)
-                img = pygame.image.load(png_path).convert_alpha()
-                img = pygame.transform.scale(img, (800, 600))
-                self.bg_layers.append(img)
-            else:
-                self.bg_layers.append(None)
-        # Platform tile (use block_plank.svg for a more appealing look)
+        self.parallax = parallax
+        self.backdrop = None
         self.tile_img = None
-        tile_svg = 'timeloop_game/assets/Tiles/block_plank.svg'
-        tile_png = 'timeloop_game/assets/Tiles/block_plank.png'
-        if os.path.exists(tile_png):
-            self.tile_img = pygame.image.load(tile_png).convert_alpha()
-        elif os.path.exists(tile_svg) and cairosvg:
-            cairosvg.svg2png(url=tile_svg, write_to=tile_png, output_width=40, output_height=20)
-            self.tile_img = pygame.image.load(tile_png).convert_alpha()
-        self.reset_game()
+        self.dirty = DirtyRects(screen.get_size(), dirty_rects)
+        # The HUD and banners are laid out for 800x600; on a larger display
+        # the level text keeps to the right edge and the banners to the middle
+        width, height = screen.get_size()
+        self.hud_rects = (pygame.Rect(HUD_RECT), pygame.Rect((width - HUD_LEVEL_SIZE[0], 0), HUD_LEVEL_SIZE))
+        self.banner_shift = ((width - 800) // 2, (height - 600) // 2)
+        self.camera = None
+        self.chunk_layers = None
+        self.menu_idle_ms = MENU_IDLE_MS if dirty_rects else None
+        # Fade ghost trails in one shared layer instead of per-ghost copies
+        self.accumulate_trails = False
+        self.sim = None
         self.show_menu = True
-        self.button_was_pressed = False
+        self.notice = None  # (text, ticks it goes away at)
 
-    def draw_parallax_background(self):
+    def draw_parallax_background(self, surface=None):
+        # Layers are screen-wide, so one or two blits always cover the view;
+        # they drift on their own and scroll with the camera at their speed
+        surface = surface or self.screen
+        scroll = self.camera.view.x if self.camera else 0
         for i, img in enumerate(self.bg_layers):
             if img:
-                x = int(self.bg_offsets[i]) % img.get_width()
-                for k in range(-1, 3):
-                    self.screen.blit(img, (k * img.get_width() - x, 0))
+                width = img.get_width()
+                x = int(self.bg_offsets[i] + scroll * self.bg_speeds[i]) % width
+                surface.blit(img, (-x, 0))
+                profiler.count('blits')
+                if x:
+                    surface.blit(img, (width - x, 0))
+                    profiler.count('blits')
 
-    def draw_platforms(self):
-        for plat in self.platforms:
-            if self.tile_img:
-                tiles = plat.width // 40
-                for i in range(tiles):
-                    self.screen.blit(self.tile_img, (plat.x + i*40, plat.y))
+    def draw_platforms(self, surface=None, platforms=None, offset=(0, 0)):
+        surface = surface or self.screen
+        ox, oy = offset
+        tile = self.tile_img
+        blits = []
+        for plat in self.sim.platforms if platforms is None else platforms:
+            if tile:
+                # Tiles are collected for a single blits() call
+                x, y = plat.x + ox, plat.y + oy
+                blits.extend((tile, (x + i*40, y)) for i in range(plat.width // 40))
             else:
-                pygame.draw.rect(self.screen, (120, 90, 60), plat, border_radius=8)
-                pygame.draw.rect(self.screen, (80, 60, 40), plat, 3, border_radius=8)
+                plat = plat.move(offset)
+                pygame.draw.rect(surface, (120, 90, 60), plat, border_radius=8)
+                pygame.draw.rect(surface, (80, 60, 40), plat, 3, border_radius=8)
+        if blits:
+            surface.blits(blits, doreturn=False)
+
+    def bake_static_layer(self):
+        # Platforms and the exit never change within a level, so they are
+        # drawn once here and blitted as a single surface every frame
+        layer = pygame.Surface(self.sim.level.world.size, pygame.SRCALPHA).convert_alpha()
+        self.draw_platforms(layer)
+        pygame.draw.rect(layer, (0, 255, 100), self.sim.exit_rect, border_radius=8)
+        return layer
+
+    def bake_chunk(self, chunk):
+        # The same, one column of a chunked world at a time
+        level = self.sim.level
+        x = chunk * level.chunks.chunk_width
+        layer = pygame.Surface((level.chunks.chunk_width, level.world.h), pygame.SRCALPHA).convert_alpha()
+        self.draw_platforms(layer, level.chunks.platforms(chunk), (-x, 0))
+        pygame.draw.rect(layer, (0, 255, 100), self.sim.exit_rect.move(-x, 0), border_radius=8)
+        return layer
+
+    def draw_static(self, surface):
+        if self.chunk_layers is None:
+            surface.blit(self.static_layer, self.camera.offset)
+            profiler.count('blits')
+        else:
+            self.chunk_layers.draw(surface, self.camera.view)
 
-    def reset_game(self):
-        level_path = f'timeloop_game/levels/level_{self.current_level}.json'
-        (self.platforms, self.player_start, self.exit_rect,
-         button_rect, door_rect, moving_platform_data) = LevelLoader.load_level(level_path)
-        self.player = Player(*self.player_start, color=self.player_choice)
-        self.timer = Timer(20)
-        self.recorder = Recorder()
-        self.ghosts = []
-        self.ghost_replays = []
-        self.won = False
+    def bake_backdrop(self):
+        backdrop = pygame.Surface(self.screen.get_size()).convert()
+        self.draw_parallax_background(backdrop)
+        self.draw_static(backdrop)
+        return backdrop
+
+    def dynamic_rects(self):
+        # Everything draw_frame puts over the backdrop, in screen coordinates
+        sim = self.sim
+        rects = sim.puzzle.bounds() + sim.ghosts.bounds()
+        rects.append(sim.player.rect.copy())
+        camera = self.camera
+        if not camera.identity:
+            screen = self.screen.get_rect()
+            offset = camera.offset
+            rects = [rect.move(offset) for rect in rects]
+            rects = [rect for rect in rects if rect.colliderect(screen)]
+        rects.extend(rect.copy() for rect in self.hud_rects)
+        return rects
+
+    def reset_game(self, level=None):
+        # level defaults to the current one from the pack
+        assets.wait()
+        self.bg_layers = [assets.load(name, self.screen.get_size()) for name in BACKGROUNDS]
+        # Platform tile (use block_plank.svg for a more appealing look)
+        self.tile_img = assets.load('Tiles/block_plank', (40, 20))
+        self.sim = Simulation(level or self.levels.get(self.current_level), self.player_choice, fps=self.sim_rate)
+        level = self.sim.level
+        self.camera = Camera(self.screen.get_size(), level.world)
+        self.camera.snap(self.sim.player.rect)
+        if level.chunks is None:
+            self.static_layer = self.bake_static_layer()
+            self.chunk_layers = None
+        else:
+            # Wide worlds bake only the columns the camera reaches
+            self.static_layer = None
+            self.chunk_layers = ChunkLayers(level.chunks, self.bake_chunk)
+        self.backdrop = None
+        self.dirty.full()
         self.win_time = None
-        self.lost = False
         self.lose_time = None
-        self.max_loops = 3
-        self.loop_count = 0
-        self.button = Button(button_rect) if button_rect else None
-        self.door = Door(door_rect, self.button) if door_rect and self.button else None
-        self.moving_platform = None
-        if moving_platform_data:
-            self.moving_platform = MovingPlatform(
-                moving_platform_data['rect'],
-                moving_platform_data['x1'],
-                moving_platform_data['x2'],
-                moving_platform_data['speed']
-            )
-        self.button_was_pressed = False
+        self.accumulator = 0.0
+
+    def play_events(self, events):
+        for event in events:
+            if event == 'button':
+                audio.play('button')
+            elif event == 'win':
+                self.win_time = pygame.time.get_ticks()
+                audio.play('win')
+                # Parse the next level while the win banner is up
+                self.levels.preload(self.next_level())
+            elif event == 'lose':
+                self.lose_time = pygame.time.get_ticks()
+                audio.play('lose')
+
+    def next_level(self):
+        # Level numbers need not run 1..N without gaps; wrap to the first
+        numbers = self.levels.numbers()
+        later = [n for n in numbers if n > self.current_level]
+        return later[0] if later else numbers[0]
+
+    def draw_frame(self):
+        # Everything but the win/lose banners and the profiler overlay
+        sim = self.sim
+        dirty = self.dirty
+        camera = self.camera
+        if camera.follow(sim.player.rect):
+            # Scrolling moves every pixel, backdrop included
+            self.backdrop = None
+            dirty.full()
+        view = None if camera.identity else camera.view
+        if dirty.enabled:
+            if self.parallax or self.accumulate_trails:
+                # Scrolling layers and the fading trail layer touch every pixel
+                dirty.full()
+            dirty.extend(self.dynamic_rects())
+        if dirty.enabled and not self.parallax:
+            with profiler.section('background'):
+                # Restore the backdrop only where things were or will be drawn
+                if self.backdrop is None:
+                    self.backdrop = self.bake_backdrop()
+                rects = dirty.repaint() if dirty.partial() else [self.screen.get_rect()]
+                for rect in rects:
+                    self.screen.blit(self.backdrop, rect, rect)
+                profiler.count('blits', len(rects))
+        else:
+            with profiler.section('background'):
+                # Animate parallax
+                if self.parallax:
+                    for i in range(len(self.bg_layers)):
+                        self.bg_offsets[i] += self.bg_speeds[i]
+                self.draw_parallax_background()
+            with profiler.section('static'):
+                self.draw_static(self.screen)
+        with profiler.section('puzzle_draw'):
+            sim.puzzle.draw(self.screen, view)
+        with profiler.section('ghosts_draw'):
+            sim.ghosts.draw(self.screen, self.accumulate_trails, view)
+        with profiler.section('player_draw'):
+            sim.player.draw(self.screen, camera.offset)
+        with profiler.section('hud'):
+            sim.timer.draw(self.screen)
+            loop_text = text_cache.render(f"Loops: {sim.loop_count}/{sim.max_loops}", 'comicsansms', 32, (255, 255, 255), bold=True)
+            self.screen.blit(loop_text, (10, 10))
+            timer_text = text_cache.render(f"Time: {int(sim.timer.time_left)}", 'comicsansms', 32, (255, 255, 255), bold=True)
+            self.screen.blit(timer_text, (10, 50))
+            level_text = text_cache.render(f"Level: {self.current_level}/{self.level_count}", 'comicsansms', 32, (255, 255, 0), bold=True)
+            self.screen.blit(level_text, (self.hud_rects[1].x + 10, 10))
+            profiler.count('blits', 4)
 
     def run(self):
         while True:
@@ -107,174 +253,206 @@ class Game:
                 self.reset_game()
                 self.show_menu = False
             self.running = True
+            self.clock.tick()
             while self.running:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        return
-                if not self.won and not self.lost:
-                    keys = pygame.key.get_pressed()
-                    if self.moving_platform:
-                        self.moving_platform.update()
-                    platforms = self.platforms[:]
-                    if self.moving_platform:
-                        platforms.append(self.moving_platform.rect)
-                    self.player.handle_input(keys)
-                    self.player.update(platforms)
-                    self.recorder.record((self.player.rect.x, self.player.rect.y))
-                    self.timer.update()
-                    for ghost in self.ghosts:
-                        ghost.update()
-                    entities = [self.player] + self.ghosts
-                    if self.button:
-                        self.button.update(entities)
-                        if self.button.pressed and not self.button_was_pressed:
-                            self.snd_button.play()
-                        self.button_was_pressed = self.button.pressed
-                    if self.door:
-                        self.door.update()
-                    if self.timer.is_time_up():
-                        self.ghost_replays.append(self.recorder.get_moves())
-                        self.ghosts = [Ghost(moves, self.player_start, color=self.player_choice) for moves in self.ghost_replays]
-                        self.player = Player(*self.player_start, color=self.player_choice)
-                        self.recorder = Recorder()
-                        self.timer.reset()
-                        self.loop_count += 1
-                        if self.loop_count >= self.max_loops:
-                            self.lost = True
-                            self.lose_time = pygame.time.get_ticks()
-                            self.snd_lose.play()
-                    can_exit = (not self.door or self.door.open)
-                    if can_exit and self.player.rect.colliderect(self.exit_rect):
-                        self.won = True
-                        self.win_time = pygame.time.get_ticks()
-                        self.snd_win.play()
-                # Animate parallax
-                for i in range(len(self.bg_layers)):
-                    self.bg_offsets[i] += self.bg_speeds[i]
-                self.draw_parallax_background()
-                self.draw_platforms()
-                if self.moving_platform:
-                    self.moving_platform.draw(self.screen)
-                if self.button:
-                    self.button.draw(self.screen)
-                if self.door:
-                    self.door.draw(self.screen)
-                pygame.draw.rect(self.screen, (0, 255, 100), self.exit_rect, border_radius=8)
-                for ghost in self.ghosts:
-                    ghost.draw(self.screen)
-                self.player.draw(self.screen)
-                self.timer.draw(self.screen)
-                font = pygame.font.SysFont('comicsansms', 32, bold=True)
-                loop_text = font.render(f"Loops: {self.loop_count}/{self.max_loops}", True, (255, 255, 255))
-                self.screen.blit(loop_text, (10, 10))
-                timer_text = font.render(f"Time: {int(self.timer.time_left)}", True, (255, 255, 255))
-                self.screen.blit(timer_text, (10, 50))
-                level_text = font.render(f"Level: {self.current_level}/10", True, (255, 255, 0))
-                self.screen.blit(level_text, (600, 10))
-                if self.won:
-                    font = pygame.font.SysFont('comicsansms', 48, bold=True)
-                    text = font.render("You Escaped!", True, (255, 255, 0))
-                    self.screen.blit(text, (220, 250))
+                profiler.begin_frame()
+                with profiler.section('input'):
+                    for event in pygame.event.get():
+                        if event.type == pygame.QUIT:
+                            return
+                        if event.type == pygame.KEYDOWN:
+                            if event.key == pygame.K_F3:
+                                profiler.toggle()
+                            elif event.key == pygame.K_F4 and profiler.frames:
+                                try:
+                                    self.notify('Profile written to %s and %s' % profiler.export())
+                                except OSError as exc:
+                                    self.notify(f'Profile not written: {exc.strerror or exc}')
+                            elif event.key == pygame.K_F5:
+                                path = time.strftime(f'timeloop_level_{self.current_level}_%Y%m%d_%H%M%S.inputs')
+                                try:
+                                    self.sim.input_log.save(path)
+                                except OSError as exc:
+                                    self.notify(f'Inputs not written: {exc.strerror or exc}')
+                                else:
+                                    self.notify(f'Inputs written to {path}')
+                    inputs = inputs_from_keys(pygame.key.get_pressed())
+                sim = self.sim
+                # Fixed timestep: a slow frame runs extra steps instead of
+                # stretching one, up to MAX_STEPS_PER_FRAME
+                steps = 0
+                with profiler.section('sim'):
+                    while self.accumulator >= self.step_ms and steps < MAX_STEPS_PER_FRAME:
+                        self.accumulator -= self.step_ms
+                        steps += 1
+                        if sim.status != PLAYING:
+                            break
+                        sim.step(inputs)
+                        self.play_events(sim.events)
+                if steps == MAX_STEPS_PER_FRAME:
+                    self.accumulator = 0.0
+                profiler.count('sim_steps', steps)
+                self.draw_frame()
+                if sim.won:
+                    text = text_cache.render("You Escaped!", 'comicsansms', 48, (255, 255, 0), bold=True)
+                    dx, dy = self.banner_shift
+                    self.dirty.add(self.screen.blit(text, (220 + dx, 250 + dy)))
                     if pygame.time.get_ticks() - self.win_time > 2000:
-                        self.current_level += 1
-                        if self.current_level > self.level_count:
-                            self.current_level = 1
+                        self.current_level = self.next_level()
                         self.reset_game()
                         break
-                if self.lost:
-                    font = pygame.font.SysFont('comicsansms', 48, bold=True)
-                    text = font.render("Loop Limit! You Lose!", True, (255, 80, 80))
-                    self.screen.blit(text, (100, 250))
+                if sim.lost:
+                    text = text_cache.render("Loop Limit! You Lose!", 'comicsansms', 48, (255, 80, 80), bold=True)
+                    dx, dy = self.banner_shift
+                    self.dirty.add(self.screen.blit(text, (100 + dx, 250 + dy)))
                     if pygame.time.get_ticks() - self.lose_time > 2000:
                         self.running = False
                         self.show_menu = True
-                pygame.display.flip()
-                self.clock.tick(60)
+                self.draw_notice()
+                with profiler.section('overlay'):
+                    overlay = profiler.draw_overlay(self.screen, text_cache)
+                    if overlay:
+                        self.dirty.add(overlay)
+                with profiler.section('flip'):
+                    self.dirty.present()
+                profiler.end_frame()
+                self.accumulator += self.clock.tick(60)
+
+    def notify(self, text):
+        # Shown through the HUD for NOTICE_MS; the frame loop never prints
+        self.notice = (text, pygame.time.get_ticks() + NOTICE_MS)
+
+    def draw_notice(self):
+        if self.notice is None:
+            return
+        text, until = self.notice
+        if pygame.time.get_ticks() > until:
+            # Dirty-rect frames restore last frame's rect, so it leaves no trace
+            self.notice = None
+            return
+        notice = text_cache.render(text, 'comicsansms', 20, (255, 255, 255), bold=True)
+        self.dirty.add(self.screen.blit(notice, (10, self.screen.get_height() - notice.get_height() - 10)))
 
     def menu_loop(self):
         menu_running = True
         self.selected_color = 0
-        colors = ['green', 'beige', 'pink', 'purple', 'yellow']
-        color_names = {
-            'green': 'Zeno',
-            'beige': 'Nova',
-            'pink': 'Luna',
-            'purple': 'Echo',
-            'yellow': 'Bolt'
-        }
-        color_desc = {
-            'green': 'The Time Explorer',
-            'beige': 'The Puzzle Genius',
-            'pink': 'The Agile Jumper',
-            'purple': 'The Ghost Whisperer',
-            'yellow': 'The Speed Runner'
-        }
         glow_phase = 0
+        self.dirty.full()
+        last_input = pygame.time.get_ticks()
         while menu_running:
-            for event in pygame.event.get():
+            if self.menu_idle_ms and pygame.time.get_ticks() - last_input > self.menu_idle_ms:
+                # Idle: the glow stops and nothing runs until there is input
+                events = [pygame.event.wait()]
+                self.dirty.full()
+            else:
+                events = pygame.event.get()
+            if events:
+                last_input = pygame.time.get_ticks()
+            for event in events:
                 if event.type == pygame.QUIT:
                     exit()
                 if event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_r:
-                        self.player_choice = colors[self.selected_color]
+                        self.player_choice = MENU_COLORS[self.selected_color]
                         menu_running = False
                     if event.key == pygame.K_q:
                         exit()
                     if event.key == pygame.K_LEFT:
-                        self.selected_color = (self.selected_color - 1) % len(colors)
+                        self.selected_color = (self.selected_color - 1) % len(MENU_COLORS)
                     if event.key == pygame.K_RIGHT:
-                        self.selected_color = (self.selected_color + 1) % len(colors)
-            self.screen.fill((18, 22, 40))
-            # Animated glowing title
+                        self.selected_color = (self.selected_color + 1) % len(MENU_COLORS)
             glow_phase += 1
+            self.menu_frame(glow_phase)
+            self.clock.tick(60)
+
+    def menu_frame(self, glow_phase):
+        # Character sprites may still be loading; their frames stay empty
+        # and get redrawn in full once they arrive
+        if assets.pump():
+            self.dirty.full()
+        dirty = self.dirty
+        if dirty.enabled:
+            # Only the glowing title, the highlighted card and the
+            # description below it change between frames
+            rects = self.menu_rects()
+            header, cards, desc = rects
+            dirty.extend([header, cards[self.selected_color], desc])
+        if dirty.partial():
+            for rect in dirty.repaint():
+                self.screen.set_clip(rect)
+                self.draw_menu(glow_phase, rect, rects)
+            self.screen.set_clip(None)
+        else:
+            self.draw_menu(glow_phase)
+        dirty.present()
+        if self.first_frame_ms is None:
+            self.first_frame_ms = (time.perf_counter() - self.started) * 1000
+            # Shown in the profiler overlay once the game is running
+            profiler.note('first_frame', self.first_frame_ms)
+
+    def menu_texts(self):
+        title = text_cache.render("TimeLoop", 'comicsansms', 90, (0, 255, 255), bold=True)
+        subtitle = text_cache.render("Echoes of the Past", 'comicsansms', 36, (255, 255, 255), bold=True)
+        msg = text_cache.render("Press R to Start or Q to Quit", 'comicsansms', 36, (255, 255, 255), bold=True)
+        desc = text_cache.render(COLOR_DESC[MENU_COLORS[self.selected_color]], 'comicsansms', 26, (180, 220, 255))
+        return title, subtitle, msg, desc
+
+    def menu_name(self, i):
+        color = (255,255,0) if i == self.selected_color else (255,255,255)
+        return text_cache.render(COLOR_NAMES[MENU_COLORS[i]], 'comicsansms', 28, color, bold=True)
+
+    def menu_rects(self):
+        # Areas of the menu's parts: the header, each card, the description
+        title, subtitle, msg, desc = self.menu_texts()
+        header = pygame.Rect(180, 30, title.get_width()+40, title.get_height()+40)
+        header.unionall_ip([title.get_rect(topleft=(200, 50)), subtitle.get_rect(topleft=(260, 140)),
+                            msg.get_rect(topleft=(180, 200))])
+        cards = []
+        for i in range(len(MENU_COLORS)):
+            x, y = 80 + i*140, 350
+            cards.append(pygame.Rect(x-15, y-15, 90, 90).union(self.menu_name(i).get_rect(topleft=(x-10, y+70))))
+        desc_x = 80 + self.selected_color*140 + 40 - desc.get_width()//2
+        return header, cards, desc.get_rect(topleft=(desc_x, 470))
+
+    def draw_menu(self, glow_phase, area=None, rects=None):
+        # With an area (the screen's clip rect), parts whose rects from
+        # menu_rects() miss it are skipped
+        if area is not None:
+            header, cards, desc_rect = rects
+        title, subtitle, msg, desc_render = self.menu_texts()
+        self.screen.fill(MENU_BG)
+        if area is None or area.colliderect(header):
+            # Animated glowing title
             glow_color = (0, 255, 255, 120 + int(60 * (1 + math.sin(glow_phase/20)) / 2))
-            title_font = pygame.font.SysFont('comicsansms', 90, bold=True)
-            title = title_font.render("TimeLoop", True, (0, 255, 255))
             glow_surf = pygame.Surface((title.get_width()+40, title.get_height()+40), pygame.SRCALPHA)
             pygame.draw.ellipse(glow_surf, glow_color, glow_surf.get_rect())
             self.screen.blit(glow_surf, (180, 30), special_flags=pygame.BLEND_RGBA_ADD)
             self.screen.blit(title, (200, 50))
             # Subtitle
-            subtitle_font = pygame.font.SysFont('comicsansms', 36, bold=True)
-            subtitle = subtitle_font.render("Echoes of the Past", True, (255, 255, 255))
             self.screen.blit(subtitle, (260, 140))
             # Instructions
-            font2 = pygame.font.SysFont('comicsansms', 36, bold=True)
-            msg = font2.render("Press R to Start or Q to Quit", True, (255, 255, 255))
             self.screen.blit(msg, (180, 200))
-            # Draw character choices
-            for i, color in enumerate(colors):
-                y = 350
-                x = 80 + i*140
-                border = 8 if i == self.selected_color else 2
-                # Animated highlight
-                if i == self.selected_color:
-                    highlight = pygame.Surface((90, 90), pygame.SRCALPHA)
-                    pygame.draw.ellipse(highlight, (255,255,0,80+int(40*abs(math.sin(glow_phase/10)))), highlight.get_rect())
-                    self.screen.blit(highlight, (x-15, y-15), special_flags=pygame.BLEND_RGBA_ADD)
-                pygame.draw.rect(self.screen, (255,255,255), (x-10, y-10, 80, 80), border, border_radius=16)
-                # Draw sprite
-                sprite = None
-                svg = f'timeloop_game/assets/Characters/character_{color}_idle.svg'
-                png = f'timeloop_game/assets/Characters/character_{color}_idle.png'
-                if os.path.exists(png):
-                    sprite = pygame.image.load(png).convert_alpha()
-                elif os.path.exists(svg) and cairosvg:
-                    cairosvg.svg2png(url=svg, write_to=png, output_width=60, output_height=60)
-                    sprite = pygame.image.load(png).convert_alpha()
-                if sprite:
-                    self.screen.blit(sprite, (x, y))
-                # Draw character name
-                name_font = pygame.font.SysFont('comicsansms', 28, bold=True)
-                name = name_font.render(color_names[color], True, (255,255,0) if i == self.selected_color else (255,255,255))
-                self.screen.blit(name, (x-10, y+70))
-            # Draw only the selected character's description centered below
-            desc_font = pygame.font.SysFont('comicsansms', 26)
-            selected_color = colors[self.selected_color]
-            desc = color_desc[selected_color]
-            desc_render = desc_font.render(desc, True, (180, 220, 255))
+        # Draw character choices
+        for i, color in enumerate(MENU_COLORS):
+            if area is not None and not area.colliderect(cards[i]):
+                continue
+            y = 350
+            x = 80 + i*140
+            border = 8 if i == self.selected_color else 2
+            # Animated highlight
+            if i == self.selected_color:
+                highlight = pygame.Surface((90, 90), pygame.SRCALPHA)
+                pygame.draw.ellipse(highlight, (255,255,0,80+int(40*abs(math.sin(glow_phase/10)))), highlight.get_rect())
+                self.screen.blit(highlight, (x-15, y-15), special_flags=pygame.BLEND_RGBA_ADD)
+            pygame.draw.rect(self.screen, (255,255,255), (x-10, y-10, 80, 80), border, border_radius=16)
+            # Draw sprite, at the size the game plays it
+            sprite = assets.get(f'Characters/character_{color}_idle', CHARACTER_SIZE)
+            if sprite:
+                self.screen.blit(sprite, (x, y))
+            # Draw character name
+            self.screen.blit(self.menu_name(i), (x-10, y+70))
+        # Draw only the selected character's description centered below
+        if area is None or area.colliderect(desc_rect):
             desc_x = 80 + self.selected_color*140 + 40 - desc_render.get_width()//2
             desc_y = 470
             self.screen.blit(desc_render, (desc_x, desc_y))
-            pygame.display.flip()
-            self.clock.tick(60) 
\ No newline at end of file
@@ -1,91 +1,302 @@
-import os
+import numpy as np
 import pygame
-try:
-    import cairosvg
-except ImportError:
-    cairosvg = None
+from utils.assets import assets
+from utils.profiler import profiler
+
+TRAIL_LENGTH = 8
+GHOST_SIZE = (40, 60)
+TRAIL_ALPHAS = tuple(40 + 20 * i for i in range(TRAIL_LENGTH))
+BODY_ALPHA = 100
+WALK_FRAME_TICKS = 9  # walk_timer passes 8 every ninth walking frame
+STATES = ('idle', 'walk', 'jump')
+IDLE, WALK, JUMP = range(3)
+LADDER_ALPHAS = TRAIL_ALPHAS + (BODY_ALPHA,)
+SPRITE_FRAMES = {'idle': ('idle',), 'walk': ('walk_a', 'walk_b'), 'jump': ('jump',)}
+TRAIL_FADE = 200  # per-frame alpha multiplier (/255) for the accumulated trail layer
+
+_fallback_ladder = None
+
+
+def fallback_ladder(size=(40, 60)):
+    # Circle stand-in for a missing sprite, drawn once per alpha
+    global _fallback_ladder
+    if _fallback_ladder is None:
+        ladder = []
+        center = (size[0]//2, size[1]//2)
+        for alpha in TRAIL_ALPHAS:
+            s2 = pygame.Surface(size, pygame.SRCALPHA)
+            pygame.draw.circle(s2, (100, 200, 255, alpha), center, 20)
+            pygame.draw.circle(s2, (255, 255, 255, min(180, alpha+80)), center, 20, 3)
+            ladder.append(s2)
+        s2 = pygame.Surface(size, pygame.SRCALPHA)
+        pygame.draw.circle(s2, (100, 200, 255, 90), center, 20)
+        pygame.draw.circle(s2, (255, 255, 255, 180), center, 20, 3)
+        ladder.append(s2)
+        _fallback_ladder = tuple(ladder)
+    return _fallback_ladder
+
+
+_ladders = {}
+
+
+def ghost_ladders(color, size=(40, 60)):
+    """Alpha ladders per state and walk frame: ladders[state][walk_frame]
+    is the TRAIL_LENGTH trail Surfaces followed by the body Surface.
+    Built once per color and shared by every ghost of that color."""
+    key = (color, size)
+    if key not in _ladders:
+        ladders = {}
+        for state, frames in SPRITE_FRAMES.items():
+            ladders[state] = [assets.alpha_ladder(f'Characters/character_{color}_{frame}', size, LADDER_ALPHAS)
+                              or fallback_ladder(size) for frame in frames]
+        _ladders[key] = ladders
+    return _ladders[key]
+
 
 class Ghost:
+    """One ghost as drawn: where it is and which sprite it shows.
+
+    GhostSwarm moves every ghost and fills these in before drawing.
+    """
+    __slots__ = ('moves', 'index', 'rect', 'state', 'walk_frame', 'color', 'ladders')
+
     def __init__(self, recorded_moves, start_pos, color='green'):
         self.moves = recorded_moves
         self.index = 0
-        self.rect = pygame.Rect(*start_pos, 40, 60)
+        self.rect = pygame.Rect(*start_pos, *GHOST_SIZE)
         self.state = 'idle'
         self.walk_frame = 0
-        self.walk_timer = 0
         self.color = color
-        self.sprites = {'idle': None, 'walk': [None, None], 'jump': None}
-        self.positions = []  # for motion trail
-        # Load sprites
-        self.sprites['idle'] = self.load_sprite(f'character_{self.color}_idle')
-        self.sprites['walk'][0] = self.load_sprite(f'character_{self.color}_walk_a')
-        self.sprites['walk'][1] = self.load_sprite(f'character_{self.color}_walk_b')
-        self.sprites['jump'] = self.load_sprite(f'character_{self.color}_jump')
-
-    def load_sprite(self, name):
-        svg_path = f'timeloop_game/assets/Characters/{name}.svg'
-        png_path = f'timeloop_game/assets/Characters/{name}.png'
-        if os.path.exists(png_path):
-            return pygame.image.load(png_path).convert_alpha()
-        elif os.path.exists(svg_path) and cairosvg:
-            cairosvg.svg2png(url=svg_path, write_to=png_path, output_width=40, output_height=60)
-            return pygame.image.load(png_path).convert_alpha()
-        return None
-
-    def update(self):
-        if self.index < len(self.moves):
-            move = self.moves[self.index]
-            self.rect.x += move['x']
-            self.rect.y += move['y']
-            self.index += 1
-            # Determine state
-            if move['y'] < 0:
-                self.state = 'jump'
-            elif move['x'] != 0:
-                self.state = 'walk'
-            else:
-                self.state = 'idle'
-            # Animate walk
-            if self.state == 'walk':
-                self.walk_timer += 1
-                if self.walk_timer > 8:
-                    self.walk_frame = 1 - self.walk_frame
-                    self.walk_timer = 0
-            else:
-                self.walk_frame = 0
-                self.walk_timer = 0
-            # Save position for trail
-            self.positions.append(self.rect.topleft)
-            if len(self.positions) > 8:
-                self.positions.pop(0)
-
-    def draw(self, surface):
-        # Draw motion trail
-        sprite = None
-        if self.state == 'walk':
-            sprite = self.sprites['walk'][self.walk_frame]
-        else:
-            sprite = self.sprites[self.state]
-        for i, pos in enumerate(self.positions):
-            alpha = int(40 + 20 * i)
-            if sprite:
-                img = sprite.copy()
-                img.set_alpha(alpha)
-                surface.blit(img, (pos[0], pos[1]))
-            else:
-                s2 = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-                center = (self.rect.width//2, self.rect.height//2)
-                pygame.draw.circle(s2, (100, 200, 255, alpha), center, 20)
-                pygame.draw.circle(s2, (255, 255, 255, min(180, alpha+80)), center, 20, 3)
-                surface.blit(s2, (pos[0], pos[1]))
-        # Draw main ghost
-        if sprite:
-            img = sprite.copy()
-            img.set_alpha(100)
-            surface.blit(img, self.rect)
+        self.ladders = None
+
+    def ladder(self):
+        # Loaded on first draw so headless replays never need a display
+        if self.ladders is None:
+            self.ladders = ghost_ladders(self.color)
+        return self.ladders[self.state][self.walk_frame]
+
+    def blit_list(self, blits, positions, first=0, offset=(0, 0)):
+        # Append (sprite, position) pairs for the trail then the body to
+        # blits, for one Surface.blits() call. positions[first:] is the
+        # trail oldest first, already in screen coordinates
+        ladder = self.ladder()
+        blits.extend(zip(ladder, positions[first:]))
+        blits.append((ladder[TRAIL_LENGTH], self.rect.move(offset)))
+
+    def draw(self, surface, positions, first=0, offset=(0, 0)):
+        blits = []
+        self.blit_list(blits, positions, first, offset)
+        surface.blits(blits, doreturn=False)
+        profiler.count('blits', len(blits))
+
+
+def replay_tables(replays, width):
+    """Per-frame offsets from the spawn point, animation states and walk
+    frames for each replay, padded to `width` frames."""
+    count = len(replays)
+    # deltas[:, f] is the move applied by update number f; frame 0 is the spawn
+    deltas = np.zeros((count, width, 2), dtype=np.int32)
+    for i, replay in enumerate(replays):
+        if len(replay):
+            deltas[i, 1:len(replay) + 1] = replay.as_numpy()
+    offsets = np.cumsum(deltas, axis=1, dtype=np.int32)
+    dx, dy = deltas[..., 0], deltas[..., 1]
+    states = np.where(dy < 0, JUMP, np.where(dx != 0, WALK, IDLE)).astype(np.int8)
+    states[:, 0] = IDLE
+    walking = states == WALK
+    frames = np.arange(width)
+    run_start = np.maximum.accumulate(np.where(walking, 0, frames), axis=1)
+    walk_frames = np.where(walking, ((frames - run_start) // WALK_FRAME_TICKS) % 2, 0).astype(np.int8)
+    return offsets, states, walk_frames
+
+
+class GhostSwarm:
+    """Replays every ghost of a loop from shared NumPy tables.
+
+    Positions, animation states and walk frames are precomputed per frame
+    with one cumulative sum over the recorded deltas, so advancing or
+    seeking to any frame is a single fancy-index lookup for all ghosts.
+    A step only advances the frame. locate() looks the positions up when
+    something reads them (the buttons, at SWITCH_RATE), and update_views()
+    brings the trails and the Ghost objects (rect/state views for
+    drawing) up to date when the frame is drawn.
+    """
+
+    def __init__(self, replays, start_pos, color='green'):
+        self.start_pos = start_pos
+        self.start = np.array(start_pos, dtype=np.int32)
+        self.color = color
+        self.ghosts = [Ghost(replay, start_pos, color=color) for replay in replays]
+        self.lengths = np.array([len(replay) for replay in replays], dtype=np.int64)
+        width = int(self.lengths.max()) + 1 if len(replays) else 1
+        self.offsets, self.states, self.walk_frames = replay_tables(replays, width)
+        self.trail_steps = np.arange(TRAIL_LENGTH - 1, -1, -1)
+        self.frame = 0
+        self.trail_layer = None
+        self.trail_origin = (0, 0)
+        self.allocate()
+        self.seek(0)
+
+    def allocate(self):
+        # Flat views of the tables plus output buffers that locate() fills in
+        # place, so stepping allocates no new arrays
+        count, width = self.offsets.shape[:2]
+        self.flat_offsets = self.offsets.reshape(-1, 2)
+        self.flat_states = self.states.reshape(-1)
+        self.flat_walk_frames = self.walk_frames.reshape(-1)
+        self.row_base = np.arange(count, dtype=np.int64) * width
+        self.indices = np.zeros(count, dtype=np.int64)
+        self.flat_index = np.zeros(count, dtype=np.int64)
+        self.positions = np.zeros((count, 2), dtype=np.int32)
+        self.trail_index = np.zeros((count, TRAIL_LENGTH), dtype=np.int64)
+        self.trail_valid = np.zeros((count, TRAIL_LENGTH), dtype=bool)
+        self.trail = np.zeros((count, TRAIL_LENGTH, 2), dtype=np.int32)
+        self.frame_states = np.zeros(count, dtype=np.int8)
+        self.frame_walk_frames = np.zeros(count, dtype=np.int8)
+        # The frames positions and the views were last brought up to
+        self.located = None
+        self.viewed = None
+
+    def add(self, replay):
+        """Append one ghost, keeping the tables and Ghost views of the others."""
+        ghost = Ghost(replay, self.start_pos, color=self.color)
+        self.ghosts.append(ghost)
+        width = max(self.offsets.shape[1], len(replay) + 1)
+        if width > self.offsets.shape[1]:
+            # Ghosts hold their last frame, so padding with it changes nothing
+            pad = ((0, 0), (0, width - self.offsets.shape[1]))
+            self.offsets = np.pad(self.offsets, pad + ((0, 0),), mode='edge')
+            self.states = np.pad(self.states, pad, mode='edge')
+            self.walk_frames = np.pad(self.walk_frames, pad, mode='edge')
+        offsets, states, walk_frames = replay_tables([replay], width)
+        self.offsets = np.concatenate((self.offsets, offsets))
+        self.states = np.concatenate((self.states, states))
+        self.walk_frames = np.concatenate((self.walk_frames, walk_frames))
+        self.lengths = np.append(self.lengths, len(replay))
+        self.allocate()
+        self.seek(self.frame)
+        return ghost
+
+    def __len__(self):
+        return len(self.ghosts)
+
+    def __iter__(self):
+        return iter(self.ghosts)
+
+    def __getitem__(self, index):
+        return self.ghosts[index]
+
+    def step(self):
+        self.frame += 1
+
+    def seek(self, frame):
+        self.frame = max(0, frame)
+
+    def locate(self):
+        """Every ghost's top-left at the current frame, as (ghosts, 2) int32."""
+        if self.located == self.frame or not self.ghosts:
+            # Empty through the whole first loop
+            return self.positions
+        self.located = self.frame
+        # Ghosts whose replay has ended hold their last frame
+        np.minimum(self.frame, self.lengths, out=self.indices)
+        np.add(self.row_base, self.indices, out=self.flat_index)
+        np.take(self.flat_offsets, self.flat_index, axis=0, out=self.positions)
+        self.positions += self.start
+        return self.positions
+
+    def update_views(self):
+        # Trails and Ghost views for the current frame, once per frame drawn
+        if self.viewed == self.frame or not self.ghosts:
+            return
+        self.viewed = self.frame
+        self.locate()
+        trail_index = self.trail_index
+        np.subtract(self.indices[:, None], self.trail_steps, out=trail_index)
+        np.greater_equal(trail_index, 1, out=self.trail_valid)
+        np.maximum(trail_index, 0, out=trail_index)
+        trail_index += self.row_base[:, None]
+        np.take(self.flat_offsets, trail_index, axis=0, out=self.trail)
+        self.trail += self.start
+        states = np.take(self.flat_states, self.flat_index, out=self.frame_states).tolist()
+        walk_frames = np.take(self.flat_walk_frames, self.flat_index, out=self.frame_walk_frames).tolist()
+        indices = self.indices.tolist()
+        coords = self.positions.ravel().tolist()
+        for i, ghost in enumerate(self.ghosts):
+            rect = ghost.rect
+            rect.x = coords[2 * i]
+            rect.y = coords[2 * i + 1]
+            ghost.state = STATES[states[i]]
+            ghost.walk_frame = walk_frames[i]
+            ghost.index = indices[i]
+
+    def bounds(self):
+        """One Rect per ghost covering its body and drawn trail."""
+        if not self.ghosts:
+            return []
+        self.update_views()
+        points = np.where(self.trail_valid[..., None], self.trail, self.positions[:, None])
+        low = np.minimum(points.min(axis=1), self.positions).tolist()
+        high = np.maximum(points.max(axis=1), self.positions).tolist()
+        w, h = GHOST_SIZE
+        return [pygame.Rect(x0, y0, x1 - x0 + w, y1 - y0 + h) for (x0, y0), (x1, y1) in zip(low, high)]
+
+    def draw(self, surface, accumulate=False, view=None):
+        # With a camera view, ghosts whose body and trail are off screen
+        # are skipped (they keep replaying) and the rest are drawn
+        # relative to it
+        self.update_views()
+        if accumulate:
+            self.draw_accumulated(surface, view)
+            return
+        # Valid trail entries are always the newest ones, at the row's end.
+        # Every ghost's sprites go out in a single blits() call
+        firsts = (TRAIL_LENGTH - self.trail_valid.sum(axis=1)).tolist()
+        blits = []
+        if view is None:
+            trail = self.trail.tolist()
+            for i, ghost in enumerate(self.ghosts):
+                ghost.blit_list(blits, trail[i], firsts[i])
         else:
-            s2 = pygame.Surface((self.rect.width, self.rect.height), pygame.SRCALPHA)
-            center = (self.rect.width//2, self.rect.height//2)
-            pygame.draw.circle(s2, (100, 200, 255, 90), center, 20)
-            pygame.draw.circle(s2, (255, 255, 255, 180), center, 20, 3)
-            surface.blit(s2, (self.rect.x, self.rect.y)) 
\ No newline at end of file
+            offset = (-view.x, -view.y)
+            trail = (self.trail + np.array(offset, dtype=np.int32)).tolist()
+            for i, rect in enumerate(self.bounds()):
+                if view.colliderect(rect):
+                    self.ghosts[i].blit_list(blits, trail[i], firsts[i], offset)
+                else:
+                    profiler.count('ghosts_culled')
+        surface.blits(blits, doreturn=False)
+        profiler.count('blits', len(blits))
+
+    def draw_accumulated(self, surface, view=None):
+        # Trails live in one persistent layer that fades every frame; each
+        # ghost stamps itself once instead of blitting TRAIL_LENGTH copies
+        if self.trail_layer is None or self.trail_layer.get_size() != surface.get_size():
+            self.trail_layer = pygame.Surface(surface.get_size(), pygame.SRCALPHA)
+            self.trail_origin = (0, 0)
+            profiler.count('surface_alloc')
+        layer = self.trail_layer
+        origin = (0, 0) if view is None else view.topleft
+        if origin != self.trail_origin:
+            self.scroll_trails(origin)
+        layer.fill((255, 255, 255, TRAIL_FADE), special_flags=pygame.BLEND_RGBA_MULT)
+        ox, oy = -origin[0], -origin[1]
+        drawn = [(ghost.ladder(), ghost.rect.move(ox, oy)) for ghost in self.ghosts
+                 if view is None or view.colliderect(ghost.rect)]
+        layer.blits([(ladder[0], rect) for ladder, rect in drawn], doreturn=False)
+        surface.blit(layer, (0, 0))
+        surface.blits([(ladder[TRAIL_LENGTH], rect) for ladder, rect in drawn], doreturn=False)
+        profiler.count('blits', 2 * len(drawn) + 1)
+
+    def scroll_trails(self, origin):
+        # Keep the faded trails where they were in the world when the view moves
+        layer = self.trail_layer
+        dx = self.trail_origin[0] - origin[0]
+        dy = self.trail_origin[1] - origin[1]
+        layer.scroll(dx, dy)
+        w, h = layer.get_size()
+        if dx:
+            layer.fill((0, 0, 0, 0), (0 if dx > 0 else w + dx, 0, abs(dx), h))
+        if dy:
+            layer.fill((0, 0, 0, 0), (0, 0 if dy > 0 else h + dy, w, abs(dy)))
+        self.trail_origin = origin
@@ -1,15 +1,190 @@
-import json
 import pygame
+from core.puzzle import ANY, MODES
+from core.spatial import SpatialGrid, GRID_CELL
+from core.world import CHUNK_WIDTH, ChunkGrid, ChunkTable
+
+LEVEL_DIR = 'timeloop_game/levels'
+LEGACY_BUTTON = 'button'  # id of the original single 'button' key for wiring
+WORLD_SIZE = (800, 600)  # a level without a 'world' is one screen
+
+
+class Level:
+    """One level's geometry and puzzle wiring.
+
+    buttons is a list of rects; doors and moving_platforms are dicts whose
+    'inputs' are indices into buttons. The single button/door/
+    moving_platform of the original format are the first of each.
+
+    A level wider than one chunk keeps its platforms in `chunks` (a
+    ChunkTable) instead; its platforms list and grid are empty and
+    make_grid() returns a ChunkGrid that streams them in.
+    """
+
+    def __init__(self, platforms, player_start, exit_rect, buttons=(), doors=(),
+                 moving_platforms=(), grid=None, world=None, chunks=None):
+        self.platforms = platforms
+        self.player_start = player_start
+        self.exit_rect = exit_rect
+        self.buttons = list(buttons)
+        self.doors = list(doors)
+        self.moving_platforms = list(moving_platforms)
+        self.world = pygame.Rect(0, 0, *(world or WORLD_SIZE))
+        self.chunks = chunks
+        if grid is None and chunks is None:
+            grid = LevelLoader.build_grid(platforms)
+        self.grid = grid
+
+    def make_grid(self):
+        # A fresh grid for one run, so dynamic entries never leak between runs
+        if self.chunks is not None:
+            return ChunkGrid(self.chunks)
+        return self.grid.copy()
+
+    @property
+    def button(self):
+        return self.buttons[0] if self.buttons else None
+
+    @property
+    def door(self):
+        return self.doors[0]['rect'] if self.doors else None
+
+    @property
+    def moving_platform(self):
+        if not self.moving_platforms:
+            return None
+        mp = self.moving_platforms[0]
+        return {'rect': mp['rect'], 'x1': mp['x1'], 'x2': mp['x2'], 'speed': mp['speed']}
+
+    def as_tuple(self):
+        return (self.platforms, self.player_start, self.exit_rect,
+                self.button, self.door, self.moving_platform)
+
 
 class LevelLoader:
     @staticmethod
-    def load_level(path):
-        with open(path, 'r') as f:
-            data = json.load(f)
+    def level_path(number):
+        return f'{LEVEL_DIR}/level_{number}.json'
+
+    @staticmethod
+    def validate(data, source='level'):
+        def check_ints(value, length, field):
+            if (not isinstance(value, list) or len(value) != length
+                    or not all(isinstance(v, int) and not isinstance(v, bool) for v in value)):
+                raise ValueError(f'{source}: {field} must be a list of {length} integers')
+
+        def check_list(field):
+            value = data.get(field, [])
+            if not isinstance(value, list) or not all(isinstance(v, dict) for v in value):
+                raise ValueError(f'{source}: {field} must be a list of objects')
+            return value
+
+        def check_mover(moving, field):
+            check_ints(moving.get('rect'), 4, f'{field}.rect')
+            check_ints([moving.get('x1'), moving.get('x2'), moving.get('speed')], 3,
+                       f'{field} x1/x2/speed')
+
+        def check_wiring(target, field, required):
+            inputs = target.get('inputs', [])
+            if not isinstance(inputs, list) or (required and not inputs):
+                raise ValueError(f'{source}: {field}.inputs must be a list of button ids')
+            for button_id in inputs:
+                if button_id not in ids:
+                    raise ValueError(f'{source}: {field}.inputs: unknown button {button_id!r}')
+            if target.get('mode', ANY) not in MODES:
+                raise ValueError(f'{source}: {field}.mode must be one of {", ".join(MODES)}')
+
+        if not isinstance(data, dict):
+            raise ValueError(f'{source}: level must be a JSON object')
+        platforms = data.get('platforms', [])
+        if not isinstance(platforms, list):
+            raise ValueError(f'{source}: platforms must be a list')
+        for i, plat in enumerate(platforms):
+            check_ints(plat, 4, f'platforms[{i}]')
+        world = data.get('world')
+        if world is not None:
+            check_ints(world, 2, 'world')
+            if min(world) <= 0:
+                raise ValueError(f'{source}: world must have a positive size')
+            for i, plat in enumerate(platforms):
+                if plat[0] < 0 or plat[0] + plat[2] > world[0]:
+                    raise ValueError(f'{source}: platforms[{i}] is outside the world')
+        chunk_width = data.get('chunk_width', CHUNK_WIDTH)
+        if not isinstance(chunk_width, int) or isinstance(chunk_width, bool) or chunk_width <= 0:
+            raise ValueError(f'{source}: chunk_width must be a positive integer')
+        check_ints(data.get('player_start', [100, 500]), 2, 'player_start')
+        check_ints(data.get('exit', [700, 500, 40, 60]), 4, 'exit')
+        for field in ('button', 'door'):
+            if data.get(field) is not None:
+                check_ints(data[field], 4, field)
+        if data.get('door') is not None and data.get('button') is None:
+            raise ValueError(f'{source}: door needs a button')
+        moving = data.get('moving_platform')
+        if moving is not None:
+            if not isinstance(moving, dict):
+                raise ValueError(f'{source}: moving_platform must be an object')
+            check_mover(moving, 'moving_platform')
+        ids = {LEGACY_BUTTON} if data.get('button') is not None else set()
+        for i, button in enumerate(check_list('buttons')):
+            button_id = button.get('id')
+            if not isinstance(button_id, str) or button_id in ids:
+                raise ValueError(f'{source}: buttons[{i}].id must be a unique string')
+            ids.add(button_id)
+            check_ints(button.get('rect'), 4, f'buttons[{i}].rect')
+        for i, door in enumerate(check_list('doors')):
+            check_ints(door.get('rect'), 4, f'doors[{i}].rect')
+            check_wiring(door, f'doors[{i}]', required=True)
+        for i, moving in enumerate(check_list('moving_platforms')):
+            check_mover(moving, f'moving_platforms[{i}]')
+            check_wiring(moving, f'moving_platforms[{i}]', required=False)
+
+    @staticmethod
+    def from_dict(data):
         platforms = [pygame.Rect(*plat) for plat in data.get('platforms', [])]
         player_start = tuple(data.get('player_start', [100, 500]))
         exit_rect = pygame.Rect(*data.get('exit', [700, 500, 40, 60]))
-        button_rect = data.get('button')
-        door_rect = data.get('door')
-        moving_platform = data.get('moving_platform')
-        return platforms, player_start, exit_rect, button_rect, door_rect, moving_platform 
\ No newline at end of file
+        # The original single button/door/moving_platform keys come first
+        buttons = []
+        ids = {}
+        if data.get('button') is not None:
+            ids[LEGACY_BUTTON] = len(buttons)
+            buttons.append(list(data['button']))
+        for button in data.get('buttons', []):
+            ids[button['id']] = len(buttons)
+            buttons.append(list(button['rect']))
+        doors = []
+        if data.get('door') is not None:
+            doors.append({'rect': list(data['door']), 'inputs': [ids[LEGACY_BUTTON]], 'mode': ANY})
+        for door in data.get('doors', []):
+            doors.append({'rect': list(door['rect']), 'inputs': [ids[i] for i in door['inputs']],
+                          'mode': door.get('mode', ANY)})
+        movers = []
+        for moving in [data.get('moving_platform')] + data.get('moving_platforms', []):
+            if moving is not None:
+                movers.append({'rect': list(moving['rect']), 'x1': moving['x1'], 'x2': moving['x2'],
+                               'speed': moving['speed'],
+                               'inputs': [ids[i] for i in moving.get('inputs', [])],
+                               'mode': moving.get('mode', ANY)})
+        world = data.get('world')
+        chunk_width = data.get('chunk_width', CHUNK_WIDTH)
+        if world is not None and world[0] > chunk_width:
+            chunks = ChunkTable.split(platforms, chunk_width, world[0])
+            return Level([], player_start, exit_rect, buttons, doors, movers, world=world, chunks=chunks)
+        return Level(platforms, player_start, exit_rect, buttons, doors, movers, world=world)
+
+    @staticmethod
+    def load(path):
+        import json
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return LevelLoader.from_dict(data)
+
+    @staticmethod
+    def load_level(path):
+        return LevelLoader.load(path).as_tuple()
+
+    @staticmethod
+    def build_grid(platforms, cell_size=GRID_CELL):
+        grid = SpatialGrid(cell_size)
+        for plat in platforms:
+            grid.insert(plat)
+        return grid
@@ -0,0 +1,287 @@
+"""Binary level pack: every level_N.json compiled into one indexed file.
+
+Layout (little-endian):
+
+    header    '<4sHHI'   magic, version, level count, source checksum
+    index     '<III'     level number, blob offset, blob size   (per level)
+    blobs                one per level, see LEVEL_HEADER below
+
+A blob is the fixed LEVEL_HEADER, then the platform rects and button
+rects as int32 x4, then one DOOR or MOVER record per door and moving
+platform, each followed by its uint32 input button indices, then the
+precomputed SpatialGrid: one CELL_HEADER per cell followed by its uint32
+platform ids. Nothing is parsed until a level is asked for.
+
+A level wider than one chunk has no platform rects or cells. Instead the
+header's chunk count is followed by one uint32 entry count per chunk and
+then the chunks themselves, each a run of CHUNK_ENTRY (platform id, rect).
+Only the counts are read with the level; a chunk is parsed when a
+ChunkGrid or the renderer asks for it.
+
+Version 2 replaced v1's single button/door/moving platform fields with
+these variable-length puzzle sections; version 3 added the world size
+and the chunks; version 4 fills the header's last field, reserved
+before, with source_checksum() of the JSON the pack was compiled from.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+from core.level_loader import LEVEL_DIR, Level, LevelLoader
+from core.puzzle import MODES
+from core.spatial import GRID_CELL, SpatialGrid
+from core.world import ChunkTable
+
+PACK_MAGIC = b'TLPK'
+PACK_VERSION = 4
+PACK_FILE = os.path.join(LEVEL_DIR, 'levels.pack')
+
+PACK_HEADER = struct.Struct('<4sHHI')
+INDEX_ENTRY = struct.Struct('<III')
+# start x/y, exit rect, platform/button/door/mover counts, cell size, cell
+# count, world width/height, chunk width, chunk count, platforms in chunks
+LEVEL_HEADER = struct.Struct('<2i4i6I2i3I')
+DOOR = struct.Struct('<4iII')      # rect, mode, input count
+MOVER = struct.Struct('<4i3iII')   # rect, x1/x2/speed, mode, input count
+CELL_HEADER = struct.Struct('<iiI')
+CHUNK_ENTRY = struct.Struct('<I4i')  # platform id, rect
+
+
+def _le_bytes(typecode, values):
+    arr = array(typecode, values)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _le_array(typecode, data):
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+def level_files(level_dir=LEVEL_DIR):
+    # glob, re and json are only needed to compile; a game run reads the pack
+    import glob
+    import re
+    files = {}
+    for path in glob.glob(os.path.join(level_dir, 'level_*.json')):
+        match = re.fullmatch(r'level_(\d+)\.json', os.path.basename(path))
+        if match:
+            files[int(match.group(1))] = path
+    return dict(sorted(files.items()))
+
+
+def newest_source(level_dir=LEVEL_DIR):
+    """Latest mtime (ns) of the level directory and its level_*.json, or
+    None when there are none. One directory scan and no file reads, so
+    the game can afford it at every launch."""
+    newest = None
+    try:
+        with os.scandir(level_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('level_') and entry.name.endswith('.json'):
+                    newest = max(newest or 0, entry.stat().st_mtime_ns)
+        if newest is not None:
+            # Renaming or deleting a level only touches the directory
+            newest = max(newest, os.stat(level_dir).st_mtime_ns)
+    except OSError:
+        return None
+    return newest
+
+
+def source_checksum(files):
+    """CRC-32 of every level's number and JSON bytes, from level_files()."""
+    import zlib
+    crc = 0
+    for number, path in files.items():
+        with open(path, 'rb') as f:
+            crc = zlib.crc32(f.read(), zlib.crc32(b'%d\0' % number, crc))
+    return crc
+
+
+def compile_level(data, cell_size=GRID_CELL):
+    level = LevelLoader.from_dict(data)
+    grid = LevelLoader.build_grid(level.platforms, cell_size)
+    chunks = level.chunks
+    chunk_count = len(chunks) if chunks is not None else 0
+    chunk_width = chunks.chunk_width if chunks is not None else 0
+    chunked_platforms = chunks.platform_count if chunks is not None else 0
+    header = LEVEL_HEADER.pack(
+        *level.player_start, *level.exit_rect, len(level.platforms), len(level.buttons),
+        len(level.doors), len(level.moving_platforms), cell_size, len(grid.cells),
+        *level.world.size, chunk_width, chunk_count, chunked_platforms)
+    parts = [header, _le_bytes('i', [v for plat in level.platforms for v in plat]),
+             _le_bytes('i', [v for rect in level.buttons for v in rect])]
+    for door in level.doors:
+        parts.append(DOOR.pack(*door['rect'], MODES.index(door['mode']), len(door['inputs'])))
+        parts.append(_le_bytes('I', door['inputs']))
+    for mp in level.moving_platforms:
+        parts.append(MOVER.pack(*mp['rect'], mp['x1'], mp['x2'], mp['speed'],
+                                MODES.index(mp['mode']), len(mp['inputs'])))
+        parts.append(_le_bytes('I', mp['inputs']))
+    for (cx, cy), ids in sorted(grid.cells.items()):
+        parts.append(CELL_HEADER.pack(cx, cy, len(ids)))
+        parts.append(_le_bytes('I', ids))
+    if chunk_count:
+        parts.append(_le_bytes('I', chunks.sizes))
+        for chunk in range(chunk_count):
+            parts.extend(CHUNK_ENTRY.pack(platform_id, *rect) for platform_id, rect in chunks.load(chunk))
+    return b''.join(parts)
+
+
+def compile_levels(level_dir=LEVEL_DIR):
+    import json
+    files = level_files(level_dir)
+    blobs = []
+    for number, path in files.items():
+        with open(path, 'r') as f:
+            try:
+                data = json.load(f)
+            except ValueError as exc:
+                raise ValueError(f'{path}: {exc}') from None
+        LevelLoader.validate(data, path)
+        blobs.append((number, compile_level(data)))
+    offset = PACK_HEADER.size + INDEX_ENTRY.size * len(blobs)
+    index = []
+    for number, blob in blobs:
+        index.append(INDEX_ENTRY.pack(number, offset, len(blob)))
+        offset += len(blob)
+    header = PACK_HEADER.pack(PACK_MAGIC, PACK_VERSION, len(blobs), source_checksum(files))
+    return header + b''.join(index) + b''.join(blob for _, blob in blobs)
+
+
+def write_pack(path=PACK_FILE, level_dir=LEVEL_DIR):
+    data = compile_levels(level_dir)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return data
+
+
+def parse_level(buf, offset):
+    fields = LEVEL_HEADER.unpack_from(buf, offset)
+    offset += LEVEL_HEADER.size
+    player_start = fields[0:2]
+    exit_rect = pygame.Rect(fields[2:6])
+    platform_count, button_count, door_count, mover_count, cell_size, cell_count = fields[6:12]
+    world = fields[12:14]
+    chunk_width, chunk_count, chunked_platforms = fields[14:17]
+    values = _le_array('i', buf[offset:offset + platform_count * 16])
+    offset += platform_count * 16
+    platforms = [pygame.Rect(*values[i:i + 4]) for i in range(0, len(values), 4)]
+    values = _le_array('i', buf[offset:offset + button_count * 16]).tolist()
+    offset += button_count * 16
+    buttons = [values[i:i + 4] for i in range(0, len(values), 4)]
+    doors = []
+    for _ in range(door_count):
+        *rect, mode, count = DOOR.unpack_from(buf, offset)
+        offset += DOOR.size
+        inputs = _le_array('I', buf[offset:offset + count * 4]).tolist()
+        offset += count * 4
+        doors.append({'rect': rect, 'inputs': inputs, 'mode': MODES[mode]})
+    movers = []
+    for _ in range(mover_count):
+        x, y, w, h, x1, x2, speed, mode, count = MOVER.unpack_from(buf, offset)
+        offset += MOVER.size
+        inputs = _le_array('I', buf[offset:offset + count * 4]).tolist()
+        offset += count * 4
+        movers.append({'rect': [x, y, w, h], 'x1': x1, 'x2': x2, 'speed': speed,
+                       'inputs': inputs, 'mode': MODES[mode]})
+    buckets = {}
+    for _ in range(cell_count):
+        cx, cy, count = CELL_HEADER.unpack_from(buf, offset)
+        offset += CELL_HEADER.size
+        buckets[(cx, cy)] = _le_array('I', buf[offset:offset + count * 4]).tolist()
+        offset += count * 4
+    if chunk_count:
+        sizes = _le_array('I', buf[offset:offset + chunk_count * 4]).tolist()
+        offset += chunk_count * 4
+        offsets = []
+        for size in sizes:
+            offsets.append(offset)
+            offset += size * CHUNK_ENTRY.size
+
+        def load_chunk(chunk):
+            start = offsets[chunk]
+            return [(platform_id, pygame.Rect(x, y, w, h)) for platform_id, x, y, w, h
+                    in CHUNK_ENTRY.iter_unpack(buf[start:start + sizes[chunk] * CHUNK_ENTRY.size])]
+
+        chunks = ChunkTable(chunk_width, sizes, load_chunk, chunked_platforms)
+        return Level(platforms, player_start, exit_rect, buttons, doors, movers,
+                     world=world, chunks=chunks)
+    grid = SpatialGrid.from_buckets(platforms, buckets, cell_size)
+    return Level(platforms, player_start, exit_rect, buttons, doors, movers, grid, world=world)
+
+
+class LevelPack:
+    """Indexed access to a compiled pack, parsing each level on first use.
+
+    preload() parses a level on a background thread so the frame that
+    switches levels only picks up the finished result.
+    """
+
+    def __init__(self, data):
+        self.buf = memoryview(data)
+        magic, version, count, self.checksum = PACK_HEADER.unpack_from(self.buf)
+        if magic != PACK_MAGIC or version != PACK_VERSION:
+            raise ValueError('not a level pack or unsupported pack version')
+        self.index = {}
+        for i in range(count):
+            number, offset, size = INDEX_ENTRY.unpack_from(self.buf, PACK_HEADER.size + i * INDEX_ENTRY.size)
+            self.index[number] = (offset, size)
+        self.levels = {}
+        self.pending = {}
+        self.executor = None
+
+    @classmethod
+    def open(cls, path=PACK_FILE):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @classmethod
+    def load_default(cls, path=PACK_FILE, level_dir=LEVEL_DIR):
+        # Fall back to compiling the JSON in memory when no pack was built,
+        # when the one on disk is damaged or from an older pack version, or
+        # when a level was edited, added or removed after it was written.
+        # A pack shipped without its JSON is used as is. Only mtimes are
+        # compared here; compile_levels.py --check compares the checksum.
+        try:
+            newest = newest_source(level_dir)
+            if newest is None or os.stat(path).st_mtime_ns >= newest:
+                return cls.open(path)
+        except (OSError, ValueError, struct.error):
+            pass
+        return cls(compile_levels(level_dir))
+
+    def __len__(self):
+        return len(self.index)
+
+    def numbers(self):
+        return sorted(self.index)
+
+    def get(self, number):
+        level = self.levels.get(number)
+        if level is None:
+            future = self.pending.pop(number, None)
+            level = future.result() if future else self._parse(number)
+            self.levels[number] = level
+        return level
+
+    def preload(self, number):
+        if number in self.levels or number in self.pending or number not in self.index:
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='level-preload')
+        self.pending[number] = self.executor.submit(self._parse, number)
+
+    def _parse(self, number):
+        offset, _ = self.index[number]
+        return parse_level(self.buf, offset)
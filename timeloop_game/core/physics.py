@@ -0,0 +1,117 @@
+"""Timestep-independent player physics.
+
+Speeds are in pixels per second and positions are floats, so a step of
+any length dt moves the player exactly as far as several shorter ones.
+Player.update splits a step only where something happens inside it: the
+top of a jump, walking off a ledge, landing. Between those the motion
+is an exact parabola, and sweep_landing() solves for the moment it comes
+down onto a platform, so no speed or dt can carry the player through
+one or change where it lands.
+
+Platforms are one-way ledges, as the levels are drawn for: the player
+jumps up through them and walks through their sides, and only lands on
+their top face when coming down onto it.
+"""
+import math
+
+import pygame
+
+# The rate the levels and the old per-frame constants were tuned at; a
+# level's platform "speed" is still in pixels per frame at this rate
+BASE_RATE = 60
+GRAVITY = 0.6 * BASE_RATE * BASE_RATE
+RUN_SPEED = 5 * BASE_RATE
+JUMP_SPEED = 12 * BASE_RATE
+# Substeps one update may take before giving up on the rest of dt; each
+# is an apex, a ledge, a landing or a jump, so a frame needs a few at most
+MAX_EVENTS = 32
+# How far (px) a box's bottom may already be past a top face and still
+# land on it: float drift, never a real overlap
+LANDING_SLOP = 1e-6
+# A jump from level ground lasts a whole number of frames at the usual
+# rates, so landings often fall right on a step boundary; one this close
+# (s) past the end of the step counts as landing at its end, rather than
+# float rounding deciding which step it belongs to
+TIME_SLOP = 1e-9
+# Overlapping platforms a spawn is lifted out of before giving up
+SETTLE_LIMIT = 16
+
+
+def fall_distance(vel_y, t):
+    return (vel_y + 0.5 * GRAVITY * t) * t
+
+
+def sweep_area(x, y, w, h, dx, dy):
+    # The integer Rect covering the box at both ends of the move
+    left = math.floor(min(x, x + dx))
+    top = math.floor(min(y, y + dy))
+    right = math.ceil(max(x, x + dx) + w)
+    bottom = math.ceil(max(y, y + dy) + h)
+    return pygame.Rect(left, top, right - left, bottom - top)
+
+
+def motion(item):
+    """(rect, x, vel_x) for a platform from the grid.
+
+    Static platforms are plain Rects. A moving platform is in the grid as
+    itself, already moved to where it is at the end of the step, with
+    x its exact position and vel_x how fast it got there.
+    """
+    if item.__class__ is pygame.Rect:
+        return item, item.x, 0.0
+    return item.rect, item.x, item.vel_x
+
+
+def sweep_landing(x, y, w, h, vel_x, vel_y, dt, platforms):
+    """Sweep the falling box (x, y, w, h) over the last dt seconds of the step.
+
+    vel_y must be >= 0, so the box only moves down. Returns (t, platform)
+    for the first top face the box's bottom edge comes down onto, t
+    seconds in, or (dt, None) when it lands on nothing. The box has to
+    overlap the platform sideways at that moment, with a moving platform
+    where it was at that moment, so a diagonal fall past a corner lands
+    exactly when the real path does. Platforms the box starts below are
+    ignored, and ties go to the first in query order.
+    """
+    bottom = y + h
+    area = sweep_area(x, y, w, h, vel_x * dt, fall_distance(vel_y, dt))
+    best_t, best = dt, None
+    for item in platforms.query(area):
+        rect, plat_x, plat_vel = motion(item)
+        drop = rect.top - bottom
+        if drop < -LANDING_SLOP:
+            continue
+        if drop <= 0:
+            t = 0.0
+        else:
+            # The root of drop = vel_y*t + GRAVITY*t*t/2, in the form that
+            # stays accurate when vel_y is large
+            t = 2 * drop / (vel_y + math.sqrt(vel_y * vel_y + 2 * GRAVITY * drop))
+        if best is None:
+            if t > dt + TIME_SLOP:
+                continue
+        elif t >= best_t:
+            continue
+        left = x + vel_x * t
+        plat_left = plat_x - plat_vel * (dt - t)
+        if left < plat_left + rect.w and left + w > plat_left:
+            best_t, best = min(t, dt), item
+    return best_t, best
+
+
+def settle_rect(rect, platforms):
+    """Lift rect out of any platforms it overlaps, onto their top faces.
+
+    Levels place spawns partway into the ground; the old per-frame
+    resolver pushed the player out on the first frame, this does it
+    before the first one. Returns True if rect was moved.
+    """
+    moved = False
+    for _ in range(SETTLE_LIMIT):
+        rects = [motion(item)[0] for item in platforms.query(rect)]
+        tops = [plat.top for plat in rects if rect.colliderect(plat)]
+        if not tops:
+            break
+        rect.bottom = min(tops)
+        moved = True
+    return moved
@@ -1,88 +1,183 @@
-import os
+import math
+
 import pygame
-try:
-    import cairosvg
-except ImportError:
-    cairosvg = None
+from core.physics import (BASE_RATE, GRAVITY, JUMP_SPEED, MAX_EVENTS, RUN_SPEED, fall_distance, motion,
+                          settle_rect, sweep_landing)
+from utils.assets import assets
+from utils.profiler import profiler
+
+# Seconds each walk frame shows; the old counter flipped after 9 frames at 60 Hz
+WALK_FRAME_TIME = 8.5 / BASE_RATE
 
 class Player:
+    """The player's box and animation state.
+
+    x, y and the velocities are floats in pixels and pixels per second
+    (see core.physics); rect is the box rounded to whole pixels, which is
+    what everything else reads. ground is the platform stood on, as the
+    grid holds it: a Rect, or a moving platform that carries the player
+    along at its own speed.
+    """
+    __slots__ = ('rect', 'x', 'y', 'vel_x', 'vel_y', 'jump_held', 'on_ground', 'ground',
+                 'state', 'walk_frame', 'walk_timer', 'color')
+
     def __init__(self, x, y, color='green'):
         self.rect = pygame.Rect(x, y, 40, 60)
-        self.vel_y = 0
+        self.x = float(x)
+        self.y = float(y)
+        self.vel_x = 0.0
+        self.vel_y = 0.0
+        self.jump_held = False
         self.on_ground = False
+        self.ground = None
         self.state = 'idle'  # idle, walk, jump
         self.walk_frame = 0
-        self.walk_timer = 0
+        self.walk_timer = 0.0
         self.color = color
-        self.sprites = {'idle': None, 'walk': [None, None], 'jump': None}
-        # Load idle
-        self.sprites['idle'] = self.load_sprite(f'character_{self.color}_idle')
-        # Load walk frames
-        self.sprites['walk'][0] = self.load_sprite(f'character_{self.color}_walk_a')
-        self.sprites['walk'][1] = self.load_sprite(f'character_{self.color}_walk_b')
-        # Load jump
-        self.sprites['jump'] = self.load_sprite(f'character_{self.color}_jump')
-
-    def load_sprite(self, name):
-        svg_path = f'timeloop_game/assets/Characters/{name}.svg'
-        png_path = f'timeloop_game/assets/Characters/{name}.png'
-        if os.path.exists(png_path):
-            return pygame.image.load(png_path).convert_alpha()
-        elif os.path.exists(svg_path) and cairosvg:
-            cairosvg.svg2png(url=svg_path, write_to=png_path, output_width=40, output_height=60)
-            return pygame.image.load(png_path).convert_alpha()
-        return None
+
+    @property
+    def sprites(self):
+        # Looked up on draw so a headless Simulation never touches the display;
+        # shared with every other Player/Ghost of this color
+        return assets.character_sprites(self.color)
+
+    def get_state(self):
+        return (self.x, self.y, self.vel_x, self.vel_y, self.on_ground, self.ground,
+                self.state, self.walk_frame, self.walk_timer)
+
+    def set_state(self, state):
+        (self.x, self.y, self.vel_x, self.vel_y, self.on_ground, self.ground,
+         self.state, self.walk_frame, self.walk_timer) = state
+        self.sync()
+
+    def sync(self):
+        self.rect.x = math.floor(self.x + 0.5)
+        self.rect.y = math.floor(self.y + 0.5)
+
+    def place(self, x, y):
+        # Put the player at (x, y) at rest and in the air
+        self.x, self.y = float(x), float(y)
+        self.vel_x = self.vel_y = 0.0
+        self.on_ground = False
+        self.ground = None
+        self.sync()
+
+    def settle(self, platforms):
+        """Lift the player out of any platform the spawn overlaps."""
+        if settle_rect(self.rect, platforms):
+            self.x, self.y = float(self.rect.x), float(self.rect.y)
 
     def handle_input(self, keys):
-        speed = 5
-        moving = False
-        if keys[pygame.K_LEFT]:
-            self.rect.x -= speed
-            moving = True
-        if keys[pygame.K_RIGHT]:
-            self.rect.x += speed
-            moving = True
-        if keys[pygame.K_SPACE] and self.on_ground:
-            self.vel_y = -12
+        self.apply_input(keys[pygame.K_LEFT], keys[pygame.K_RIGHT], keys[pygame.K_SPACE])
+
+    def apply_input(self, left, right, jump):
+        self.vel_x = 0.0
+        self.jump_held = bool(jump)
+        if left:
+            self.vel_x -= RUN_SPEED
+        if right:
+            self.vel_x += RUN_SPEED
+        if jump and self.on_ground:
+            self.vel_y = -JUMP_SPEED
             self.on_ground = False
+            self.ground = None
         # Set state
         if not self.on_ground:
             self.state = 'jump'
-        elif moving:
+        elif left or right:
             self.state = 'walk'
         else:
             self.state = 'idle'
 
-    def update(self, platforms):
-        gravity = 0.6
-        self.vel_y += gravity
-        self.rect.y += int(self.vel_y)
-        self.on_ground = False
-        for plat in platforms:
-            if self.rect.colliderect(plat):
-                if self.vel_y > 0:
-                    self.rect.bottom = plat.top
-                    self.vel_y = 0
-                    self.on_ground = True
+    def update(self, platforms, dt=1 / BASE_RATE):
+        """Advance dt seconds against platforms, a SpatialGrid of Rects.
+
+        The step is split at the top of a jump, where the player walks off
+        its ground and where it lands (jumping again straight away if jump
+        is held), so each of those happens when it would at any dt.
+        """
+        ground = self.ground
+        w, h = self.rect.size
+        if ground is not None and motion(ground)[0].top != self.y + h:
+            ground = None
+        vel_x = self.vel_x
+        left = dt
+        # Most steps have nothing inside them: walking on static ground
+        # short of its edge, or rising short of the apex. Take those whole,
+        # with the same arithmetic as the loop below.
+        if ground is not None:
+            if ground.__class__ is pygame.Rect:
+                edge = ground.right if vel_x > 0 else ground.x - w
+                if not vel_x or (edge - self.x) / vel_x >= dt:
+                    self.x += vel_x * dt
+                    left = 0.0
+        elif self.vel_y < 0 and -self.vel_y / GRAVITY >= dt:
+            self.x += vel_x * dt
+            self.y += fall_distance(self.vel_y, dt)
+            self.vel_y += GRAVITY * dt
+            left = 0.0
+        for _ in range(MAX_EVENTS):
+            if left <= 0:
+                break
+            if ground is not None:
+                # Walk along the ground, carried at its speed
+                rect, plat_x, plat_vel = motion(ground)
+                edge = plat_x - plat_vel * left
+                edge += rect.w if vel_x > 0 else -w
+                step = left
+                if vel_x and (edge - self.x) / vel_x < left:
+                    # Clear of the ground's edge within the step; fall from there
+                    step = max((edge - self.x) / vel_x, 0.0)
+                    self.x = edge + plat_vel * step
+                    ground = None
+                else:
+                    self.x += (vel_x + plat_vel) * step
+                left -= step
+            elif self.vel_y < 0:
+                # Rising never lands on anything; go up to the apex
+                step = min(left, -self.vel_y / GRAVITY)
+                self.x += vel_x * step
+                self.y += fall_distance(self.vel_y, step)
+                self.vel_y = 0.0 if step < left else self.vel_y + GRAVITY * step
+                left -= step
+            else:
+                step, plat = sweep_landing(self.x, self.y, w, h, vel_x, self.vel_y, left, platforms)
+                self.x += vel_x * step
+                left -= step
+                if plat is None:
+                    self.y += fall_distance(self.vel_y, step)
+                    self.vel_y += GRAVITY * step
+                else:
+                    self.y = float(motion(plat)[0].top - h)
+                    if self.jump_held:
+                        self.vel_y = -JUMP_SPEED
+                    else:
+                        self.vel_y = 0.0
+                        ground = plat
+        self.ground = ground
+        self.on_ground = ground is not None
+        self.sync()
         # Animate walk
         if self.state == 'walk':
-            self.walk_timer += 1
-            if self.walk_timer > 8:
+            self.walk_timer += dt
+            if self.walk_timer > WALK_FRAME_TIME:
                 self.walk_frame = 1 - self.walk_frame
-                self.walk_timer = 0
+                self.walk_timer = 0.0
         else:
             self.walk_frame = 0
-            self.walk_timer = 0
+            self.walk_timer = 0.0
 
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
+        rect = self.rect.move(offset)
         sprite = None
         if self.state == 'walk':
             sprite = self.sprites['walk'][self.walk_frame]
         else:
             sprite = self.sprites[self.state]
         if sprite:
-            surface.blit(sprite, self.rect)
+            surface.blit(sprite, rect)
+            profiler.count('blits')
         else:
-            center = self.rect.centerx, self.rect.centery
+            center = rect.centerx, rect.centery
             pygame.draw.circle(surface, (80, 200, 255), center, 20)
             pygame.draw.circle(surface, (255, 255, 255), center, 20, 3) 
\ No newline at end of file
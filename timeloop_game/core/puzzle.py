@@ -1,6 +1,30 @@
+import math
+
+import numpy as np
 import pygame
+from core.physics import BASE_RATE
+from utils.profiler import profiler
+
+ANY = 'any'
+ALL = 'all'
+MODES = (ANY, ALL)
+# Buttons are read this many times a second whatever the simulation rate,
+# so at every rate that is a multiple of it a press is seen at the same
+# moment and the doors and platforms it drives switch in step
+SWITCH_RATE = 30
+# Below this many entity/button pairs a plain Python test beats NumPy's
+# per-call overhead; a level's own few buttons and ghosts always are
+SMALL_TEST = 32
+
+
+def switch_tick(frame, fps):
+    """True if step `frame` of a loop (counted from 1) at `fps` reads the buttons."""
+    return frame * SWITCH_RATE // fps != (frame - 1) * SWITCH_RATE // fps
+
 
 class Button:
+    __slots__ = ('rect', 'pressed')
+
     def __init__(self, rect):
         self.rect = pygame.Rect(*rect)
         self.pressed = False
@@ -8,65 +32,244 @@ class Button:
     def update(self, entities):
         self.pressed = any(self.rect.colliderect(e.rect) for e in entities)
 
-    def draw(self, surface):
+    def bounds(self):
+        # The glow reaches 4px past the rect on every side, the shadow too
+        return self.rect.inflate(8, 8)
+
+    def draw(self, surface, offset=(0, 0)):
+        rect = self.rect.move(offset)
         # Draw shadow
-        shadow = self.rect.copy()
+        shadow = rect.copy()
         shadow.y += 4
         pygame.draw.rect(surface, (40, 40, 60, 80), shadow, border_radius=8)
         # Draw button
         color = (0, 220, 100) if self.pressed else (220, 60, 60)
-        pygame.draw.rect(surface, color, self.rect, border_radius=8)
-        pygame.draw.rect(surface, (255, 255, 255), self.rect, 2, border_radius=8)
+        pygame.draw.rect(surface, color, rect, border_radius=8)
+        pygame.draw.rect(surface, (255, 255, 255), rect, 2, border_radius=8)
         if self.pressed:
-            glow = pygame.Surface((self.rect.width+8, self.rect.height+8), pygame.SRCALPHA)
+            glow = pygame.Surface((rect.width+8, rect.height+8), pygame.SRCALPHA)
+            profiler.count('surface_alloc')
             pygame.draw.ellipse(glow, (0,255,100,80), glow.get_rect())
-            surface.blit(glow, (self.rect.x-4, self.rect.y-4), special_flags=pygame.BLEND_RGBA_ADD)
+            surface.blit(glow, (rect.x-4, rect.y-4), special_flags=pygame.BLEND_RGBA_ADD)
+            profiler.count('blits')
+
+def powered(inputs, mode):
+    if mode == ALL:
+        return all(button.pressed for button in inputs)
+    return any(button.pressed for button in inputs)
+
 
 class Door:
-    def __init__(self, rect, button: Button):
+    __slots__ = ('rect', 'inputs', 'mode', 'open')
+
+    def __init__(self, rect, inputs, mode=ANY):
         self.rect = pygame.Rect(*rect)
-        self.button = button
+        # A single Button is the original one-button-one-door wiring
+        self.inputs = (inputs,) if isinstance(inputs, Button) else tuple(inputs)
+        self.mode = mode
         self.open = False
 
     def update(self):
-        self.open = self.button.pressed
+        self.open = powered(self.inputs, self.mode)
+
+    def bounds(self):
+        return self.rect.union(self.rect.move(0, 6))
 
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
+        rect = self.rect.move(offset)
         # Draw shadow
-        shadow = self.rect.copy()
+        shadow = rect.copy()
         shadow.y += 6
         pygame.draw.rect(surface, (40, 40, 60, 80), shadow, border_radius=8)
         # Draw door
         if not self.open:
-            pygame.draw.rect(surface, (120, 120, 120), self.rect, border_radius=8)
-            pygame.draw.rect(surface, (255, 255, 255), self.rect, 2, border_radius=8)
+            pygame.draw.rect(surface, (120, 120, 120), rect, border_radius=8)
+            pygame.draw.rect(surface, (255, 255, 255), rect, 2, border_radius=8)
         else:
             # Draw open door as a faint outline
-            pygame.draw.rect(surface, (120, 255, 120, 80), self.rect, border_radius=8)
-            pygame.draw.rect(surface, (255, 255, 255, 120), self.rect, 2, border_radius=8)
+            pygame.draw.rect(surface, (120, 255, 120, 80), rect, border_radius=8)
+            pygame.draw.rect(surface, (255, 255, 255, 120), rect, 2, border_radius=8)
 
 class MovingPlatform:
-    def __init__(self, rect, x1, x2, speed):
+    __slots__ = ('rect', 'x', 'vel_x', 'x1', 'x2', 'speed', 'direction', 'inputs', 'mode', 'powered')
+
+    def __init__(self, rect, x1, x2, speed, inputs=(), mode=ANY):
         self.rect = pygame.Rect(*rect)
+        self.x = float(self.rect.x)  # rect.x is this rounded
+        self.vel_x = 0.0  # over the last update, for riders (core.physics)
         self.x1 = x1
         self.x2 = x2
-        self.speed = speed
+        self.speed = speed  # pixels per frame at BASE_RATE
         self.direction = 1
+        # Unwired platforms always run; wired ones only while powered
+        self.inputs = tuple(inputs)
+        self.mode = mode
+        self.powered = not self.inputs
 
-    def update(self):
-        self.rect.x += self.speed * self.direction
-        if self.rect.x < self.x1:
-            self.rect.x = self.x1
-            self.direction = 1
-        elif self.rect.x > self.x2:
-            self.rect.x = self.x2
+    def get_state(self):
+        return self.x, self.direction, self.vel_x
+
+    def set_state(self, state):
+        self.x, self.direction, self.vel_x = state
+        self.rect.x = math.floor(self.x + 0.5)
+
+    def evaluate(self):
+        self.powered = not self.inputs or powered(self.inputs, self.mode)
+
+    def bounds(self):
+        return self.rect.union(self.rect.move(0, 6))
+
+    def update(self, dt=1 / BASE_RATE):
+        if not self.powered:
+            self.vel_x = 0.0
+            return
+        x = self.x + self.speed * BASE_RATE * dt * self.direction
+        # Bounce off the ends mid-step, so the turn lands at the same
+        # moment whatever dt is
+        if x > self.x2:
+            x = max(2 * self.x2 - x, self.x1)
             self.direction = -1
+        elif x < self.x1:
+            x = min(2 * self.x1 - x, self.x2)
+            self.direction = 1
+        self.vel_x = (x - self.x) / dt
+        self.x = x
+        self.rect.x = math.floor(x + 0.5)
 
-    def draw(self, surface):
+    def draw(self, surface, offset=(0, 0)):
+        rect = self.rect.move(offset)
         # Draw shadow
-        shadow = self.rect.copy()
+        shadow = rect.copy()
         shadow.y += 6
         pygame.draw.rect(surface, (40, 40, 60, 80), shadow, border_radius=8)
         # Draw platform
-        pygame.draw.rect(surface, (180, 180, 40), self.rect, border_radius=8)
-        pygame.draw.rect(surface, (255, 255, 255), self.rect, 2, border_radius=8) 
\ No newline at end of file
+        pygame.draw.rect(surface, (180, 180, 40), rect, border_radius=8)
+        pygame.draw.rect(surface, (255, 255, 255), rect, 2, border_radius=8) 
+
+
+class PuzzleGraph:
+    """Buttons wired to doors and moving platforms.
+
+    Every step, one batched NumPy pass tests all entity boxes against all
+    button rects (a plain loop when there are only a few). Only buttons
+    whose occupancy changed are touched, and only the doors and platforms
+    wired to them are re-evaluated, so a quiet frame costs the same with
+    1 trigger or 100.
+    """
+
+    def __init__(self, buttons=(), doors=(), platforms=()):
+        self.buttons = list(buttons)
+        self.doors = list(doors)
+        self.platforms = list(platforms)
+        index = {id(button): i for i, button in enumerate(self.buttons)}
+        # fanout[i]: targets to re-evaluate when button i changes
+        self.fanout = [[] for _ in self.buttons]
+        for door in self.doors:
+            for button in door.inputs:
+                self.fanout[index[id(button)]].append(door)
+        for platform in self.platforms:
+            for button in platform.inputs:
+                self.fanout[index[id(button)]].append(platform)
+        # One row per edge (left, top, right, bottom), one column per button
+        edges = [(b.rect.left, b.rect.top, b.rect.right, b.rect.bottom) for b in self.buttons]
+        self.trigger_edges = edges
+        self.triggers = np.array(edges, dtype=np.int32).reshape(-1, 4).T.copy()
+        self.scratch = None
+        self.occupied = [False] * len(self.buttons)
+
+    @classmethod
+    def from_level(cls, level):
+        buttons = [Button(rect) for rect in level.buttons]
+        doors = [Door(door['rect'], [buttons[i] for i in door['inputs']], door['mode'])
+                 for door in level.doors]
+        platforms = [MovingPlatform(mp['rect'], mp['x1'], mp['x2'], mp['speed'],
+                                    [buttons[i] for i in mp['inputs']], mp['mode'])
+                     for mp in level.moving_platforms]
+        return cls(buttons, doors, platforms)
+
+    @property
+    def doors_open(self):
+        return all(door.open for door in self.doors)
+
+    def overlaps(self, boxes):
+        """Per button, whether any entity box overlaps it.
+
+        boxes is (4, entities, 1): left, top, right and bottom edges as
+        columns, so each test below is one (entities, buttons) comparison.
+        Matches Rect.colliderect. Returns a list of bools.
+        """
+        if boxes.shape[1] * len(self.buttons) <= SMALL_TEST:
+            entities = list(zip(*boxes[:, :, 0].tolist()))
+            return [any(l < right and r > left and t < bottom and b > top for l, t, r, b in entities)
+                    for left, top, right, bottom in self.trigger_edges]
+        shape = (boxes.shape[1], self.triggers.shape[1])
+        if self.scratch is None or self.scratch[0].shape != shape:
+            self.scratch = (np.empty(shape, dtype=bool), np.empty(shape, dtype=bool))
+        hit, test = self.scratch
+        left, top, right, bottom = self.triggers
+        np.less(boxes[0], right, out=hit)
+        hit &= np.greater(boxes[2], left, out=test)
+        hit &= np.less(boxes[1], bottom, out=test)
+        hit &= np.greater(boxes[3], top, out=test)
+        return hit.any(axis=0).tolist()
+
+    def update(self, boxes):
+        """Press/release buttons from entity boxes; returns how many were newly pressed."""
+        if not self.buttons:
+            return 0
+        occupied = self.overlaps(boxes)
+        if occupied == self.occupied:
+            return 0
+        changed = [i for i, (now, was) in enumerate(zip(occupied, self.occupied)) if now != was]
+        self.occupied = occupied
+        pressed = 0
+        dirty = []
+        for i in changed:
+            button = self.buttons[i]
+            button.pressed = occupied[i]
+            pressed += button.pressed
+            for target in self.fanout[i]:
+                if target not in dirty:
+                    dirty.append(target)
+        for target in dirty:
+            if isinstance(target, Door):
+                target.update()
+            else:
+                target.evaluate()
+        return pressed
+
+    def move_platforms(self, dt=1 / BASE_RATE):
+        for platform in self.platforms:
+            platform.update(dt)
+
+    def get_state(self):
+        return (tuple(button.pressed for button in self.buttons),
+                tuple(platform.get_state() for platform in self.platforms))
+
+    def set_state(self, state):
+        pressed, platforms = state
+        for button, value in zip(self.buttons, pressed):
+            button.pressed = value
+        self.occupied = [bool(value) for value in pressed]
+        for platform, value in zip(self.platforms, platforms):
+            platform.set_state(value)
+            platform.evaluate()
+        for door in self.doors:
+            door.update()
+
+    def bounds(self):
+        return [piece.bounds() for pieces in (self.platforms, self.buttons, self.doors) for piece in pieces]
+
+    def draw(self, surface, view=None):
+        # With a camera view, pieces outside it are skipped and the rest
+        # drawn relative to it
+        if view is None:
+            for pieces in (self.platforms, self.buttons, self.doors):
+                for piece in pieces:
+                    piece.draw(surface)
+            return
+        offset = (-view.x, -view.y)
+        for pieces in (self.platforms, self.buttons, self.doors):
+            for piece in pieces:
+                if view.colliderect(piece.bounds()):
+                    piece.draw(surface, offset)
@@ -0,0 +1,261 @@
+import math
+
+import numpy as np
+import pygame
+from core.physics import BASE_RATE, RUN_SPEED
+from core.player import Player
+from core.ghost import GhostSwarm, GHOST_SIZE
+from core.level_loader import LevelLoader
+from core.timer import Timer
+from core.puzzle import PuzzleGraph, switch_tick
+from core.world import STREAM_MARGIN
+from utils.profiler import profiler
+from utils.recorder import Recorder, InputLog
+
+FPS = 60
+# Highest rate anything accepts from outside (TIMELOOP_HZ, submitted runs)
+MAX_RATE = 1000
+LOOP_SECONDS = 20
+MAX_LOOPS = 3
+
+# One bit per input, so a frame's input fits in a byte
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+
+PLAYING = 'playing'
+WON = 'won'
+LOST = 'lost'
+
+
+def inputs_from_keys(keys):
+    inputs = 0
+    if keys[pygame.K_LEFT]:
+        inputs |= INPUT_LEFT
+    if keys[pygame.K_RIGHT]:
+        inputs |= INPUT_RIGHT
+    if keys[pygame.K_SPACE]:
+        inputs |= INPUT_JUMP
+    return inputs
+
+
+class SimState:
+    """Everything Simulation.restore() needs to rewind to one frame.
+
+    Fields are plain numbers, bools and tuples (the player's state also
+    names the platform Rect it stands on, by reference), so a snapshot is
+    a handful of small objects and copying one is a shallow copy. The recorder and
+    input log are append-only, so only their lengths are kept.
+    """
+
+    __slots__ = ('frame', 'loop_count', 'won', 'lost', 'player', 'frames_left', 'puzzle',
+                 'ghost_count', 'ghost_frame', 'recorded', 'last_pos', 'inputs')
+
+    def __init__(self, frame, loop_count, won, lost, player, frames_left, puzzle,
+                 ghost_count, ghost_frame, recorded, last_pos, inputs):
+        # Spelled out rather than a loop over __slots__: validation takes
+        # a snapshot before every step it searches
+        self.frame = frame
+        self.loop_count = loop_count
+        self.won = won
+        self.lost = lost
+        self.player = player
+        self.frames_left = frames_left
+        self.puzzle = puzzle
+        self.ghost_count = ghost_count
+        self.ghost_frame = ghost_frame
+        self.recorded = recorded
+        self.last_pos = last_pos
+        self.inputs = inputs
+
+    def as_tuple(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def copy(self):
+        return SimState(**dict(zip(self.__slots__, self.as_tuple())))
+
+    def __eq__(self, other):
+        return isinstance(other, SimState) and self.as_tuple() == other.as_tuple()
+
+    __hash__ = None
+
+
+class Simulation:
+    """Game rules for one level, stepped at a fixed 1/fps timestep (FPS by default).
+
+    Needs no display or mixer, so it runs headless and as fast as the CPU
+    allows. Game renders on top of it; anything that should make a sound
+    is reported in `events` for the step that caused it.
+    """
+
+    def __init__(self, level, player_choice='green', loop_seconds=LOOP_SECONDS,
+                 max_loops=MAX_LOOPS, fps=FPS):
+        # A Level from LevelLoader/LevelPack, or a path to a level JSON
+        if isinstance(level, str):
+            level = LevelLoader.load(level)
+        self.level = level
+        self.player_choice = player_choice
+        self.loop_seconds = loop_seconds
+        self.max_loops = max_loops
+        self.fps = fps
+        self.reset()
+
+    def reset(self):
+        self.platforms = self.level.platforms
+        self.exit_rect = self.level.exit_rect
+        self.dt = 1 / self.fps
+        self.puzzle = PuzzleGraph.from_level(self.level)
+        # Static platforms are bucketed once; moving platforms are re-bucketed
+        # only when they cross a cell boundary. A chunked level's grid holds
+        # only the columns around the player
+        self.grid = self.level.make_grid()
+        self.streaming = self.level.chunks is not None
+        for platform in self.puzzle.platforms:
+            self.grid.add_dynamic(platform, platform.rect, platform)
+        # As far sideways as one step can take the player, running while
+        # carried by the fastest platform, on top of the usual margin
+        carry = max((abs(platform.speed) * BASE_RATE for platform in self.puzzle.platforms), default=0.0)
+        self.stream_margin = STREAM_MARGIN + math.ceil((RUN_SPEED + carry) * self.dt)
+        self.player = Player(*self.level.player_start, color=self.player_choice)
+        if self.streaming:
+            self.grid.stream(self.player.rect, self.stream_margin)
+        self.player.settle(self.grid)
+        # Where the player really starts, which ghosts replay from
+        self.player_start = self.player.rect.topleft
+        self.spawn_state = self.player.get_state()
+        self.timer = Timer(self.loop_seconds, self.fps)
+        self.recorder = Recorder(self.player_start)
+        self.input_log = InputLog()
+        self.ghost_replays = []
+        self.ghosts = GhostSwarm(self.ghost_replays, self.player_start, color=self.player_choice)
+        self.won = False
+        self.lost = False
+        self.loop_count = 0
+        self.frame = 0
+        self.events = []
+        self.build_entity_boxes()
+
+    def build_entity_boxes(self):
+        # Edges of the player then every ghost, one row per edge, for the
+        # puzzle's batched button test; rebuilt only when ghosts are added
+        self.entity_boxes = np.zeros((4, 1 + len(self.ghosts), 1), dtype=np.int32)
+        self.ghost_size = np.array(GHOST_SIZE, dtype=np.int32)[:, None]
+
+    def update_entity_boxes(self):
+        boxes = self.entity_boxes
+        rect = self.player.rect
+        boxes[:, 0, 0] = (rect.left, rect.top, rect.right, rect.bottom)
+        if boxes.shape[1] > 1:
+            corners = self.ghosts.locate().T
+            boxes[:2, 1:, 0] = corners
+            np.add(corners, self.ghost_size, out=boxes[2:, 1:, 0])
+
+    @property
+    def status(self):
+        if self.won:
+            return WON
+        if self.lost:
+            return LOST
+        return PLAYING
+
+    def step(self, inputs=0):
+        self.events.clear()
+        if self.won or self.lost:
+            return self.status
+        self.frame += 1
+        self.input_log.record(inputs)
+        if self.puzzle.platforms:
+            with profiler.section('moving_platform'):
+                for platform in self.puzzle.platforms:
+                    platform.update(self.dt)
+                    self.grid.move(platform)
+        with profiler.section('player_update'):
+            if self.streaming:
+                self.grid.stream(self.player.rect, self.stream_margin)
+            self.player.apply_input(inputs & INPUT_LEFT, inputs & INPUT_RIGHT, inputs & INPUT_JUMP)
+            self.player.update(self.grid, self.dt)
+            self.recorder.record((self.player.rect.x, self.player.rect.y))
+        self.timer.update()
+        with profiler.section('ghosts_update'):
+            self.ghosts.step()
+        with profiler.section('puzzle_update'):
+            loop_frame = self.timer.total_frames - self.timer.frames_left
+            if self.puzzle.buttons and switch_tick(loop_frame, self.fps):
+                self.update_entity_boxes()
+                if self.puzzle.update(self.entity_boxes):
+                    self.events.append('button')
+        if self.timer.is_time_up():
+            self.end_loop()
+        # Every door is a lock on the exit
+        if self.puzzle.doors_open and self.player.rect.colliderect(self.exit_rect):
+            self.won = True
+            self.events.append('win')
+        return self.status
+
+    def end_loop(self):
+        # Reuse the Player, Recorder and existing ghosts; only the new ghost
+        # is built, and everything is wound back to the loop's first frame
+        replay = self.recorder.get_moves()
+        self.ghost_replays.append(replay)
+        self.ghosts.add(replay)
+        self.ghosts.seek(0)
+        self.build_entity_boxes()
+        self.player.set_state(self.spawn_state)
+        self.recorder.reset()
+        self.timer.reset()
+        self.loop_count += 1
+        if self.loop_count >= self.max_loops:
+            self.lost = True
+            self.events.append('lose')
+
+    def snapshot(self):
+        return SimState(
+            frame=self.frame,
+            loop_count=self.loop_count,
+            won=self.won,
+            lost=self.lost,
+            player=self.player.get_state(),
+            frames_left=self.timer.frames_left,
+            puzzle=self.puzzle.get_state(),
+            ghost_count=len(self.ghost_replays),
+            ghost_frame=self.ghosts.frame,
+            recorded=len(self.recorder.deltas) // 2,
+            last_pos=self.recorder.last_pos,
+            inputs=len(self.input_log),
+        )
+
+    def restore(self, state):
+        """Rewind to a snapshot taken earlier in this run.
+
+        Within a loop this only truncates the recorder and input log. Going
+        back past a loop reset drops the later ghosts and resumes recording
+        into a copy of the replay the earlier loop had produced.
+        """
+        if state.ghost_count < len(self.ghost_replays):
+            replay = self.ghost_replays[state.ghost_count]
+            del self.ghost_replays[state.ghost_count:]
+            self.recorder.deltas = replay.deltas[:state.recorded * 2]
+            self.recorder.last_pos = state.last_pos
+            self.ghosts = GhostSwarm(self.ghost_replays, self.player_start, color=self.player_choice)
+            self.build_entity_boxes()
+        else:
+            self.recorder.truncate(state.recorded, state.last_pos)
+        self.input_log.truncate(state.inputs)
+        self.ghosts.seek(state.ghost_frame)
+        self.player.set_state(state.player)
+        self.timer.frames_left = state.frames_left
+        self.puzzle.set_state(state.puzzle)
+        for platform in self.puzzle.platforms:
+            self.grid.move(platform)
+        self.frame = state.frame
+        self.loop_count = state.loop_count
+        self.won = state.won
+        self.lost = state.lost
+        self.events.clear()
+
+    def run(self, inputs):
+        """Step through an iterable of per-frame inputs until the level ends."""
+        for frame_inputs in inputs:
+            if self.step(frame_inputs) != PLAYING:
+                break
+        return self.status
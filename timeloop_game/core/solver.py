@@ -0,0 +1,255 @@
+"""Headless search for a winning run of a level.
+
+Every loop but the last sends the player to a button that opens a door
+and leaves them standing there, so the ghost replaying that loop holds
+it down; with several such buttons the loops take them in turn. The last
+loop then looks for a path to the exit while the doors are open.
+Each loop is a beam search over input sequences driven by the real
+Player physics, MovingPlatform and ghost replays, with visited states
+memoized so no (position, velocity, world state) is expanded twice.
+"""
+import heapq
+import math
+import numpy as np
+import pygame
+
+from core.ghost import GhostSwarm, GHOST_SIZE
+from core.physics import BASE_RATE, GRAVITY, RUN_SPEED
+from core.player import Player
+from core.puzzle import PuzzleGraph, ALL, switch_tick
+from core.simulation import (Simulation, FPS, LOOP_SECONDS, MAX_LOOPS, WON, PLAYING,
+                             INPUT_LEFT, INPUT_RIGHT, INPUT_JUMP)
+
+# Jump stays in the set even mid-air: the player may land partway through
+# an action and jump again on its next frame. Branches that end up
+# identical are dropped by the visited set.
+ACTIONS = (0, INPUT_LEFT, INPUT_RIGHT, INPUT_JUMP, INPUT_LEFT | INPUT_JUMP, INPUT_RIGHT | INPUT_JUMP)
+ACTION_REPEAT = 4
+BEAM_WIDTH = 800
+FALL_LIMIT = 1000
+# Standing this far onto a button, not just touching its edge
+BUTTON_MARGIN = 5
+VEL_STEP = GRAVITY / BASE_RATE
+RUN_STEP = RUN_SPEED / BASE_RATE
+# Airborne heights closer than this (px) are one state to the search
+ROW_STEP = 5
+
+
+class LoopWorld:
+    """Everything in one loop that does not depend on the player: where the
+    moving platforms are and which buttons the ghosts hold, per frame.
+
+    Platforms wired to buttons are powered by the ghosts alone here; the
+    player's own presses are only accounted for when the final run is
+    verified through Simulation.
+    """
+
+    def __init__(self, level, replays, frames, start=None, fps=FPS):
+        self.level = level
+        self.frames = frames
+        self.dt = 1 / fps
+        self.grid = level.make_grid()
+        if level.chunks is not None:
+            # The search jumps between states anywhere in the world
+            self.grid.load_all()
+        self.button_rects = [pygame.Rect(*rect) for rect in level.buttons]
+        # Buttons that drive a platform; a press the ghosts are not making
+        # moves it off the timeline recorded here
+        self.platform_buttons = sorted({i for mp in level.moving_platforms for i in mp['inputs']})
+        self.platforms = PuzzleGraph.from_level(level).platforms
+        for platform in self.platforms:
+            self.grid.add_dynamic(platform, platform.rect, platform)
+        # Settled the way Simulation.reset settles it, before anything moves
+        player = Player(*level.player_start)
+        player.settle(self.grid)
+        self.spawn = player.get_state()
+        # Puzzle state is not rewound between loops; start from what the
+        # previous loop left behind
+        puzzle = PuzzleGraph.from_level(level)
+        if start is not None:
+            puzzle.set_state(start)
+        swarm = GhostSwarm(replays, player.rect.topleft)
+        boxes = np.zeros((4, len(swarm), 1), dtype=np.int32)
+        size = np.array(GHOST_SIZE, dtype=np.int32)[:, None]
+        self.platform_states = [tuple(p.get_state() for p in puzzle.platforms)]
+        self.ghost_press = [tuple(b.pressed for b in puzzle.buttons)]
+        self.settled = 0  # from this frame on ghost_press never changes
+        for f in range(1, frames + 1):
+            puzzle.move_platforms(self.dt)
+            if len(swarm) and switch_tick(f, fps):
+                swarm.seek(f)
+                corners = swarm.locate().T
+                boxes[:2, :, 0] = corners
+                np.add(corners, size, out=boxes[2:, :, 0])
+                puzzle.update(boxes)
+            self.platform_states.append(tuple(p.get_state() for p in puzzle.platforms))
+            self.ghost_press.append(tuple(b.pressed for b in puzzle.buttons))
+            if self.ghost_press[f] != self.ghost_press[f - 1]:
+                self.settled = f
+
+    def place_platform(self, frame):
+        for platform, state in zip(self.platforms, self.platform_states[frame]):
+            platform.set_state(state)
+            self.grid.move(platform)
+
+    def key(self, player, frame, repeat=ACTION_REPEAT):
+        # The earliest arrival at a state is kept. The platform phase only
+        # matters while riding one, and the ghosts only once they settle.
+        riding = None
+        if any(player.ground is p for p in self.platforms):
+            riding = self.platform_states[frame]
+        # x to as far as one searched action walks, y to ROW_STEP and the
+        # speed to one BASE_RATE frame of gravity: states that close play
+        # out the same as far as the search can tell. Walking alone keeps
+        # x on that lattice around the spawn, but riding a platform, and
+        # walking off ledges and landing between frames, put the float
+        # position anywhere; a finer key never lets the search run out
+        # of new states.
+        column = math.floor((player.x - self.spawn[0]) / (RUN_STEP * repeat) + 0.5)
+        row = math.floor(player.y / ROW_STEP + 0.5)
+        return (column, row, round(player.vel_y / VEL_STEP),
+                player.on_ground, riding, frame >= self.settled)
+
+    def presses(self, player, frame, buttons):
+        # The player alone holding down one of these buttons
+        pressed = self.ghost_press[frame]
+        return any(not pressed[i] and player.rect.colliderect(self.button_rects[i]) for i in buttons)
+
+    def doors_open(self, player, frame):
+        pressed = [ghost or player.rect.colliderect(rect)
+                   for ghost, rect in zip(self.ghost_press[frame], self.button_rects)]
+        for door in self.level.doors:
+            inputs = [pressed[i] for i in door['inputs']]
+            if not (all(inputs) if door['mode'] == ALL else any(inputs)):
+                return False
+        return True
+
+
+def on_button(index):
+    def goal(world, player, frame):
+        return (player.on_ground
+                and player.rect.inflate(-2 * BUTTON_MARGIN, 0).colliderect(world.button_rects[index]))
+    return goal
+
+
+def can_win(world, player, frame):
+    return player.rect.colliderect(world.level.exit_rect) and world.doors_open(player, frame)
+
+
+def door_buttons(level):
+    # Buttons that open doors, in order; the ones worth a ghost holding
+    buttons = []
+    for door in level.doors:
+        for i in door['inputs']:
+            if i not in buttons:
+                buttons.append(i)
+    return buttons
+
+
+def search(world, goal, target, last_frame, beam_width=BEAM_WIDTH, repeat=ACTION_REPEAT, avoid=()):
+    """Beam search for inputs reaching goal(world, player, frame) by last_frame.
+
+    Returns the per-frame input list, or None. States are the player's
+    get_state() at frames that are multiples of `repeat`; the goal is
+    checked on every frame in between. Paths that press a button in
+    `avoid` before the ghosts do are dropped, since the world would not
+    move as recorded after that.
+    """
+    # One player per action, stepped side by side so each frame's
+    # platforms are placed once for all of them
+    players = [Player(0, 0) for _ in ACTIONS]
+    tx, ty = target.center
+    start = world.spawn
+    frontier = [(start, None)]
+    parents = []  # per layer: list of (parent index, action)
+    visited = set()
+    frame = 0
+    while frontier and frame < last_frame:
+        steps = min(repeat, last_frame - frame)
+        layer = []
+        for parent_index, (state, _) in enumerate(frontier):
+            live = list(zip(players, ACTIONS))
+            for player, _ in live:
+                player.set_state(state)
+            for i in range(1, steps + 1):
+                world.place_platform(frame + i)
+                kept = []
+                for player, action in live:
+                    player.apply_input(action & INPUT_LEFT, action & INPUT_RIGHT, action & INPUT_JUMP)
+                    player.update(world.grid, world.dt)
+                    if goal(world, player, frame + i):
+                        inputs = unwind(parents, parent_index, repeat)
+                        return inputs + [action] * i
+                    if not (avoid and world.presses(player, frame + i, avoid)):
+                        kept.append((player, action))
+                live = kept
+            for player, action in live:
+                if player.rect.y > FALL_LIMIT:
+                    continue
+                key = world.key(player, frame + steps, repeat)
+                if key in visited:
+                    continue
+                visited.add(key)
+                cost = abs(player.rect.centerx - tx) + abs(player.rect.centery - ty)
+                layer.append((cost, player.get_state(), (parent_index, action)))
+        if beam_width and len(layer) > beam_width:
+            layer = heapq.nsmallest(beam_width, layer, key=lambda item: item[0])
+        parents.append([item[2] for item in layer])
+        frontier = [(item[1], None) for item in layer]
+        frame += steps
+    return None
+
+
+def unwind(parents, index, repeat):
+    actions = []
+    for layer in reversed(parents):
+        index, action = layer[index]
+        actions.append(action)
+    actions.reverse()
+    inputs = []
+    for action in actions:
+        inputs.extend([action] * repeat)
+    return inputs
+
+
+def solve_level(level, max_loops=MAX_LOOPS, loop_seconds=LOOP_SECONDS, fps=FPS,
+                beam_width=BEAM_WIDTH, repeat=ACTION_REPEAT):
+    """Find the fewest loops that win `level`.
+
+    Returns a dict with 'solved', 'loops' (runs played, the last one wins),
+    'frames' and 'inputs' (one per-frame input list per loop). Each loop is
+    played through Simulation as soon as it is found, so the next search
+    starts from the ghosts and puzzle state that loop really leaves behind.
+    """
+    frames = int(round(loop_seconds * fps))
+    targets = door_buttons(level)
+    for loops in range(1, max_loops + 1):
+        if loops > 1 and not targets:
+            break
+        sim = Simulation(level, loop_seconds=loop_seconds, max_loops=max_loops, fps=fps)
+        runs = []
+        for k in range(loops - 1):
+            world = LoopWorld(level, sim.ghost_replays, frames, sim.puzzle.get_state(), fps)
+            target = targets[k % len(targets)]
+            avoid = [i for i in world.platform_buttons if i != target]
+            inputs = search(world, on_button(target), world.button_rects[target], frames, beam_width, repeat, avoid)
+            if inputs is None:
+                break
+            # Stand still on the button for the rest of the loop
+            inputs += [0] * (frames - len(inputs))
+            runs.append(inputs)
+            sim.run(inputs)
+            if sim.status != PLAYING:
+                break
+        if len(runs) != loops - 1 or sim.status != PLAYING:
+            continue
+        world = LoopWorld(level, sim.ghost_replays, frames, sim.puzzle.get_state(), fps)
+        # The loop ends on its last frame before the exit is checked
+        inputs = search(world, can_win, level.exit_rect, frames - 1, beam_width, repeat,
+                        world.platform_buttons)
+        if inputs is None:
+            continue
+        runs.append(inputs)
+        if sim.run(inputs) == WON:
+            return {'solved': True, 'loops': sim.loop_count + 1, 'frames': sim.frame, 'inputs': runs}
+    return {'solved': False, 'loops': None, 'frames': None, 'inputs': []}
@@ -0,0 +1,116 @@
+from bisect import insort
+
+GRID_CELL = 128
+
+
+class SpatialGrid:
+    """Uniform-grid spatial hash over pygame Rects.
+
+    Static entries are bucketed once. Dynamic entries keep a reference to a
+    Rect that is moved in place and are only re-bucketed by move() when
+    they cross into different cells. query() returns items in insertion
+    order, so resolving overlaps against it gives the same result as a
+    linear scan over the original list. The list query() returns is reused
+    by the next call, so consume it before querying the same grid again.
+    """
+
+    def __init__(self, cell_size=GRID_CELL):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.rects = []
+        self.items = []
+        self.dynamic = {}
+        self.result = []
+        self.ids = []
+
+    @classmethod
+    def from_buckets(cls, rects, buckets, cell_size=GRID_CELL):
+        # Rebuild a static grid from precomputed cell buckets (level packs)
+        grid = cls(cell_size)
+        grid.rects = list(rects)
+        grid.items = list(rects)
+        grid.cells = {cell: list(ids) for cell, ids in buckets.items()}
+        return grid
+
+    def copy(self):
+        # Cheap per-run copy so dynamic entries never leak into a shared grid
+        grid = SpatialGrid(self.cell_size)
+        grid.rects = list(self.rects)
+        grid.items = list(self.items)
+        grid.cells = {cell: list(ids) for cell, ids in self.cells.items()}
+        grid.dynamic = {key: list(entry) for key, entry in self.dynamic.items()}
+        return grid
+
+    def span(self, rect):
+        cs = self.cell_size
+        return (rect.x // cs, rect.y // cs,
+                max(rect.x, rect.right - 1) // cs, max(rect.y, rect.bottom - 1) // cs)
+
+    def _bucket(self, entry_id, span, add=True):
+        x0, y0, x1, y1 = span
+        cells = self.cells
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                if add:
+                    bucket = cells.get((cx, cy))
+                    if bucket is None:
+                        cells[(cx, cy)] = [entry_id]
+                    else:
+                        insort(bucket, entry_id)
+                else:
+                    bucket = cells[(cx, cy)]
+                    bucket.remove(entry_id)
+                    if not bucket:
+                        del cells[(cx, cy)]
+
+    def insert(self, rect, item=None):
+        entry_id = len(self.rects)
+        self.rects.append(rect)
+        self.items.append(rect if item is None else item)
+        self._bucket(entry_id, self.span(rect))
+        return entry_id
+
+    def add_dynamic(self, key, rect, item=None):
+        entry_id = self.insert(rect, item)
+        self.dynamic[key] = [entry_id, self.span(rect)]
+        return entry_id
+
+    def move(self, key, rect=None):
+        entry = self.dynamic[key]
+        entry_id = entry[0]
+        if rect is not None:
+            self.rects[entry_id] = rect
+        span = self.span(self.rects[entry_id])
+        if span != entry[1]:
+            self._bucket(entry_id, entry[1], add=False)
+            self._bucket(entry_id, span)
+            entry[1] = span
+
+    def remove_dynamic(self, key):
+        entry_id, span = self.dynamic.pop(key)
+        self._bucket(entry_id, span, add=False)
+
+    def query(self, rect):
+        x0, y0, x1, y1 = self.span(rect)
+        cells = self.cells
+        items = self.items
+        result = self.result
+        result.clear()
+        if x0 == x1 and y0 == y1:
+            for i in cells.get((x0, y0), ()):
+                result.append(items[i])
+            return result
+        ids = self.ids
+        ids.clear()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    ids.extend(bucket)
+        ids.sort()
+        last = -1
+        for i in ids:
+            if i != last:
+                result.append(items[i])
+                last = i
+        return result
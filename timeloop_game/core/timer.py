@@ -1,27 +1,32 @@
-import pygame
+from utils.text import text_cache
 
 class Timer:
-    def __init__(self, duration):
+    """Loop timer counted in simulation frames, not wall-clock time.
+
+    A slow rendered frame therefore never eats into the loop; the timer
+    only advances when the simulation steps.
+    """
+
+    def __init__(self, duration, fps=60):
         self.duration = duration
-        self.time_left = duration
-        self.last_tick = pygame.time.get_ticks()
+        self.fps = fps
+        self.total_frames = int(round(duration * fps))
+        self.frames_left = self.total_frames
+
+    @property
+    def time_left(self):
+        return self.frames_left / self.fps
 
     def update(self):
-        now = pygame.time.get_ticks()
-        elapsed = (now - self.last_tick) / 1000.0
-        self.time_left -= elapsed
-        self.last_tick = now
-        if self.time_left < 0:
-            self.time_left = 0
+        if self.frames_left > 0:
+            self.frames_left -= 1
 
     def reset(self):
-        self.time_left = self.duration
-        self.last_tick = pygame.time.get_ticks()
+        self.frames_left = self.total_frames
 
     def is_time_up(self):
-        return self.time_left <= 0
+        return self.frames_left <= 0
 
     def draw(self, surface):
-        font = pygame.font.SysFont(None, 36)
-        text = font.render(f"Time: {int(self.time_left)}", True, (255, 255, 255))
-        surface.blit(text, (10, 10)) 
\ No newline at end of file
+        text = text_cache.render(f"Time: {int(self.time_left)}", None, 36, (255, 255, 255))
+        surface.blit(text, (10, 10))
@@ -0,0 +1,129 @@
+"""Re-simulate submitted runs, headless, to check them.
+
+A run arrives either as the input log the game writes with F5 (one
+input byte per step) or as the Recorder's per-step (dx, dy) moves, one
+Replay per loop. An input log is simply stepped through Simulation.
+Moves say where the player went but not which keys did it, so
+validate_replays() searches for the inputs a step at a time: it tries
+the input held the step before first, then the others, keeps the first
+that moves the player exactly as recorded, and backs up to an earlier
+step's next choice if the run later stops matching. Either way the run
+is played under every rule the game plays it under (ghosts, buttons,
+doors, moving platforms, the loop timer), and the verdict says whether
+it ended in a win.
+"""
+from core.simulation import Simulation, FPS, MAX_LOOPS, PLAYING, WON, INPUT_LEFT, INPUT_RIGHT, INPUT_JUMP
+
+# Every input that moves the player differently; left and right together
+# cancel out, the same as neither
+INPUTS = (0, INPUT_RIGHT, INPUT_LEFT, INPUT_JUMP, INPUT_RIGHT | INPUT_JUMP, INPUT_LEFT | INPUT_JUMP)
+# The input held last step first: a player holds keys for many steps,
+# so the first try usually matches
+ORDERS = {value: (value,) + tuple(other for other in INPUTS if other != value) for value in INPUTS}
+# Steps the search may simulate per recorded move before giving up on a run
+SEARCH_BUDGET = 8
+
+
+def verdict(sim, valid, reason=None):
+    return {
+        'valid': valid,
+        'status': sim.status,
+        'loops': min(sim.loop_count + 1, sim.max_loops),
+        'frames': sim.frame,
+        'seconds': round(sim.frame / sim.fps, 3),
+        'reason': reason,
+    }
+
+
+def ending(sim, steps):
+    # The verdict for a run of `steps` steps that sim has played through
+    if sim.status == WON:
+        if sim.frame < steps:
+            return verdict(sim, False, 'the run continues after the win')
+        return verdict(sim, True)
+    if sim.status == PLAYING:
+        return verdict(sim, False, 'the run ends before the level does')
+    return verdict(sim, False, 'out of loops')
+
+
+def validate_inputs(level, log, fps=FPS, max_loops=MAX_LOOPS):
+    """Verdict for an InputLog (or any per-step inputs) recorded at fps."""
+    sim = Simulation(level, max_loops=max_loops, fps=fps)
+    sim.run(log)
+    return ending(sim, len(log))
+
+
+def last_move(sim):
+    # The step that ended a loop left its move in the replay just handed to the ghosts
+    deltas = sim.recorder.deltas or sim.ghost_replays[-1].deltas
+    return deltas[-2], deltas[-1]
+
+
+def find_inputs(sim, moves, budget=SEARCH_BUDGET):
+    """Step sim through inputs that make the player move exactly `moves`.
+
+    Returns (inputs, None), leaving sim after the last step, or (None,
+    step) with the furthest step any choice of inputs got to. If the
+    level ends with moves left, the inputs up to its end are returned
+    and sim is left there, for ending() to report.
+    """
+    inputs = []
+    choices = []  # per step taken: (snapshot before it, inputs not yet tried there)
+    before = sim.snapshot()
+    untried = list(ORDERS[0])
+    fresh = True  # sim is still at `before`
+    tries = budget * len(moves)
+    furthest = 0
+    while len(inputs) < len(moves):
+        if before.won or before.lost:
+            # Every input matched up to here, so any other choice ends
+            # the level on the same step; backing up cannot help
+            if not fresh:
+                sim.restore(before)
+            return inputs, None
+        move = moves[len(inputs)]
+        value = None
+        while untried and tries:
+            tries -= 1
+            candidate = untried.pop(0)
+            if not fresh:
+                sim.restore(before)
+            fresh = False
+            sim.step(candidate)
+            if last_move(sim) == move:
+                value = candidate
+                break
+        if value is None:
+            if not choices or not tries:
+                return None, furthest
+            before, untried = choices.pop()
+            inputs.pop()
+            fresh = False
+            continue
+        choices.append((before, untried))
+        inputs.append(value)
+        furthest = max(furthest, len(inputs))
+        before = sim.snapshot()
+        untried = list(ORDERS[value])
+        fresh = True
+    return inputs, None
+
+
+def validate_replays(level, replays, fps=FPS, max_loops=MAX_LOOPS):
+    """Verdict for a run given as one Replay per loop, recorded at fps."""
+    sim = Simulation(level, max_loops=max_loops, fps=fps)
+    loop_frames = sim.timer.total_frames
+    if not replays:
+        return verdict(sim, False, 'no loops')
+    if len(replays) > max_loops:
+        return verdict(sim, False, f'{len(replays)} loops, at most {max_loops} are played')
+    for k, replay in enumerate(replays, 1):
+        # Every loop but the last runs out the timer
+        if len(replay) > loop_frames or (k < len(replays) and len(replay) < loop_frames):
+            return verdict(sim, False, f'loop {k} is {len(replay)} steps, a loop is {loop_frames}')
+    moves = [move for replay in replays for move in replay]
+    inputs, furthest = find_inputs(sim, moves)
+    if inputs is None:
+        loop, step = divmod(furthest, loop_frames)
+        return verdict(sim, False, f'no input reproduces loop {loop + 1} step {step + 1}')
+    return ending(sim, len(moves))
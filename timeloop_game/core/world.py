@@ -0,0 +1,162 @@
+"""Levels wider than the screen, split into columns that stream in and out.
+
+A chunked level keeps no platform list. Its platforms are cut into
+CHUNK_WIDTH-wide columns (a platform crossing a column edge is listed in
+every column it touches) and a ChunkTable parses one column at a time,
+straight from the level pack. ChunkGrid is the SpatialGrid a Simulation
+collides against: each step it makes sure the columns around the player
+are loaded and evicts the least recently used ones once their estimated
+size is over a budget, so a world a hundred screens wide costs no more
+memory or time per step than a three-screen one.
+"""
+from collections import OrderedDict
+
+import pygame
+from core.spatial import GRID_CELL, SpatialGrid
+
+CHUNK_WIDTH = 800
+# Columns within this many pixels of the player, past the furthest one step
+# can move it (see Simulation.stream_margin), are kept loaded, so nothing
+# it could touch is ever missing at any rate
+STREAM_MARGIN = 64
+CHUNK_BUDGET = 64 * 1024
+# Estimated bytes per loaded platform: the Rect, its dict entries and a
+# few bucket slots
+PLATFORM_BYTES = 160
+
+
+class ChunkTable:
+    """The columns of one world and how to read each of them.
+
+    load(i) returns column i as a list of (platform id, Rect); ids are the
+    platform's position in the level file, so collisions resolve in the
+    same order however the columns were loaded.
+    """
+
+    def __init__(self, chunk_width, sizes, loader, platform_count):
+        self.chunk_width = chunk_width
+        self.sizes = list(sizes)
+        self.loader = loader
+        self.platform_count = platform_count
+
+    @classmethod
+    def split(cls, platforms, chunk_width, world_width):
+        count = max(1, -(-world_width // chunk_width))
+        chunks = [[] for _ in range(count)]
+        for platform_id, plat in enumerate(platforms):
+            for chunk in cls.columns(plat.left, plat.right, chunk_width, count):
+                chunks[chunk].append((platform_id, tuple(plat)))
+        return cls(chunk_width, [len(entries) for entries in chunks],
+                   lambda i: [(pid, pygame.Rect(rect)) for pid, rect in chunks[i]], len(platforms))
+
+    @staticmethod
+    def columns(left, right, chunk_width, count):
+        first = max(0, left // chunk_width)
+        last = min(count - 1, max(left, right - 1) // chunk_width)
+        return range(first, last + 1)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def load(self, chunk):
+        return self.loader(chunk)
+
+    def platforms(self, chunk):
+        return [rect for _, rect in self.loader(chunk)]
+
+
+class ChunkGrid(SpatialGrid):
+    """SpatialGrid over whichever columns of a world are loaded.
+
+    Platforms are keyed by their id in the level rather than by insertion
+    order, so query() still returns them in level order. A platform
+    listed in several loaded columns is bucketed once and reference
+    counted. Dynamic entries (moving platforms) get ids after every
+    static platform, as they do in a level's flat grid.
+    """
+
+    def __init__(self, table, budget=CHUNK_BUDGET, cell_size=GRID_CELL):
+        super().__init__(cell_size)
+        self.table = table
+        self.budget = budget
+        self.rects = {}
+        self.items = {}
+        self.next_id = table.platform_count
+        self.loaded = OrderedDict()  # column -> (ids, bytes), least recent first
+        self.refs = {}
+        self.bytes = 0
+        self.window = None
+        self.loads = 0
+        self.evictions = 0
+
+    def insert(self, rect, item=None):
+        entry_id = self.next_id
+        self.next_id += 1
+        self.rects[entry_id] = rect
+        self.items[entry_id] = rect if item is None else item
+        self._bucket(entry_id, self.span(rect))
+        return entry_id
+
+    def copy(self):
+        grid = ChunkGrid(self.table, self.budget, self.cell_size)
+        for chunk in self.loaded:
+            grid.load_chunk(chunk)
+        for key, (entry_id, _) in self.dynamic.items():
+            grid.add_dynamic(key, self.rects[entry_id], self.items[entry_id])
+        return grid
+
+    def stream(self, rect, margin=STREAM_MARGIN):
+        """Load the columns within margin of rect, then trim to the budget."""
+        window = ChunkTable.columns(rect.left - margin, rect.right + margin,
+                                    self.table.chunk_width, len(self.table))
+        if window == self.window:
+            return
+        self.window = window
+        loaded = self.loaded
+        for chunk in window:
+            if chunk in loaded:
+                loaded.move_to_end(chunk)
+            else:
+                self.load_chunk(chunk)
+        if self.budget is not None:
+            for chunk in list(loaded):
+                if self.bytes <= self.budget:
+                    break
+                if chunk not in window:
+                    self.unload_chunk(chunk)
+
+    def load_all(self):
+        # For tools that place the player anywhere (the solver)
+        self.budget = None
+        for chunk in range(len(self.table)):
+            if chunk not in self.loaded:
+                self.load_chunk(chunk)
+
+    def load_chunk(self, chunk):
+        ids = []
+        refs = self.refs
+        for platform_id, rect in self.table.load(chunk):
+            ids.append(platform_id)
+            if platform_id in refs:
+                refs[platform_id] += 1
+                continue
+            refs[platform_id] = 1
+            self.rects[platform_id] = rect
+            self.items[platform_id] = rect
+            self._bucket(platform_id, self.span(rect))
+        size = len(ids) * PLATFORM_BYTES
+        self.loaded[chunk] = (ids, size)
+        self.bytes += size
+        self.loads += 1
+
+    def unload_chunk(self, chunk):
+        ids, size = self.loaded.pop(chunk)
+        refs = self.refs
+        for platform_id in ids:
+            refs[platform_id] -= 1
+            if not refs[platform_id]:
+                del refs[platform_id]
+                self._bucket(platform_id, self.span(self.rects.pop(platform_id)), add=False)
+                del self.items[platform_id]
+        self.bytes -= size
+        self.evictions += 1
@@ -1,12 +1,43 @@
+import time
+STARTED = time.perf_counter()
+import os
+import sys
 import pygame
 from core.game import Game
+from core.simulation import FPS, MAX_RATE
+
+def sim_rate():
+    # TIMELOOP_HZ, if it is a whole number of steps a second we can run
+    value = os.environ.get('TIMELOOP_HZ')
+    if value is None:
+        return FPS
+    try:
+        rate = int(value)
+    except ValueError:
+        rate = 0
+    if not 1 <= rate <= MAX_RATE:
+        print(f'TIMELOOP_HZ={value!r} is not a whole number from 1 to {MAX_RATE}; running at {FPS}',
+              file=sys.stderr)
+        return FPS
+    return rate
 
 def main():
-    pygame.init()
-    screen = pygame.display.set_mode((800, 600))
+    # Only the display up front; fonts and the mixer start on first use
+    pygame.display.init()
+    # TIMELOOP_SIZE=1280x720 opens a larger window; wide levels scroll
+    # with the camera and one-screen levels are centred
+    size = os.environ.get('TIMELOOP_SIZE', '800x600')
+    screen = pygame.display.set_mode(tuple(int(v) for v in size.lower().split('x')))
     pygame.display.set_caption("TimeLoop: Echoes of the Past")
     clock = pygame.time.Clock()
-    game = Game(screen, clock)
+    # Low-power displays: TIMELOOP_DIRTY=1 pushes only changed regions and
+    # lets the menu sleep; TIMELOOP_PARALLAX=0 holds the backgrounds still,
+    # without which every gameplay frame is still a full flip. TIMELOOP_HZ=30
+    # halves the simulation steps on weak hardware; levels play the same
+    game = Game(screen, clock, started=STARTED,
+                dirty_rects=os.environ.get('TIMELOOP_DIRTY') == '1',
+                parallax=os.environ.get('TIMELOOP_PARALLAX') != '0',
+                sim_rate=sim_rate())
     game.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+"""Rasterize the game's SVGs into the content-hashed PNG cache.
+
+Run from the repository root:
+
+    python3 timeloop_game/prebake.py            # everything the game uses
+    python3 timeloop_game/prebake.py --all      # every SVG at native size too
+
+Outputs go to assets/.cache/raster-v<N>/<sha256>_<size>.png plus a
+manifest.json that the AssetManager reads at startup. The sprite atlas
+(utils/atlas.py) is rebuilt from the fresh rasters at the end.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.assets import (ASSET_DIR, CACHE_DIR, CACHE_VERSION, MANIFEST_FILE,
+                          cache_key, referenced_assets)
+
+
+def file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def output_name(digest, size):
+    if size is None:
+        return f'{digest[:24]}_native.png'
+    return f'{digest[:24]}_{size[0]}x{size[1]}.png'
+
+
+def rasterize(job):
+    svg_path, out_path, size = job
+    import cairosvg
+    tmp_path = f'{out_path}.{os.getpid()}.tmp'
+    kwargs = {}
+    if size is not None:
+        kwargs = {'output_width': size[0], 'output_height': size[1]}
+    cairosvg.svg2png(url=svg_path, write_to=tmp_path, **kwargs)
+    # Atomic so a concurrent reader never sees a half-written PNG
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def collect_specs(include_all=False):
+    specs = list(referenced_assets())
+    if include_all:
+        seen = set(specs)
+        for svg in sorted(glob.glob(os.path.join(ASSET_DIR, '**', '*.svg'), recursive=True)):
+            name = os.path.splitext(os.path.relpath(svg, ASSET_DIR))[0].replace(os.sep, '/')
+            if (name, None) not in seen:
+                specs.append((name, None))
+    return specs
+
+
+def prebake(specs, workers=None, force=False):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    entries = {}
+    jobs = []
+    queued = set()
+    for name, size in specs:
+        svg_path = os.path.join(ASSET_DIR, f'{name}.svg')
+        if not os.path.exists(svg_path):
+            print(f'missing: {svg_path}', file=sys.stderr)
+            continue
+        digest = file_hash(svg_path)
+        out = output_name(digest, size)
+        entries[cache_key(name, size)] = {
+            'file': out,
+            'source': f'{name}.svg',
+            'sha256': digest,
+            'size': list(size) if size else None,
+        }
+        out_path = os.path.join(CACHE_DIR, out)
+        # Identical SVGs at the same size share one output file
+        if out_path not in queued and (force or not os.path.exists(out_path)):
+            queued.add(out_path)
+            jobs.append((svg_path, out_path, size))
+    if jobs:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(rasterize, jobs, chunksize=8):
+                pass
+    manifest_path = os.path.join(CACHE_DIR, MANIFEST_FILE)
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'entries': entries}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return len(entries), len(jobs)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Pre-bake SVG assets into the raster cache.')
+    parser.add_argument('--all', action='store_true', help='also bake every SVG under assets/ at native size')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='re-rasterize even if the cached PNG exists')
+    parser.add_argument('--no-atlas', action='store_true', help='do not rebuild the sprite atlas')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    total, baked = prebake(collect_specs(args.all), args.workers, args.force)
+    print(f'{total} entries in manifest, {baked} rasterized in {time.perf_counter() - start:.2f}s -> {CACHE_DIR}')
+    if not args.no_atlas:
+        from utils.atlas import build_atlas
+        sprites, pages = build_atlas()
+        print(f'{sprites} sprites packed into {pages} atlas page(s)')
+
+
+if __name__ == '__main__':
+    main()
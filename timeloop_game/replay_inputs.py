@@ -0,0 +1,42 @@
+"""Re-simulate a recorded input log headlessly.
+
+Run from the repository root:
+
+    python3 timeloop_game/replay_inputs.py 3 timeloop_level_3_20250101_120000.inputs
+
+Logs are written in game with F5. The run is stepped through Simulation
+as fast as possible and reproduces the recorded game exactly.
+"""
+import argparse
+import sys
+import time
+
+from core.level_pack import LevelPack
+from core.simulation import Simulation, FPS, MAX_LOOPS, MAX_RATE
+from utils.recorder import InputLog
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay an input log through the simulation.')
+    parser.add_argument('level', type=int, help='level number the log was recorded on')
+    parser.add_argument('path', help='.inputs file written with F5')
+    parser.add_argument('--max-loops', type=int, default=MAX_LOOPS)
+    parser.add_argument('--rate', type=int, default=FPS,
+                        help='simulation rate the log was recorded at (TIMELOOP_HZ), one input per step')
+    args = parser.parse_args(argv)
+    if not 1 <= args.rate <= MAX_RATE:
+        parser.error(f'--rate must be from 1 to {MAX_RATE}')
+
+    log = InputLog.load(args.path)
+    sim = Simulation(LevelPack.load_default().get(args.level), max_loops=args.max_loops, fps=args.rate)
+    start = time.perf_counter()
+    status = sim.run(log)
+    seconds = time.perf_counter() - start
+    print(f'level {args.level}: {status} after {sim.frame} frames, loop {sim.loop_count + 1}')
+    print(f'{len(log)} frames of input replayed in {seconds * 1000:.1f} ms '
+          f'({sim.frame / args.rate / max(seconds, 1e-9):.0f}x real time)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
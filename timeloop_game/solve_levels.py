@@ -0,0 +1,89 @@
+"""Prove every level can be won within max_loops, in parallel.
+
+Run from the repository root:
+
+    python3 timeloop_game/solve_levels.py                 # all levels
+    python3 timeloop_game/solve_levels.py 3 7 --out report.json --replays runs/
+
+Each level is searched headlessly on its own worker process. The report
+lists the fewest loops needed and the winning inputs; --replays also
+writes each loop's Recorder data as level_<N>_loop_<K>.replay.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from core.level_pack import LevelPack
+from core.simulation import Simulation, MAX_LOOPS
+from core.solver import solve_level, BEAM_WIDTH, ACTION_REPEAT
+
+
+def encode_runs(inputs):
+    # [[count, inputs], ...] keeps a 1200-frame loop to a few dozen pairs
+    runs = []
+    for value in inputs:
+        if runs and runs[-1][1] == value:
+            runs[-1][0] += 1
+        else:
+            runs.append([1, value])
+    return runs
+
+
+def solve_one(args):
+    number, max_loops, beam_width, repeat = args
+    level = LevelPack.load_default().get(number)
+    start = time.perf_counter()
+    result = solve_level(level, max_loops=max_loops, beam_width=beam_width, repeat=repeat)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    result['level'] = number
+    return result
+
+
+def write_replays(result, directory, max_loops):
+    level = LevelPack.load_default().get(result['level'])
+    sim = Simulation(level, max_loops=max_loops)
+    sim.run(value for run in result['inputs'] for value in run)
+    replays = sim.ghost_replays + [sim.recorder.get_moves()]
+    os.makedirs(directory, exist_ok=True)
+    for k, replay in enumerate(replays, 1):
+        replay.save(os.path.join(directory, f'level_{result["level"]}_loop_{k}.replay'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Search for a winning run of each level.')
+    parser.add_argument('levels', nargs='*', type=int, help='level numbers (default: all)')
+    parser.add_argument('--max-loops', type=int, default=MAX_LOOPS)
+    parser.add_argument('--beam', type=int, default=BEAM_WIDTH, help='beam width per layer (0 = plain BFS)')
+    parser.add_argument('--repeat', type=int, default=ACTION_REPEAT, help='frames each searched input is held')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--out', help='write the JSON report here')
+    parser.add_argument('--replays', help='directory for the winning runs as .replay files')
+    args = parser.parse_args(argv)
+
+    numbers = args.levels or LevelPack.load_default().numbers()
+    jobs = [(n, args.max_loops, args.beam or None, args.repeat) for n in numbers]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(solve_one, jobs))
+    failed = 0
+    for result in results:
+        if result['solved']:
+            print(f'level {result["level"]:>3}: {result["loops"]} loop(s), {result["frames"]} frames, {result["seconds"]:.2f}s')
+            if args.replays:
+                write_replays(result, args.replays, args.max_loops)
+        else:
+            failed += 1
+            print(f'level {result["level"]:>3}: NOT SOLVED within {args.max_loops} loops, {result["seconds"]:.2f}s')
+        result['inputs'] = [encode_runs(run) for run in result['inputs']]
+    print(f'{len(results) - failed}/{len(results)} levels solved in {time.perf_counter() - start:.2f}s')
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'max_loops': args.max_loops, 'levels': results}, f, indent=1)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from utils.profiler import profiler
+
+ASSET_DIR = 'timeloop_game/assets'
+CHARACTER_SIZE = (40, 60)
+CHARACTER_COLORS = ('green', 'beige', 'pink', 'purple', 'yellow')
+CHARACTER_FRAMES = ('idle', 'walk_a', 'walk_b', 'jump')
+
+# Bump when the rasterizer settings change so stale caches are ignored
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(ASSET_DIR, '.cache', f'raster-v{CACHE_VERSION}')
+MANIFEST_FILE = 'manifest.json'
+# Written by utils/atlas.py next to the manifest
+ATLAS_FILE = 'atlas.json'
+ATLAS_VERSION = 2
+LOADER_THREADS = 2
+
+
+def cache_key(name, size):
+    if size is None:
+        return f'{name}@native'
+    return f'{name}@{size[0]}x{size[1]}'
+
+
+def referenced_assets():
+    """Every (name, size) the game asks the asset manager for."""
+    specs = [
+        ('Backgrounds/background_color_hills', (800, 600)),
+        ('Backgrounds/background_color_trees', (800, 600)),
+        ('Tiles/block_plank', (40, 20)),
+    ]
+    for color in CHARACTER_COLORS:
+        for frame in CHARACTER_FRAMES:
+            specs.append((f'Characters/character_{color}_{frame}', CHARACTER_SIZE))
+    return specs
+
+
+def load_manifest(cache_dir=CACHE_DIR):
+    import json
+    path = os.path.join(cache_dir, MANIFEST_FILE)
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get('version') != CACHE_VERSION:
+        return {}
+    return data.get('entries', {})
+
+
+def load_atlas(cache_dir=CACHE_DIR):
+    """({cache key: (page, rect, source)}, [page paths]) from the atlas
+    index; both empty when there is none or one of its pages is missing.
+    source is AssetManager.source() of the sprite when it was packed."""
+    import json
+    path = os.path.join(cache_dir, ATLAS_FILE)
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}, []
+    if data.get('version') != ATLAS_VERSION:
+        return {}, []
+    pages = [os.path.join(cache_dir, name) for name in data.get('pages', [])]
+    if not all(os.path.exists(page) for page in pages):
+        return {}, []
+    sprites = {key: (entry[0], tuple(entry[1:5]), entry[5]) for key, entry in data.get('sprites', {}).items()}
+    return sprites, pages
+
+
+class AssetManager:
+    """Process-wide cache of converted Surfaces keyed by (name, size).
+
+    Names are relative to the assets folder without extension, e.g.
+    'Characters/character_green_idle'. Every caller gets the same Surface
+    object back, so nothing here may be drawn onto.
+
+    Rasters come from the pre-baked cache (see prebake.py); a PNG shipped
+    next to the SVG is used as a fallback. SVGs are never rasterized here.
+    Sprites packed into the atlas (see utils/atlas.py) are subsurfaces of
+    its converted pages instead, so loading them reads one page file and
+    they share its pixels.
+
+    Files are read and decoded on a small thread pool: prefetch() queues
+    them, get() never waits and returns None until a Surface is ready,
+    load() waits for it. Only convert_alpha(), which needs the display,
+    runs on the main thread, in pump() or when a Surface is first asked for.
+    """
+
+    def __init__(self, asset_dir=ASSET_DIR, cache_dir=CACHE_DIR):
+        self.asset_dir = asset_dir
+        self.cache_dir = cache_dir
+        self.manifest = None
+        self.atlas = None
+        self.atlas_pages = []
+        self.manifest_lock = threading.Lock()
+        self.pool = None
+        self.pending = {}
+        self.surfaces = {}
+        self.alpha_surfaces = {}
+        self.character_sets = {}
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the loader threads; returns its Future."""
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(LOADER_THREADS, thread_name_prefix='assets')
+        return self.pool.submit(fn, *args)
+
+    def prefetch(self, specs=None):
+        """Start decoding every (name, size) in specs (default: all the
+        game uses) in the background."""
+        for key in referenced_assets() if specs is None else specs:
+            if key in self.surfaces:
+                continue
+            job, fn, args = self._job(key)
+            if job not in self.surfaces and job not in self.pending:
+                self.pending[job] = self.submit(fn, *args)
+
+    def get(self, name, size=None):
+        """The Surface if it is ready, else None; queues it if need be."""
+        key = (name, size)
+        if key in self.surfaces:
+            return self.surfaces[key]
+        job = self._job(key)[0]
+        if job not in self.surfaces:
+            future = self.pending.get(job)
+            if future is None:
+                self.prefetch([key])
+                return None
+            if not future.done():
+                return None
+            self._finish(job)
+        return self._sprite(key)
+
+    def ready(self, name, size=None):
+        key = (name, size)
+        return key in self.surfaces or self._job(key)[0] in self.surfaces
+
+    def load(self, name, size=None):
+        key = (name, size)
+        if key not in self.surfaces:
+            job, fn, args = self._job(key)
+            if job in self.pending:
+                self._finish(job)
+            elif job not in self.surfaces:
+                self.surfaces[job] = self._convert(fn(*args))
+        return self._sprite(key)
+
+    def pump(self):
+        """Convert whatever finished decoding; returns how many are still loading."""
+        for key in [key for key, future in self.pending.items() if future.done()]:
+            self._finish(key)
+        return len(self.pending)
+
+    def wait(self):
+        """Block until everything queued so far is loaded."""
+        for key in list(self.pending):
+            self._finish(key)
+
+    def load_alpha(self, name, size, alpha):
+        key = (name, size, alpha)
+        if key not in self.alpha_surfaces:
+            base = self.load(name, size)
+            img = None
+            if base:
+                # A subsurface carries its own alpha but shares base's pixels
+                img = base.subsurface(base.get_rect())
+                img.set_alpha(alpha)
+            self.alpha_surfaces[key] = img
+        return self.alpha_surfaces[key]
+
+    def alpha_ladder(self, name, size, alphas):
+        # One pre-baked Surface per alpha; None if the sprite is missing
+        if self.load(name, size) is None:
+            return None
+        return tuple(self.load_alpha(name, size, alpha) for alpha in alphas)
+
+    def character_sprites(self, color, size=CHARACTER_SIZE):
+        key = (color, size)
+        if key not in self.character_sets:
+            def get(frame):
+                return self.load(f'Characters/character_{color}_{frame}', size)
+            self.character_sets[key] = {
+                'idle': get('idle'),
+                'walk': [get('walk_a'), get('walk_b')],
+                'jump': get('jump'),
+            }
+        return self.character_sets[key]
+
+    def clear(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.manifest = None
+        self.atlas = None
+        self.atlas_pages = []
+        self.surfaces.clear()
+        self.alpha_surfaces.clear()
+        self.character_sets.clear()
+
+    def read_indexes(self):
+        # The manifest and the atlas index, read once on first use
+        with self.manifest_lock:
+            if self.manifest is None:
+                self.manifest = load_manifest(self.cache_dir)
+                self.atlas, self.atlas_pages = load_atlas(self.cache_dir)
+
+    def _job(self, key):
+        # What has to be read for key: the atlas page holding it, or its
+        # own file when it is not packed or was packed from other pixels
+        self.read_indexes()
+        entry = self.atlas.get(cache_key(*key))
+        if entry is not None and entry[2] == self.source(*key):
+            return ('atlas', entry[0]), self._decode_page, (entry[0],)
+        return key, self._decode, key
+
+    def _sprite(self, key):
+        # Once its page is loaded, an atlas sprite is cut out of it
+        if key not in self.surfaces:
+            page, rect, _ = self.atlas[cache_key(*key)]
+            surface = self.surfaces[('atlas', page)]
+            self.surfaces[key] = surface.subsurface(rect) if surface else None
+        return self.surfaces[key]
+
+    def resolve(self, name, size):
+        self.read_indexes()
+        entry = self.manifest.get(cache_key(name, size))
+        if entry:
+            path = os.path.join(self.cache_dir, entry['file'])
+            if os.path.exists(path):
+                return path
+        png_path = os.path.join(self.asset_dir, f'{name}.png')
+        if os.path.exists(png_path):
+            return png_path
+        return None
+
+    def source(self, name, size):
+        """What resolve() would read for (name, size), as a stamp: the SVG
+        hash of its baked raster, or the size and mtime of the PNG; None
+        when there is neither."""
+        self.read_indexes()
+        entry = self.manifest.get(cache_key(name, size))
+        if entry and os.path.exists(os.path.join(self.cache_dir, entry['file'])):
+            return entry['sha256']
+        try:
+            stat = os.stat(os.path.join(self.asset_dir, f'{name}.png'))
+        except OSError:
+            return None
+        return f'png:{stat.st_size}:{stat.st_mtime_ns}'
+
+    def _decode(self, name, size):
+        # Safe off the main thread: no display access before _convert
+        path = self.resolve(name, size)
+        if path is None:
+            return None
+        img = pygame.image.load(path)
+        if size and img.get_size() != tuple(size):
+            img = pygame.transform.scale(img, size)
+        return img
+
+    def _decode_page(self, page):
+        try:
+            return pygame.image.load(self.atlas_pages[page])
+        except (pygame.error, OSError):
+            return None
+
+    def _convert(self, img):
+        if img is None:
+            return None
+        profiler.count('surface_alloc')
+        return img.convert_alpha()
+
+    def _finish(self, key):
+        future = self.pending.pop(key)
+        self.surfaces[key] = self._convert(future.result())
+        return self.surfaces[key]
+
+
+assets = AssetManager()
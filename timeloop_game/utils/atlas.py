@@ -0,0 +1,94 @@
+"""Sprite atlas: the game's small sprites packed into a few large pages.
+
+build_atlas() is run by prebake.py (and build_atlas.py on its own). It
+decodes every referenced sprite no larger than MAX_SPRITE, scaled to
+the size the game asks for, shelf-packs them into PAGE_SIZE pages and
+writes the pages as atlas_<n>.png plus an ATLAS_FILE index next to the
+raster cache's manifest. The AssetManager then opens one index and a
+page or two at startup instead of a file per sprite, and hands out
+subsurfaces of the converted pages. Each sprite's entry keeps the
+AssetManager.source() it was packed from; one whose source has changed
+since (a re-baked SVG, an edited PNG) is loaded from its own file.
+"""
+import os
+
+import pygame
+from utils.assets import ATLAS_FILE, ATLAS_VERSION, CACHE_DIR, AssetManager, cache_key, referenced_assets
+
+PAGE_SIZE = (1024, 1024)
+# Empty pixels around each sprite, so nothing bleeds in if a page is ever filtered
+PADDING = 1
+# Backgrounds and anything else this big keep their own Surface
+MAX_SPRITE = 256
+
+
+def atlas_specs(specs=None):
+    return [(name, size) for name, size in (referenced_assets() if specs is None else specs)
+            if size is not None and max(size) <= MAX_SPRITE]
+
+
+def pack(sizes, page_size=PAGE_SIZE, padding=PADDING):
+    """Shelf-pack (w, h) sizes, tallest first.
+
+    Returns one (page, x, y) per size in input order, or raises
+    ValueError for a size that cannot fit on an empty page.
+    """
+    page_w, page_h = page_size
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    places = [None] * len(sizes)
+    page = x = y = shelf = 0
+    for i in order:
+        w, h = sizes[i][0] + 2 * padding, sizes[i][1] + 2 * padding
+        if w > page_w or h > page_h:
+            raise ValueError(f'sprite of size {sizes[i]} does not fit on a {page_w}x{page_h} page')
+        if x + w > page_w:
+            x, y, shelf = 0, y + shelf, 0
+        if y + h > page_h:
+            page, x, y, shelf = page + 1, 0, 0, 0
+        places[i] = (page, x + padding, y + padding)
+        x += w
+        shelf = max(shelf, h)
+    return places
+
+
+def build_atlas(specs=None, cache_dir=CACHE_DIR, page_size=PAGE_SIZE):
+    """Write the atlas pages and index; returns (sprites, pages).
+
+    Sprites come from wherever the AssetManager would load them (the
+    baked raster cache, else a PNG next to the SVG); ones that cannot be
+    found are left out and keep falling back at runtime.
+    """
+    import json
+    manager = AssetManager(cache_dir=cache_dir)
+    images = []
+    for name, size in atlas_specs(specs):
+        img = manager._decode(name, size)
+        if img is not None:
+            images.append((cache_key(name, size), img, manager.source(name, size)))
+    places = pack([img.get_size() for _, img, _ in images], page_size)
+    # Each page is cropped to what its sprites use
+    extents = {}
+    for (_, img, _), (page, x, y) in zip(images, places):
+        w, h = extents.get(page, (0, 0))
+        extents[page] = (max(w, x + img.get_width() + PADDING), max(h, y + img.get_height() + PADDING))
+    pages = [pygame.Surface(extents[page], pygame.SRCALPHA) for page in sorted(extents)]
+    for page in pages:
+        page.fill((0, 0, 0, 0))
+    sprites = {}
+    for (key, img, source), (page, x, y) in zip(images, places):
+        # Onto a transparent page a blit copies the pixels exactly
+        pages[page].blit(img, (x, y))
+        sprites[key] = [page, x, y, img.get_width(), img.get_height(), source]
+    os.makedirs(cache_dir, exist_ok=True)
+    files = []
+    for i, page in enumerate(pages):
+        files.append(f'atlas_{i}.png')
+        tmp_path = os.path.join(cache_dir, f'atlas_{i}.tmp.png')
+        pygame.image.save(page, tmp_path)
+        os.replace(tmp_path, os.path.join(cache_dir, files[-1]))
+    index_path = os.path.join(cache_dir, ATLAS_FILE)
+    tmp_path = f'{index_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': ATLAS_VERSION, 'pages': files, 'sprites': sprites}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, index_path)
+    return len(sprites), len(pages)
@@ -0,0 +1,72 @@
+import pygame
+from utils.assets import assets
+from utils.profiler import profiler
+
+SOUND_DIR = 'timeloop_game/assets/sounds'
+SOUNDS = ('win', 'lose', 'button')
+CHANNELS = 8
+
+
+class AudioDispatcher:
+    """Sound effects played on a fixed pool of mixer channels.
+
+    The mixer is initialised and the WAVs decoded on the asset loader
+    threads the first time start() or play() is called. Until that is done
+    play() drops the sound instead of waiting, and with every channel busy
+    it takes over the one that started longest ago, so a call costs the
+    frame no more than a channel lookup. Without an audio device the game
+    simply stays silent.
+    """
+
+    def __init__(self, names=SOUNDS, channels=CHANNELS):
+        self.names = names
+        self.channel_count = channels
+        self.loading = None
+        self.sounds = None
+        self.channels = ()
+        self.started = []
+        self.plays = 0
+
+    def start(self):
+        if self.loading is None:
+            self.loading = assets.submit(self._load)
+
+    def _load(self):
+        try:
+            if not pygame.mixer.get_init():
+                pygame.mixer.init()
+            pygame.mixer.set_num_channels(self.channel_count)
+            return {name: pygame.mixer.Sound(f'{SOUND_DIR}/{name}.wav') for name in self.names}
+        except (pygame.error, OSError):
+            return {}
+
+    def ready(self):
+        if self.sounds is None:
+            self.start()
+            if not self.loading.done():
+                return False
+            self.sounds = self.loading.result()
+            if self.sounds:
+                self.channels = [pygame.mixer.Channel(i) for i in range(self.channel_count)]
+                self.started = [0] * self.channel_count
+        return True
+
+    def play(self, name):
+        if not self.ready():
+            profiler.count('sounds_dropped')
+            return
+        sound = self.sounds.get(name)
+        if sound is None:
+            return
+        for i, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                break
+        else:
+            i = self.started.index(min(self.started))
+        self.plays += 1
+        self.started[i] = self.plays
+        self.channels[i].play(sound)
+        profiler.count('sounds')
+
+
+audio = AudioDispatcher()
@@ -0,0 +1,53 @@
+import pygame
+from utils.profiler import profiler
+
+# Past this share of the screen one flip is cheaper than many small updates
+FULL_RATIO = 0.5
+
+
+class DirtyRects:
+    """Screen regions that changed this frame, for display.update().
+
+    Disabled, present() is a plain display.flip(). Enabled, whatever is
+    drawn is add()ed; repaint() lists the regions to restore before
+    drawing (this frame's rects plus last frame's, so things that moved
+    leave no trace) and present() pushes only those to the display. A
+    frame marked full(), or one whose rects cover more than full_ratio
+    of the screen, falls back to a flip.
+    """
+
+    def __init__(self, size=(800, 600), enabled=False, full_ratio=FULL_RATIO):
+        self.enabled = enabled
+        self.limit = size[0] * size[1] * full_ratio
+        self.rects = []
+        self.previous = []
+        self.whole = True
+
+    def add(self, rect):
+        self.rects.append(pygame.Rect(rect))
+
+    def extend(self, rects):
+        self.rects.extend(rects)
+
+    def full(self):
+        self.whole = True
+
+    def partial(self):
+        return self.enabled and not self.whole
+
+    def repaint(self):
+        # Most things that did not move cover the same rect both frames
+        rects = self.rects
+        return rects + [rect for rect in self.previous if rect not in rects]
+
+    def present(self):
+        rects = self.repaint()
+        if not self.partial() or sum(r.w * r.h for r in rects) > self.limit:
+            pygame.display.flip()
+            profiler.count('flips')
+        elif rects:
+            pygame.display.update(rects)
+            profiler.count('dirty_rects', len(rects))
+        self.previous = self.rects
+        self.rects = []
+        self.whole = False
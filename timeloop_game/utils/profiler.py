@@ -0,0 +1,186 @@
+import os
+import time
+from collections import deque
+
+import pygame
+
+HISTORY_FRAMES = 600
+GRAPH_FRAMES = 120
+GRAPH_RECT = (540, 440, 250, 150)
+BUDGET_MS = 1000.0 / 60
+
+
+class NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = NullSection()
+
+
+class Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.record(self.name, self.start, end)
+        return False
+
+
+class FrameProfiler:
+    """Per-frame timing sections and counters for the main loop.
+
+    Disabled, section() hands back one shared no-op context manager and
+    count() returns immediately, so the hooks can stay in shipped code.
+    Enable with TIMELOOP_PROFILE=1 or F3 in game; F4 exports the recorded
+    frames as CSV and Chrome trace JSON (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, enabled=False, history=HISTORY_FRAMES):
+        self.enabled = enabled
+        self.overlay = enabled
+        self.sections = {}
+        self.frames = deque(maxlen=history)
+        self.frame_start = None
+        self.current = {}
+        self.counters = {}
+        self.events = []
+        # One-off measurements (ms) shown in the overlay, e.g. the first frame
+        self.notes = {}
+        self.epoch = time.perf_counter()
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(self, name)
+        return section
+
+    def count(self, name, amount=1):
+        if self.enabled and self.frame_start is not None:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def note(self, name, ms):
+        self.notes[name] = ms
+
+    def record(self, name, start, end):
+        if self.frame_start is None:
+            return
+        self.current[name] = self.current.get(name, 0.0) + (end - start)
+        self.events.append((name, start, end))
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.overlay = self.enabled
+        self.frame_start = None
+
+    def begin_frame(self):
+        if self.enabled:
+            self.frame_start = time.perf_counter()
+            self.current = {}
+            self.counters = {}
+            self.events = []
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+        end = time.perf_counter()
+        self.frames.append({
+            'start': self.frame_start,
+            'total': end - self.frame_start,
+            'sections': self.current,
+            'counters': self.counters,
+            'events': self.events,
+        })
+        self.frame_start = None
+
+    def frame_times_ms(self):
+        return [frame['total'] * 1000 for frame in self.frames]
+
+    def percentile(self, pct):
+        times = sorted(self.frame_times_ms())
+        if not times:
+            return 0.0
+        index = min(len(times) - 1, int(round(pct / 100 * (len(times) - 1))))
+        return times[index]
+
+    def draw_overlay(self, surface, text_cache):
+        # Returns the area drawn over, or None
+        if not (self.enabled and self.overlay and self.frames):
+            return None
+        x, y, w, h = GRAPH_RECT
+        pygame.draw.rect(surface, (0, 0, 0), (x, y, w, h))
+        pygame.draw.rect(surface, (255, 255, 255), (x, y, w, h), 1)
+        scale = h / (BUDGET_MS * 2)
+        budget_y = y + h - int(BUDGET_MS * scale)
+        pygame.draw.line(surface, (255, 80, 80), (x, budget_y), (x + w - 1, budget_y))
+        times = self.frame_times_ms()[-GRAPH_FRAMES:]
+        bar = w / GRAPH_FRAMES
+        for i, ms in enumerate(times):
+            bar_h = min(h - 1, int(ms * scale))
+            color = (0, 220, 100) if ms <= BUDGET_MS else (255, 200, 0)
+            pygame.draw.line(surface, color, (x + int(i * bar), y + h - 1), (x + int(i * bar), y + h - 1 - bar_h))
+        last = self.frames[-1]
+        lines = [f'p50 {self.percentile(50):.2f} ms  p99 {self.percentile(99):.2f} ms']
+        top = sorted(last['sections'].items(), key=lambda item: -item[1])[:4]
+        lines += [f'{name} {seconds * 1000:.2f} ms' for name, seconds in top]
+        lines.append(' '.join(f'{name} {value}' for name, value in sorted(last['counters'].items())))
+        if self.notes:
+            lines.append(' '.join(f'{name} {ms:.1f} ms' for name, ms in sorted(self.notes.items())))
+        area = pygame.Rect(GRAPH_RECT)
+        for i, line in enumerate(lines):
+            area.union_ip(surface.blit(text_cache.render(line, None, 18, (255, 255, 255)), (x + 4, y + 4 + i * 14)))
+        return area
+
+    def export_csv(self, path):
+        import csv
+        names = sorted({name for frame in self.frames for name in frame['sections']})
+        counters = sorted({name for frame in self.frames for name in frame['counters']})
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame', 'total_ms'] + [f'{n}_ms' for n in names] + counters)
+            for i, frame in enumerate(self.frames):
+                writer.writerow([i, f'{frame["total"] * 1000:.4f}']
+                                + [f'{frame["sections"].get(n, 0.0) * 1000:.4f}' for n in names]
+                                + [frame['counters'].get(n, 0) for n in counters])
+
+    def export_chrome_trace(self, path):
+        import json
+
+        def us(t):
+            return round((t - self.epoch) * 1e6, 3)
+        events = []
+        for i, frame in enumerate(self.frames):
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': us(frame['start']),
+                           'dur': round(frame['total'] * 1e6, 3), 'args': dict(frame['counters'], frame=i)})
+            for name, start, end in frame['events']:
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1, 'ts': us(start),
+                               'dur': round((end - start) * 1e6, 3)})
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+    def export(self, prefix='timeloop_profile'):
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        csv_path = f'{prefix}_{stamp}.csv'
+        trace_path = f'{prefix}_{stamp}.json'
+        self.export_csv(csv_path)
+        self.export_chrome_trace(trace_path)
+        return csv_path, trace_path
+
+
+profiler = FrameProfiler(enabled=os.environ.get('TIMELOOP_PROFILE') == '1')
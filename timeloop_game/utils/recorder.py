@@ -1,17 +1,213 @@
+import struct
+import sys
+from array import array
+import numpy as np
+
+REPLAY_MAGIC = b'TLRP'
+REPLAY_VERSION = 1
+REPLAY_HEADER = struct.Struct('<4sBBxxI')  # magic, version, flags, frame count
+FLAG_RLE = 1
+MAX_RUN = 0xFFFF
+
+INPUT_MAGIC = b'TLIN'
+INPUT_VERSION = 1
+INPUT_HEADER = struct.Struct('<4sBxxxI')  # magic, version, frame count
+
+
+def _to_le(arr):
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _from_le(typecode, data):
+    arr = array(typecode)
+    arr.frombytes(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+class Replay:
+    """Per-frame (dx, dy) deltas stored as interleaved int16 pairs.
+
+    Holds a reference to the recorder's buffer rather than a copy, so
+    spawning ghosts from it is free.
+    """
+
+    def __init__(self, deltas=None):
+        self.deltas = deltas if deltas is not None else array('h')
+
+    def __len__(self):
+        return len(self.deltas) // 2
+
+    def __getitem__(self, index):
+        i = index * 2
+        return self.deltas[i], self.deltas[i + 1]
+
+    def __iter__(self):
+        it = iter(self.deltas)
+        return zip(it, it)
+
+    def view(self):
+        return memoryview(self.deltas)
+
+    def as_numpy(self):
+        # (frames, 2) int16 view over the same memory
+        return np.frombuffer(self.deltas, dtype=np.int16).reshape(-1, 2)
+
+    def runs(self):
+        runs = []
+        last = None
+        for move in self:
+            if move == last and runs[-1][0] < MAX_RUN:
+                runs[-1][0] += 1
+            else:
+                runs.append([1, move[0], move[1]])
+                last = move
+        return runs
+
+    def to_bytes(self, rle=True):
+        frames = len(self)
+        if not rle:
+            return REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, 0, frames) + _to_le(self.deltas)
+        runs = self.runs()
+        counts = array('H', (run[0] for run in runs))
+        values = array('h')
+        for _, dx, dy in runs:
+            values.append(dx)
+            values.append(dy)
+        return (REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, FLAG_RLE, frames)
+                + struct.pack('<I', len(runs)) + _to_le(counts) + _to_le(values))
+
+    @staticmethod
+    def frame_count(data):
+        """The frame count in a replay's header, without decoding the rest."""
+        magic, version, _, frames = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError('not a replay or unsupported replay version')
+        return frames
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        frames = cls.frame_count(data)
+        flags = REPLAY_HEADER.unpack_from(data)[2]
+        offset = REPLAY_HEADER.size
+        if not flags & FLAG_RLE:
+            deltas = _from_le('h', data[offset:offset + frames * 4])
+        else:
+            (n_runs,) = struct.unpack_from('<I', data, offset)
+            offset += 4
+            counts = _from_le('H', data[offset:offset + n_runs * 2])
+            offset += n_runs * 2
+            values = _from_le('h', data[offset:offset + n_runs * 4])
+            if len(counts) != n_runs or len(values) != n_runs * 2:
+                raise ValueError('truncated replay')
+            # Checked before expanding: the runs of a small, untrusted
+            # replay could otherwise add up to gigabytes
+            if sum(counts) != frames:
+                raise ValueError('replay runs do not add up to its frame count')
+            pairs = np.frombuffer(values, dtype=np.int16).reshape(-1, 2)
+            deltas = array('h', np.repeat(pairs, np.frombuffer(counts, dtype=np.uint16), axis=0).tobytes())
+        if len(deltas) != frames * 2:
+            raise ValueError('truncated replay')
+        return cls(deltas)
+
+    def save(self, path, rle=True):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes(rle))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
 class Recorder:
-    def __init__(self):
-        self.moves = []
-        self.last_pos = None
+    def __init__(self, origin=None):
+        # Where ghosts replay from; the first move is measured from here, so
+        # a ghost retraces the player exactly rather than trailing its first move
+        self.origin = origin
+        self.deltas = array('h')
+        self.last_pos = origin
 
     def record(self, pos):
         if self.last_pos is None:
             self.last_pos = pos
-            self.moves.append({'x': 0, 'y': 0})
+            self.deltas.append(0)
+            self.deltas.append(0)
         else:
-            dx = pos[0] - self.last_pos[0]
-            dy = pos[1] - self.last_pos[1]
-            self.moves.append({'x': dx, 'y': dy})
+            self.deltas.append(pos[0] - self.last_pos[0])
+            self.deltas.append(pos[1] - self.last_pos[1])
             self.last_pos = pos
 
     def get_moves(self):
-        return self.moves 
\ No newline at end of file
+        # Shares the buffer; stop recording once the moves are handed out
+        return Replay(self.deltas)
+
+    def reset(self):
+        # The old buffer may now belong to a Replay, so never clear it in place
+        self.deltas = array('h')
+        self.last_pos = self.origin
+
+    def truncate(self, frames, last_pos):
+        del self.deltas[frames * 2:]
+        self.last_pos = last_pos
+
+
+class InputLog:
+    """The player's inputs as one bitmask byte per simulated frame.
+
+    Simulation is deterministic, so stepping a fresh Simulation of the same
+    level through a log reproduces the run bit for bit, headless and as
+    fast as the CPU allows. A minute of play is 3.6 KB.
+    """
+
+    def __init__(self, inputs=None):
+        self.inputs = bytearray(inputs or b'')
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def __getitem__(self, index):
+        return self.inputs[index]
+
+    def __iter__(self):
+        return iter(self.inputs)
+
+    def record(self, inputs):
+        self.inputs.append(inputs)
+
+    def truncate(self, frames):
+        del self.inputs[frames:]
+
+    def to_bytes(self):
+        return INPUT_HEADER.pack(INPUT_MAGIC, INPUT_VERSION, len(self.inputs)) + bytes(self.inputs)
+
+    @staticmethod
+    def frame_count(data):
+        """The frame count in an input log's header, without reading the inputs."""
+        magic, version, frames = INPUT_HEADER.unpack_from(data)
+        if magic != INPUT_MAGIC or version != INPUT_VERSION:
+            raise ValueError('not an input log or unsupported input log version')
+        return frames
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = memoryview(data)
+        frames = cls.frame_count(data)
+        inputs = data[INPUT_HEADER.size:INPUT_HEADER.size + frames]
+        if len(inputs) != frames:
+            raise ValueError('truncated input log')
+        return cls(inputs)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
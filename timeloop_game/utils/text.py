@@ -0,0 +1,62 @@
+from collections import OrderedDict
+import pygame
+from utils.profiler import profiler
+
+
+class FontRegistry:
+    """SysFont lookups are slow (they search the system font list), so each
+    (name, size, bold) is resolved once and shared."""
+
+    def __init__(self):
+        self.fonts = {}
+
+    def get(self, name, size, bold=False):
+        key = (name, size, bold)
+        font = self.fonts.get(key)
+        if font is None:
+            if not pygame.font.get_init():
+                pygame.font.init()
+            font = pygame.font.SysFont(name, size, bold=bold)
+            self.fonts[key] = font
+        return font
+
+    def clear(self):
+        self.fonts.clear()
+
+
+class TextCache:
+    """LRU cache of rendered text Surfaces keyed by (font, size, text, color).
+
+    A HUD string that has not changed since the last frame is a dict hit;
+    when it does change the new value is rendered once and the least
+    recently used entries are dropped past max_entries.
+    """
+
+    def __init__(self, registry=None, max_entries=256):
+        self.registry = registry or FontRegistry()
+        self.max_entries = max_entries
+        self.rendered = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, name, size, color, bold=False, antialias=True):
+        key = (name, size, bold, text, tuple(color), antialias)
+        surf = self.rendered.get(key)
+        if surf is not None:
+            self.rendered.move_to_end(key)
+            self.hits += 1
+            return surf
+        self.misses += 1
+        profiler.count('surface_alloc')
+        surf = self.registry.get(name, size, bold).render(text, antialias, color)
+        self.rendered[key] = surf
+        if len(self.rendered) > self.max_entries:
+            self.rendered.popitem(last=False)
+        return surf
+
+    def clear(self):
+        self.rendered.clear()
+
+
+fonts = FontRegistry()
+text_cache = TextCache(fonts)
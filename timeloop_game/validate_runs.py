@@ -0,0 +1,79 @@
+"""Check a recorded run the way the validation service does.
+
+Run from the repository root:
+
+    python3 timeloop_game/validate_runs.py 3 timeloop_level_3_20250101_120000.inputs
+    python3 timeloop_game/validate_runs.py 3 runs/level_3_loop_1.replay runs/level_3_loop_2.replay
+    python3 timeloop_game/validate_runs.py 3 run.inputs --url http://127.0.0.1:8765
+
+A run is either one .inputs log (F5 in game) or its loops' .replay files
+in order (solve_levels.py --replays writes these). Without --url it is
+re-simulated here; with --url it is posted to validate_server.py. Prints
+the verdict as JSON and exits with status 1 unless the run is a valid win.
+"""
+import argparse
+import base64
+import json
+import sys
+import urllib.error
+import urllib.request
+
+from core.level_pack import LevelPack
+from core.simulation import FPS, MAX_LOOPS, MAX_RATE
+from utils.recorder import INPUT_MAGIC, REPLAY_MAGIC
+from validate_server import validate_job
+
+
+def run_kind(blobs):
+    magics = {blob[:len(INPUT_MAGIC)] for blob in blobs}
+    if magics == {INPUT_MAGIC} and len(blobs) == 1:
+        return 'inputs'
+    if magics == {REPLAY_MAGIC}:
+        return 'replays'
+    return None
+
+
+def post(url, number, kind, blobs, fps):
+    encoded = [base64.b64encode(blob).decode('ascii') for blob in blobs]
+    body = {'level': number, 'fps': fps, kind: encoded[0] if kind == 'inputs' else encoded}
+    request = urllib.request.Request(f'{url.rstrip("/")}/validate', data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as exc:
+        # 4xx replies carry {'error': ...}
+        return json.load(exc)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate a recorded run.')
+    parser.add_argument('level', type=int, help='level number the run was recorded on')
+    parser.add_argument('paths', nargs='+', help='one .inputs file, or one .replay file per loop in order')
+    parser.add_argument('--rate', type=int, default=FPS,
+                        help='simulation rate the run was recorded at (TIMELOOP_HZ)')
+    parser.add_argument('--max-loops', type=int, default=MAX_LOOPS, help='ignored with --url; the server sets it')
+    parser.add_argument('--url', help='validate_server.py to send the run to instead')
+    args = parser.parse_args(argv)
+    if not 1 <= args.rate <= MAX_RATE:
+        parser.error(f'--rate must be from 1 to {MAX_RATE}')
+
+    blobs = []
+    for path in args.paths:
+        with open(path, 'rb') as f:
+            blobs.append(f.read())
+    kind = run_kind(blobs)
+    if kind is None:
+        parser.error('expected one .inputs log, or .replay files only')
+    if args.url:
+        verdict = post(args.url, args.level, kind, blobs, args.rate)
+    else:
+        if args.level not in LevelPack.load_default().numbers():
+            parser.error(f'no level {args.level}')
+        verdict = validate_job((args.level, kind, blobs, args.rate, args.max_loops))
+    print(json.dumps(verdict, indent=1))
+    return 0 if verdict.get('valid') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Validate submitted runs over HTTP, on a pool of worker processes.
+
+Run from the repository root:
+
+    python3 timeloop_game/validate_server.py                  # 127.0.0.1:8765, all cores
+    python3 timeloop_game/validate_server.py --port 9000 --workers 4
+
+POST /validate with a JSON object naming the level and carrying the run
+base64-encoded, either as the .inputs log the game writes with F5 or as
+one Recorder .replay per loop, in order:
+
+    {"level": 3, "inputs": "VExJTgEAAAB..."}
+    {"level": 3, "replays": ["VExSUAEBAAB...", "..."], "fps": 60}
+
+fps is the rate the run was recorded at (TIMELOOP_HZ, default 60). The
+reply is the verdict from core.validation, e.g. {"valid": true, "status":
+"won", "loops": 2, "frames": 1327, "seconds": 22.117, ...}. Verdicts are
+cached by a hash of the level, rate and run, so a run submitted again,
+or by several clients at once, is only simulated once. GET /stats
+reports the request and cache counters.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import signal
+import struct
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+
+from core.level_pack import LevelPack
+from core.simulation import FPS, LOOP_SECONDS, MAX_LOOPS, MAX_RATE
+from core.timer import Timer
+from core.validation import validate_inputs, validate_replays
+from utils.recorder import InputLog, Replay
+
+HOST = '127.0.0.1'
+PORT = 8765
+CACHE_SIZE = 100_000
+MAX_BODY = 1 << 20
+
+_pack = None
+
+
+def level_pack():
+    global _pack
+    if _pack is None:
+        _pack = LevelPack.load_default()
+    return _pack
+
+
+def init_worker():
+    # Every worker reads the level pack once, up front, and leaves Ctrl-C
+    # to the server, which shuts the pool down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    level_pack()
+
+
+def validate_job(job):
+    """(level, kind, blobs, fps, max_loops) -> verdict, or {'error': ...} for a malformed run."""
+    number, kind, blobs, fps, max_loops = job
+    level = level_pack().get(number)
+    codec = InputLog if kind == 'inputs' else Replay
+    # No run longer than every loop can be valid; checked on the headers,
+    # before a run-length encoded replay is expanded
+    limit = max_loops * Timer(LOOP_SECONDS, fps).total_frames
+    try:
+        for blob in blobs:
+            frames = codec.frame_count(blob)
+            if frames > limit:
+                return {'error': f'{frames} steps, at most {limit} are played at {fps} fps'}
+        if kind == 'inputs':
+            return validate_inputs(level, InputLog.from_bytes(blobs[0]), fps, max_loops)
+        return validate_replays(level, [Replay.from_bytes(blob) for blob in blobs], fps, max_loops)
+    except (ValueError, struct.error) as exc:
+        return {'error': str(exc)}
+
+
+def run_key(number, kind, blobs, fps, max_loops):
+    digest = hashlib.sha256(f'{number}:{kind}:{fps}:{max_loops}'.encode())
+    for blob in blobs:
+        digest.update(len(blob).to_bytes(4, 'little'))
+        digest.update(blob)
+    return digest.hexdigest()
+
+
+def parse_request(body, levels):
+    """(level, kind, blobs, fps) from a POST /validate body; raises ValueError."""
+    request = json.loads(body)
+    if not isinstance(request, dict):
+        raise ValueError('expected a JSON object')
+    number = request.get('level')
+    if not isinstance(number, int) or number not in levels:
+        raise ValueError(f'no level {number!r}')
+    fps = request.get('fps', FPS)
+    if not isinstance(fps, int) or not 1 <= fps <= MAX_RATE:
+        raise ValueError(f'fps must be a whole number from 1 to {MAX_RATE}')
+    if ('inputs' in request) == ('replays' in request):
+        raise ValueError('send either "inputs" or "replays"')
+    if 'inputs' in request:
+        kind, encoded = 'inputs', [request['inputs']]
+    else:
+        kind, encoded = 'replays', request['replays']
+        if not isinstance(encoded, list):
+            raise ValueError('"replays" must be a list, one per loop')
+    if not all(isinstance(text, str) for text in encoded):
+        raise ValueError(f'"{kind}" must be base64 text')
+    return number, kind, [base64.b64decode(text, validate=True) for text in encoded], fps
+
+
+class ValidationService:
+    """The HTTP front end: parses requests, caches verdicts, hands runs to the pool."""
+
+    def __init__(self, pool, levels, max_loops=MAX_LOOPS, cache_size=CACHE_SIZE):
+        self.pool = pool
+        self.levels = set(levels)
+        self.max_loops = max_loops
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # Runs being simulated right now; the same run sent again meanwhile waits on these
+        self.pending = {}
+        self.started = time.perf_counter()
+        self.counts = dict.fromkeys(('requests', 'validated', 'cache_hits', 'errors'), 0)
+
+    async def validate(self, number, kind, blobs, fps):
+        """(verdict, cached) for one run."""
+        key = run_key(number, kind, blobs, fps, self.max_loops)
+        verdict = self.cache.get(key)
+        if verdict is not None:
+            self.cache.move_to_end(key)
+            self.counts['cache_hits'] += 1
+            return verdict, True
+        future = self.pending.get(key)
+        cached = future is not None
+        if future is None:
+            job = (number, kind, blobs, fps, self.max_loops)
+            future = asyncio.get_running_loop().run_in_executor(self.pool, validate_job, job)
+            self.pending[key] = future
+            future.add_done_callback(lambda done: self.finish(key, done))
+        else:
+            self.counts['cache_hits'] += 1
+        # Shielded, so a client hanging up does not cancel the run for the others
+        return await asyncio.shield(future), cached
+
+    def finish(self, key, future):
+        del self.pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        verdict = future.result()
+        if 'error' in verdict:
+            return
+        self.counts['validated'] += 1
+        self.cache[key] = verdict
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def stats(self):
+        return dict(self.counts, cached_runs=len(self.cache), in_flight=len(self.pending),
+                    uptime=round(time.perf_counter() - self.started, 1))
+
+    async def route(self, method, target, body):
+        path = target.split('?', 1)[0]
+        if path == '/validate':
+            if method != 'POST':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'POST a run to /validate'}
+            try:
+                number, kind, blobs, fps = parse_request(body, self.levels)
+            except ValueError as exc:
+                return HTTPStatus.BAD_REQUEST, {'error': str(exc)}
+            verdict, cached = await self.validate(number, kind, blobs, fps)
+            if 'error' in verdict:
+                return HTTPStatus.BAD_REQUEST, verdict
+            return HTTPStatus.OK, dict(verdict, level=number, fps=fps, cached=cached)
+        if path == '/stats':
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': 'GET /stats'}
+            return HTTPStatus.OK, self.stats()
+        return HTTPStatus.NOT_FOUND, {'error': f'no endpoint {path}'}
+
+    async def handle(self, reader, writer):
+        # One connection: HTTP/1.1 requests with Content-Length bodies, kept alive until the client closes
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = line.decode('latin-1').split()
+                keep_alive = len(parts) == 3 and parts[2] == 'HTTP/1.1' and headers.get('connection') != 'close'
+                try:
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    length = -1
+                if len(parts) != 3 or length < 0:
+                    status, payload, keep_alive = HTTPStatus.BAD_REQUEST, {'error': 'malformed request'}, False
+                elif length > MAX_BODY:
+                    status, payload, keep_alive = (HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                                   {'error': f'runs are at most {MAX_BODY} bytes'}, False)
+                else:
+                    body = await reader.readexactly(length)
+                    self.counts['requests'] += 1
+                    try:
+                        status, payload = await self.route(parts[0], parts[1], body)
+                    except Exception as exc:
+                        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': repr(exc)}
+                if status != HTTPStatus.OK:
+                    self.counts['errors'] += 1
+                data = json.dumps(payload).encode()
+                head = (f'HTTP/1.1 {status.value} {status.phrase}\r\nContent-Type: application/json\r\n'
+                        f'Content-Length: {len(data)}\r\n')
+                if not keep_alive:
+                    head += 'Connection: close\r\n'
+                writer.write(head.encode() + b'\r\n' + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host=HOST, port=PORT, workers=None, max_loops=MAX_LOOPS, cache_size=CACHE_SIZE):
+    workers = workers or os.cpu_count()
+    levels = LevelPack.load_default().numbers()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        service = ValidationService(pool, levels, max_loops, cache_size)
+        server = await asyncio.start_server(service.handle, host, port)
+        bound = server.sockets[0].getsockname()[1]
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+            except NotImplementedError:
+                pass  # Windows: Ctrl-C still ends asyncio.run
+        print(f'validating runs at http://{host}:{bound}/validate on {workers} worker(s)', flush=True)
+        async with server:
+            await stop.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve run validation over HTTP.')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT, help='0 picks a free port')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size (default: all cores)')
+    parser.add_argument('--max-loops', type=int, default=MAX_LOOPS)
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='verdicts kept in memory')
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_loops, args.cache_size))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())